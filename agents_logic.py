@@ -1,85 +1,156 @@
 import logging
-from game_state import BOTS_DB
-from game_state import POWER_PLANT_OPTIONS
-from typing import Dict, Any, Optional, List
-
-logging.basicConfig(level=logging.DEBUG)
-
-MOVE_COST = 1
-EXPLORE_COST = 10
-DEPLOY_COST = 10
-RECONFIGURE_COST = 10
-ENGINEER_COST = 100
-MIN_ENGINEERS = 2
-
-
-def get_agent_action(agent: Dict[str, Any]) -> Dict[str, Any]:
+from assignment import DEPLOY_REACH, MOVE_REACH, assign_engineers, direct_step, step_toward
+from decisions import ENGINEER_DECISIONS
+from economy import DEPLOY_ORDER, current_economy, deployed_income, plan_factory
+from game_state import (  # noqa: F401 - costs are re-exported for callers of this module
+    DEPLOY_COST, ENGINEER_COST, EXPLORE_COST, MOVE_COST, POWER_PLANT_OPTIONS, RECONFIGURE_COST,
+)
+from game_state import Agent, AgentRegistry, GameMap
+from knowledge import EXPLORE_MIN_CELLS, EXPLORE_RADIUS, Knowledge
+from metrics import ACTIONS, MAP_SCANS, timed
+from pathfinding import DistanceField
+from search import ENGINEER_SEARCH, SEARCH_BUDGET, EngineerSearch, SearchBudget
+from sites import SITE_RADIUS
+from terrain import TERRAIN_CODES, Location, TerrainIndex, manhattan_rings, square_window
+from typing import Dict, Any, Optional, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def get_agent_action(
+    state: Dict[str, Any], agent: Agent, context: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
     """
     Returns the best possible action for the given agent.
     """
-    agent_type = agent.get("type")
+    agent_type = agent.type
+    if context is None:
+        context = build_round_context(state)
 
     if agent_type == "ENGINEER_BOT":
-        return engineer_action(agent)
+        action = engineer_action(state, agent, context)
     elif agent_type == "FACTORY":
-        return factory_action(agent)
-
-    logging.debug(f"Agent {agent['id']} ({agent_type}) has no valid action.")
-    return {"type": "NONE", "params": {}}
+        action = factory_action(state, agent, context)
+    else:
+        logger.debug("Agent %s (%s) has no valid action.", agent.id, agent_type)
+        action = {"type": "NONE", "params": {}}
+    ACTIONS.inc(action["type"])
+    return action
 
 
-def engineer_action(agent: Dict[str, Any]) -> Dict[str, Any]:  # noqa: C901
+def build_round_context(state: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Collects the facts every agent decision needs from the agent registry:
+    the factory, the number of engineers and how many of them can deploy
+    (not blocked with plants waiting and nowhere to put them), plus this
+    round's engineer assignments (and the search time of the request, with
+    BOT_ENGINEER_SEARCH).
+    """
+    agents: AgentRegistry = state["agents"]
+    engineers = agents.of_type("ENGINEER_BOT")
+    return {
+        "factory": agents.first("FACTORY"),  # Only one factory exists
+        "engineer_count": len(engineers),
+        "deployer_count": sum(not engineer.blocked for engineer in engineers),
+        "assignments": assign_engineers(state),
+        "search_budget": SearchBudget(SEARCH_BUDGET, len(engineers)) if ENGINEER_SEARCH else None,
+    }
+
+
+@timed
+def plan_round(state: Dict[str, Any]) -> Dict[int, Dict[str, Any]]:
+    """
+    Computes the actions of all agents for the current round in one pass
+    over shared precomputed state. The plan is cached per round number,
+    so repeated calls (and per-agent action requests) reuse it.
+    """
+    round_number = state["round"]
+    cached = get_planned_actions(state)
+    if cached is not None:
+        return cached
+
+    context = build_round_context(state)
+    actions = {}
+    for agent_id in sorted(state["agents"]):
+        actions[agent_id] = get_agent_action(state, state["agents"][agent_id], context)
+
+    state["round_plan"] = {"round": round_number, "actions": actions}
+    logger.debug("📋 Planned %s actions for round %s", len(actions), round_number)
+    return actions
+
+
+def get_planned_actions(state: Dict[str, Any]) -> Optional[Dict[int, Dict[str, Any]]]:
+    """Returns the cached plan for the current round, if there is one."""
+    plan = state.get("round_plan")
+    if plan is None or plan["round"] != state["round"]:
+        return None
+    actions: Dict[int, Dict[str, Any]] = plan["actions"]
+    return actions
+
+
+@timed
+def engineer_action(
+    state: Dict[str, Any], agent: Agent, context: Dict[str, Any]
+) -> Dict[str, Any]:
+    """
+    Engineer logic (see decide_engineer_action). Decisions are looked up in
+    the decision cache by the fingerprint of their inputs first; the side
+    effects are applied either way. With BOT_ENGINEER_SEARCH, the anytime
+    search decides instead wherever it can (see search_engineer_action).
+    """
+    decision = search_engineer_action(state, agent, context)
+    key = engineer_fingerprint(state, agent, context) if decision is None else None
+    if decision is None:
+        decision = ENGINEER_DECISIONS.get(key) if key is not None else None
+    if decision is None:
+        decision = decide_engineer_action(state, agent, context)
+        if key is not None:
+            ENGINEER_DECISIONS.put(key, decision)
+    action, blocked = decision
+    agent.blocked = blocked
+    apply_engineer_action(state, agent, action, context)
+    return action
+
+
+def decide_engineer_action(
+    state: Dict[str, Any], agent: Agent, context: Dict[str, Any]
+) -> Tuple[Dict[str, Any], bool]:
     """
     Engineer logic:
-    - First action must be EXPLORE (only once).
-    - Then, attempt to DEPLOY power plants from the factory warehouse.
-    - If deployment is not possible, MOVE toward the nearest RIVER.
-    - If no movement is possible and no balance for exploring, do NOTHING.
+    - Attempt to DEPLOY power plants from the factory warehouse
+      (at the site the round's assignment gave this engineer).
+    - Otherwise EXPLORE, if that reveals enough cells never seen before.
+    - Otherwise MOVE toward the assigned RIVER tile, or the nearest one by
+      walking distance (toward the unexplored part of the map while no RIVER is known).
+    - If no movement is possible, do NOTHING.
+    Returns the action and whether the engineer is blocked (plants waiting and
+    nowhere to put them); changes nothing in the state.
     """
-    global BOTS_DB  # Ensure we're modifying the global BOTS_DB
-    engineer_location: List[int] = list(agent["location"])
-
-    # Step 1: Ensure bot has a memory of exploration
-    if "has_explored" not in BOTS_DB["agents"][agent["id"]]:
-        BOTS_DB["agents"][agent["id"]]["has_explored"] = False
+    engineer_location: List[int] = list(agent.location)
 
-    if not BOTS_DB["agents"][agent["id"]]["has_explored"] and BOTS_DB["balance"] >= EXPLORE_COST:
-        BOTS_DB["agents"][agent["id"]]["has_explored"] = True
-        logging.debug(f"🔎 Engineer {agent['id']} is exploring the map (first action).")
-        return {"type": "EXPLORE", "params": {}}
-
-    # Step 2: Find the factory and its warehouse
-    factory = None
-    for agent_id, data in BOTS_DB["agents"].items():
-        if data["type"] == "FACTORY":
-            factory = data
-            break  # Only one factory exists
+    # Step 1: Get the factory and its warehouse
+    factory: Optional[Agent] = context["factory"]
 
     if not factory:
-        logging.error(f"❌ No factory found in BOTS_DB for Engineer {agent['id']}.")
-        return {"type": "NONE", "params": {}}
+        logger.error("❌ No factory found in state for Engineer %s.", agent.id)
+        return {"type": "NONE", "params": {}}, False
 
-    factory_warehouse = factory.get("warehouse", {})
+    factory_warehouse = factory.warehouse or {}
 
-    logging.debug(f"🏭 Engineer {agent['id']} checking factory warehouse: {factory_warehouse}")
+    logger.debug("🏭 Engineer %s checking factory warehouse: %s", agent.id, factory_warehouse)
 
-    # Step 3: Deploy a power plant if available
-    for plant in ["SOLAR_PANELS", "WINDMILL", "GEOTHERMAL", "DAM"]:
+    # Step 2: Deploy a power plant if available
+    assignment = context["assignments"].get(agent.id)
+    deploy_sites: Optional[List[List[int]]] = None
+    for plant in DEPLOY_ORDER:
         if factory_warehouse.get(plant, 0) > 0:
-            deploy_location = find_nearby_location(
-                engineer_location, BOTS_DB["map"], valid_terrain=["PLAINS"], max_distance=2
-            )
+            if deploy_sites is None:
+                deploy_sites = deploy_candidates(state, engineer_location, assignment)
+            ranked_sites = state["sites"].rank(plant, engineer_location, deploy_sites)
+            deploy_location = first_free(state, engineer_location, ranked_sites)
             if deploy_location:
-                factory_warehouse[plant] -= 1  # Deduct from factory warehouse
-                deploy_x = engineer_location[0] + deploy_location[0]
-                deploy_y = engineer_location[1] + deploy_location[1]
-                BOTS_DB["map"][deploy_y][deploy_x]["agent"] = {
-                    "id": agent["id"],
-                    "type": plant,
-                }  # Mark as occupied
-                BOTS_DB["occupied_locations"].add((deploy_x, deploy_y))  # Track occupied locations
-                logging.debug(
-                    f"Engineer {agent['id']} is deploying {plant} at {deploy_x, deploy_y}"
+                logger.debug(
+                    "Engineer %s is deploying %s at %s", agent.id, plant, deploy_location
                 )
                 return {
                     "type": "DEPLOY",
@@ -87,143 +158,222 @@ def engineer_action(agent: Dict[str, Any]) -> Dict[str, Any]:  # noqa: C901
                         "power_type": plant,
                         "d_loc": deploy_location
                     }
-                }
-
-    # Step 4: Move toward the river if deployment is not possible
-    river_location = find_closest_river(engineer_location, BOTS_DB["map"])
-    if river_location:
-        move_direction = find_nearby_location(
-            engineer_location,
-            BOTS_DB["map"],
-            target_location=river_location,
-            max_distance=2,
-        )
-        if move_direction:
-            logging.debug(
-                f"Engineer {agent['id']} is moving toward the RIVER at {move_direction}"
-            )
-            return {"type": "MOVE", "params": {"d_loc": move_direction}}
-
-    # Step 5: If no movement is possible and no balance for explore, do nothing
-    logging.debug(f"🚫 Engineer {agent['id']} is doing NOTHING (balance={BOTS_DB['balance']})")
-    return {"type": "NONE", "params": {}}
+                }, False
+
+    # Step 3: Explore where most of the surroundings are still unseen
+    if should_explore(state, engineer_location):
+        logger.debug("🔎 Engineer %s is exploring around %s", agent.id, engineer_location)
+        return {"type": "EXPLORE", "params": {}}, False
+
+    # Step 4: Move toward the assigned river tile (or along the distance field)
+    move_direction = choose_move(state, (engineer_location[0], engineer_location[1]), assignment)
+    if move_direction:
+        logger.debug("Engineer %s is moving toward the RIVER at %s", agent.id, move_direction)
+        return {"type": "MOVE", "params": {"d_loc": move_direction}}, False
+
+    # Step 5: If no movement is possible, do nothing
+    # (with plants waiting, the engineer is blocked: the economy planner stops counting on it)
+    blocked = deploy_sites is not None and not (
+        assignment["sites"] if assignment is not None else deploy_sites
+    )
+    logger.debug("🚫 Engineer %s is doing NOTHING (balance=%s)", agent.id, state["balance"])
+    return {"type": "NONE", "params": {}}, blocked
 
 
-def find_closest_river(location: List[int], map_data: List[List[Any]]) -> Optional[List[int]]:
+def search_engineer_action(
+    state: Dict[str, Any], agent: Agent, context: Dict[str, Any]
+) -> Optional[Tuple[Dict[str, Any], bool]]:
     """
-    Finds the nearest RIVER tile from the given location.
+    Plans a few rounds ahead with the anytime search (search.py), within this
+    engineer's share of the request's search time. None when the search is
+    off, or when the rules decide anyway (no factory, or no RIVER known so
+    engineers head for the frontier). Blocked like decide_engineer_action.
     """
-    x, y = location
-    map_size = len(map_data)
-    closest_river = None
-    min_distance = float("inf")
-
-    logging.debug(f"🌊 Searching for the nearest RIVER from {location}.")
-
-    for row in range(map_size):
-        for col in range(map_size):
-            cell = map_data[row][col]
-            if cell and cell.get("type") == "RIVER":
-                distance = abs(x - col) + abs(y - row)  # Manhattan distance
-                if distance < min_distance:
-                    closest_river = [col, row]
-                    min_distance = distance
-
-    if closest_river:
-        logging.debug(f"✅ Closest RIVER found at {closest_river} (distance={min_distance})")
-    else:
-        logging.debug("❌ No RIVER found in the map data.")
-
-    return closest_river
+    budget: Optional[SearchBudget] = context.get("search_budget")
+    factory: Optional[Agent] = context["factory"]
+    if budget is None or not factory or not state["terrain_index"].locations("RIVER"):
+        return None
+    location = list(agent.location)
+    warehouse = factory.warehouse or {}
+    assignment = context["assignments"].get(agent.id)
+    stocked = any(warehouse.get(plant, 0) > 0 for plant in DEPLOY_ORDER)
+    deploy_sites = deploy_candidates(state, location, assignment) if stocked else []
+    action = EngineerSearch(state).best_action(
+        agent.location, state["balance"], warehouse, deploy_sites, budget.next_deadline()
+    )
+    blocked = action["type"] == "NONE" and stocked and not (
+        assignment["sites"] if assignment is not None else deploy_sites
+    )
+    return action, blocked
 
 
-def factory_action(agent: Dict[str, Any]) -> Dict[str, Any]:
+def apply_engineer_action(
+    state: Dict[str, Any], agent: Agent, action: Dict[str, Any], context: Dict[str, Any]
+) -> None:
     """
-    Factory logic:
-    Builds the first engineer if none exist.
-    Prioritizes power plants if <3 in warehouse,
-    ensuring at least 10 energy remains after purchase.
-    Builds additional engineers if power plants are sufficient
-    and energy is available for deployment.
-    If none of the above is possible, does nothing.
+    Books an engineer's action in the state: reserves the tile it deploys to
+    or moves to, takes the plant out of the warehouse and marks explored cells as seen.
     """
-    global BOTS_DB
-
-    warehouse = BOTS_DB.get("agents", {}).get(agent["id"], {}).get("warehouse", {})
-    existing_engineers = sum(1 for a in BOTS_DB["agents"].values() if a["type"] == "ENGINEER_BOT")
-
-    ENGINEER_COST = 100
-    DEPLOY_COST = 10  # Energy needed per power plant deployment
-    MIN_ENERGY_RESERVE = (existing_engineers + 1) * DEPLOY_COST  # Ensure deployment is possible
-
-    # Step 1: If no engineers exist, build one immediately
-    if existing_engineers == 0 and BOTS_DB["balance"] >= ENGINEER_COST:
-        build_step = find_nearby_location(
-            agent["location"],
-            map_data=BOTS_DB["map"],
-            max_distance=5,
-            valid_terrain=["PLAINS"]
-        )
+    x, y = agent.location
+    params = action["params"]
+    if action["type"] == "DEPLOY":
+        deploy_x, deploy_y = x + params["d_loc"][0], y + params["d_loc"][1]
+        state["occupancy"].reserve(deploy_x, deploy_y)
+        context["factory"].warehouse[params["power_type"]] -= 1  # Deduct from factory warehouse
+        state["map"].set_agent(deploy_x, deploy_y, {
+            "id": agent.id,
+            "type": params["power_type"],
+        })  # Mark as occupied
+    elif action["type"] == "MOVE":
+        state["occupancy"].reserve(x + params["d_loc"][0], y + params["d_loc"][1])
+    elif action["type"] == "EXPLORE":
+        state["knowledge"].explore(x, y)
+
+
+def engineer_fingerprint(
+    state: Dict[str, Any], agent: Agent, context: Dict[str, Any]
+) -> Optional[Tuple[Any, ...]]:
+    """
+    Everything decide_engineer_action reads, as a hashable key: position,
+    terrain (in deploy reach plus the site heatmap radius), occupancy and river
+    distances in the move window, the round's assignment, stocked plant types
+    and whether exploring pays off. None when the decision also depends on
+    state far away: no factory, no RIVER known (engineers head for the
+    frontier), or no direct step toward the assigned river tile (the A* path
+    around the obstacle reads the whole map).
+    """
+    factory: Optional[Agent] = context["factory"]
+    terrain_index: TerrainIndex = state["terrain_index"]
+    if not factory or not terrain_index.locations("RIVER"):
+        return None
+    x, y = agent.location
+    warehouse = factory.warehouse or {}
+    assignment = context["assignments"].get(agent.id)
+    if assignment is not None and assignment["target"] is not None and direct_step(
+        state, (x, y), assignment["target"], MOVE_REACH
+    ) is None:
+        return None
+    game_map: GameMap = state["map"]
+    occupancy = state["occupancy"]
+    river_field: DistanceField = state["river_field"]
+    return (
+        x, y,
+        tuple(warehouse.get(plant, 0) > 0 for plant in DEPLOY_ORDER),
+        None if assignment is None else (
+            tuple(map(tuple, assignment["options"])), assignment["target"], assignment["sites"]
+        ),
+        should_explore(state, [x, y]),
+        square_window(game_map.terrain, game_map.size, x, y, DEPLOY_REACH + SITE_RADIUS),
+        square_window(occupancy.cells, occupancy.size, x, y, MOVE_REACH),
+        river_field.window((x, y), MOVE_REACH),
+    )
 
-        if build_step:
-            build_x = agent["location"][0] + build_step[0]
-            build_y = agent["location"][1] + build_step[1]
 
-            # Ensure location is valid before building
-            if (build_x, build_y) not in BOTS_DB["occupied_locations"]:
-                BOTS_DB["occupied_locations"].add((build_x, build_y))
-                BOTS_DB["balance"] -= ENGINEER_COST  # Deduct cost
+def should_explore(state: Dict[str, Any], location: List[int]) -> bool:
+    """
+    True if an EXPLORE here is affordable and reveals at least EXPLORE_MIN_CELLS
+    cells that no view or earlier EXPLORE has covered.
+    """
+    if state["balance"] < EXPLORE_COST:
+        return False
+    knowledge: Knowledge = state["knowledge"]
+    return knowledge.unseen_in(location[0], location[1], EXPLORE_RADIUS) >= EXPLORE_MIN_CELLS
 
-                logging.debug(
-                    f"Factory {agent['id']} is building the first engineer at {build_step}"
-                )
-                return {"type": "BUILD_BOT", "params": {"d_loc": build_step}}
 
-    # Step 2: Prioritize power plant assembly if <3 in warehouse and enough energy remains
-    for plant, cost in POWER_PLANT_OPTIONS:
-        remaining_balance_after_purchase = BOTS_DB["balance"] - cost
-
-        if warehouse.get(plant, 0) < 3 and remaining_balance_after_purchase >= MIN_ENERGY_RESERVE:
-            BOTS_DB["balance"] -= cost  # Deduct cost
-            warehouse[plant] = warehouse.get(plant, 0) + 1  # Store in warehouse
-
-            logging.debug(
-                f"Factory {agent['id']} assembling {plant}"
-                f"(cost={cost}, balance after purchase={remaining_balance_after_purchase})"
-            )
-            return {"type": "ASSEMBLE_POWER_PLANT", "params": {"power_type": plant}}
-
-    # Step 3: Build additional engineers **only if power plants are ready & energy remains**
-    if BOTS_DB["balance"] >= (ENGINEER_COST + MIN_ENERGY_RESERVE):
-        build_step = find_nearby_location(
-            agent["location"],
-            map_data=BOTS_DB["map"],
-            max_distance=5,
-            valid_terrain=["PLAINS"]
+def choose_move(
+    state: Dict[str, Any], location: Location, assignment: Optional[Dict[str, Any]]
+) -> Optional[List[int]]:
+    """
+    Steps toward the engineer's assigned river tile, falling back to the
+    river distance field when unassigned or when the direct way is blocked.
+    While no RIVER is known at all, heads for the nearest unseen cells instead.
+    """
+    if assignment is not None and assignment["target"] is not None:
+        move_direction = step_toward(state, location, assignment["target"])
+        if move_direction is not None:
+            return move_direction
+    terrain_index: TerrainIndex = state["terrain_index"]
+    if not terrain_index.locations("RIVER"):
+        frontier = state["knowledge"].nearest_frontier(*location)
+        return step_toward(state, location, frontier) if frontier is not None else None
+    river_field: DistanceField = state["river_field"]
+    return river_field.next_step(location, state["occupancy"], max_distance=MOVE_REACH)
+
+
+def deploy_candidates(
+    state: Dict[str, Any], location: List[int], assignment: Optional[Dict[str, Any]]
+) -> List[List[int]]:
+    """
+    Deploy offsets for an engineer to try: the site assigned to it this round
+    and the ones in reach no other engineer won (none if others took every
+    site in reach), or every free PLAINS tile in reach if the engineer was not
+    part of the round's assignment. They are ranked per plant by the site heatmap.
+    """
+    if assignment is None:
+        return find_nearby_locations(
+            state, location, valid_terrain=["PLAINS"], max_distance=2, limit=len(manhattan_rings(2))
         )
+    options: List[List[int]] = assignment["options"]
+    return options
 
-        if build_step:
-            build_x = agent["location"][0] + build_step[0]
-            build_y = agent["location"][1] + build_step[1]
 
-            # Ensure location is valid before building
-            if (build_x, build_y) not in BOTS_DB["occupied_locations"]:
-                BOTS_DB["occupied_locations"].add((build_x, build_y))
-                BOTS_DB["balance"] -= ENGINEER_COST  # Deduct cost
+@timed
+def factory_action(
+    state: Dict[str, Any], agent: Agent, context: Dict[str, Any]
+) -> Dict[str, Any]:
+    """
+    Factory logic:
+    Asks the economy planner to rank this round's affordable moves
+    (build an engineer, assemble a plant, wait) by projected income,
+    and makes the best one that is possible on the map.
+    An engineer is only built if there is a free PLAINS tile next to the factory.
+    """
+    warehouse = agent.warehouse or {}
+    economy = current_economy(
+        state["balance"], warehouse, context["deployer_count"],
+        deployed_income(state["map"], state["team"]),
+    )
 
-                logging.debug(f"⚙️ Factory {agent['id']} is building an engineer at {build_step}")
+    build_sites: Optional[List[List[int]]] = None
+    for move, plant in plan_factory(economy):
+        if move == "NONE":
+            break
+
+        if move == "BUILD_BOT":
+            if build_sites is None:
+                build_sites = find_nearby_locations(
+                    state,
+                    list(agent.location),
+                    max_distance=5,
+                    valid_terrain=["PLAINS"],
+                    limit=3,
+                )
+            # Ensure location is valid before building
+            build_step = reserve_first_free(state, list(agent.location), build_sites)
+            if build_step:
+                state["balance"] -= ENGINEER_COST  # Deduct cost
+                logger.debug("⚙️ Factory %s is building an engineer at %s", agent.id, build_step)
                 return {"type": "BUILD_BOT", "params": {"d_loc": build_step}}
+            continue
+
+        assert plant is not None
+        cost = dict(POWER_PLANT_OPTIONS)[plant]
+        state["balance"] -= cost  # Deduct cost
+        warehouse[plant] = warehouse.get(plant, 0) + 1  # Store in warehouse
+        logger.debug(
+            "Factory %s assembling %s (cost=%s, balance after purchase=%s)",
+            agent.id, plant, cost, state["balance"],
+        )
+        return {"type": "ASSEMBLE_POWER_PLANT", "params": {"power_type": plant}}
 
-    # Step 4: If no valid actions, do nothing
-    logging.debug(
-        f"Factory {agent['id']} is doing NOTHING (balance={BOTS_DB['balance']})"
-    )
+    # If no valid actions, do nothing
+    logger.debug("Factory %s is doing NOTHING (balance=%s)", agent.id, state["balance"])
     return {"type": "NONE", "params": {}}
 
 
 def find_nearby_location(
+    state: Dict[str, Any],
     location: List[int],
-    map_data: List[List[Any]],
     max_distance: int = 2,
     valid_terrain: Optional[List[str]] = None,
     target_location: Optional[List[int]] = None
@@ -232,53 +382,86 @@ def find_nearby_location(
     Finds the nearest available location for an action (movement, deployment).
     Ensures location is unoccupied and on valid terrain.
     """
+    candidates = find_nearby_locations(
+        state, location, max_distance, valid_terrain, target_location, limit=1
+    )
+    return candidates[0] if candidates else None
+
+
+@timed
+def find_nearby_locations(
+    state: Dict[str, Any],
+    location: List[int],
+    max_distance: int = 2,
+    valid_terrain: Optional[List[str]] = None,
+    target_location: Optional[List[int]] = None,
+    limit: int = 1,
+) -> List[List[int]]:
+    """
+    Returns up to `limit` free [dx, dy] offsets on valid terrain, best first.
+    Offsets come from precomputed Manhattan rings, nearest ring first, so the
+    search stops as soon as enough candidates are found. With a target location,
+    every ring is checked and candidates are ranked by their distance to the target.
+    """
     x, y = location
+    map_data: GameMap = state["map"]
     map_size = len(map_data)
-    closest_location = None
-    min_distance = float("inf")
-
-    logging.debug(f"🔍 Searching for a nearby location from {location} within {max_distance} tiles.")
-
-    for dx in range(-max_distance, max_distance + 1):
-        for dy in range(-max_distance, max_distance + 1):
-            new_x, new_y = x + dx, y + dy
-
-            # Ensure within map bounds
-            if not (0 <= new_x < map_size and 0 <= new_y < map_size):
-                continue
-            # Ensure Manhattan distance is within range
-            distance = abs(dx) + abs(dy)
-            if distance > max_distance:
-                continue
-
-            cell = map_data[new_y][new_x]
-
-            # Ensure the cell exists and is unoccupied
-            if (
-                cell is not None  # Ensure cell exists
-                and "type" in cell
-                and (valid_terrain is None or cell["type"] in valid_terrain)
-                and (new_x, new_y) not in BOTS_DB["occupied_locations"]  # Ensure it's not occupied
-            ):
-                logging.debug(
-                    f"Target location {(new_x, new_y)}. Occupied {BOTS_DB['occupied_locations']}"
-                )
-                # If moving towards a specific target, prefer locations closer to it
-                if target_location:
-                    target_distance = (
-                        abs(target_location[0] - new_x)
-                        + abs(target_location[1] - new_y)
-                    )
-                    if target_distance < min_distance:
-                        closest_location = [dx, dy]
-                        min_distance = target_distance
-                else:
-                    if distance < min_distance:
-                        closest_location = [dx, dy]
-                        min_distance = distance
-
-                logging.debug(f"✅ Found valid location at {new_x, new_y} (dx={dx}, dy={dy})")
-
-    if closest_location is None:
-        logging.debug(f"❌ No valid locations found near {location}")
-    return closest_location
+    occupancy = state["occupancy"]
+
+    # Nothing to search for if no cell of the requested terrain is known
+    if valid_terrain is not None and not any(
+        name in TERRAIN_CODES and TERRAIN_CODES[name] in map_data.terrain for name in valid_terrain
+    ):
+        logger.debug("❌ No %s tiles known, skipping search near %s", valid_terrain, location)
+        return []
+
+    MAP_SCANS.inc("nearby")
+    candidates: List[List[int]] = []
+    for dx, dy, _ in manhattan_rings(max_distance):
+        new_x, new_y = x + dx, y + dy
+
+        # Ensure within map bounds, on known valid terrain and not occupied
+        if not (0 <= new_x < map_size and 0 <= new_y < map_size):
+            continue
+        terrain = map_data.terrain_at(new_x, new_y)
+        if terrain is None or (valid_terrain is not None and terrain not in valid_terrain):
+            continue
+        if not occupancy.is_free(new_x, new_y):
+            continue
+
+        candidates.append([dx, dy])
+        if target_location is None and len(candidates) >= limit:
+            break
+
+    # If moving towards a specific target, prefer locations closer to it
+    if target_location is not None:
+        target_dx, target_dy = target_location[0] - x, target_location[1] - y
+        candidates.sort(key=lambda offset: abs(target_dx - offset[0]) + abs(target_dy - offset[1]))
+        del candidates[limit:]
+
+    if not candidates:
+        logger.debug("❌ No valid locations found near %s", location)
+    return candidates
+
+
+def first_free(
+    state: Dict[str, Any], location: List[int], candidates: List[List[int]]
+) -> Optional[List[int]]:
+    """Returns the first candidate offset whose tile is still free this round."""
+    for dx, dy in candidates:
+        if state["occupancy"].is_free(location[0] + dx, location[1] + dy):
+            return [dx, dy]
+    return None
+
+
+def reserve_first_free(
+    state: Dict[str, Any], location: List[int], candidates: List[List[int]]
+) -> Optional[List[int]]:
+    """
+    Reserves the first candidate offset whose tile is still free this round.
+    Lets contended searches fall back to the next candidate without searching again.
+    """
+    for dx, dy in candidates:
+        if state["occupancy"].reserve(location[0] + dx, location[1] + dy):
+            return [dx, dy]
+    return None
@@ -0,0 +1,119 @@
+"""
+ASGI serving mode.
+
+`application` exposes the Flask handlers through asgiref's WSGI-to-ASGI
+adapter, so any ASGI server can run the bot:
+
+    uvicorn asgi:application --port 5000
+
+asgiref runs sync code "thread-sensitively" by default: every request on
+one shared thread, which would serialize all games. Here each request runs
+on a pool of BOT_ASGI_THREADS worker threads instead; requests of the same
+game still wait for each other on the per-game lock (main.before_request).
+
+Game state lives in process memory, so every request of one game has to
+reach the same process. For a multi-worker node, run this module: it starts
+one uvicorn process per worker on consecutive ports, and a proxy in front
+routes by game id (X-Game-Id header or /game/<id> prefix), e.g. nginx
+`hash $http_x_game_id consistent;`.
+
+    python asgi.py --workers 4 --base-port 5001
+"""
+import argparse
+import multiprocessing
+import os
+from concurrent.futures import ThreadPoolExecutor
+from tempfile import SpooledTemporaryFile
+from typing import IO, Any, List
+
+from asgiref.sync import AsyncToSync, sync_to_async
+from asgiref.wsgi import WsgiToAsgi, WsgiToAsgiInstance
+
+from bot_logging import configure_logging
+from main import app
+
+ASGI_THREADS = int(os.environ.get("BOT_ASGI_THREADS", "16"))
+
+_EXECUTOR = ThreadPoolExecutor(ASGI_THREADS, thread_name_prefix="bot-request")
+
+
+class ThreadedWsgiToAsgiInstance(WsgiToAsgiInstance):
+    """
+    Handles one request, running the WSGI app on the shared worker pool.
+    Only asgiref's environ and start_response helpers are reused; reading the
+    body and running the app are done here, so the thread choice does not
+    depend on how asgiref decorates its own run_wsgi_app.
+    """
+
+    async def __call__(self, scope: Any, receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            raise ValueError("WSGI wrapper received a non-HTTP scope")
+        self.scope = scope
+        with SpooledTemporaryFile(max_size=65536) as body:
+            while True:
+                message = await receive()
+                if message["type"] != "http.request":
+                    raise ValueError("WSGI wrapper received a non-HTTP-request message")
+                body.write(message.get("body", b""))
+                if not message.get("more_body"):
+                    break
+            body.seek(0)
+            self.sync_send = AsyncToSync(send)
+            await sync_to_async(self.serve, thread_sensitive=False, executor=_EXECUTOR)(body)
+
+    def serve(self, body: IO[bytes]) -> None:
+        """Runs the WSGI app on a worker thread and streams its response."""
+        try:
+            environ = self.build_environ(self.scope, body)
+        except ValueError:  # Too many duplicate headers
+            self.sync_send({
+                "type": "http.response.start", "status": 400,
+                "headers": [(b"content-type", b"text/plain")],
+            })
+            self.sync_send({"type": "http.response.body", "body": b"Bad Request"})
+            return
+        for output in self.wsgi_application(environ, self.start_response):
+            if not self.response_started:
+                self.response_started = True
+                self.sync_send(self.response_start)
+            self.sync_send({"type": "http.response.body", "body": output, "more_body": True})
+        if not self.response_started:
+            self.response_started = True
+            self.sync_send(self.response_start)
+        self.sync_send({"type": "http.response.body"})
+
+
+class ThreadedWsgiToAsgi(WsgiToAsgi):
+    """WsgiToAsgi that serves concurrent requests on different threads."""
+
+    async def __call__(self, scope: Any, receive: Any, send: Any) -> None:
+        instance = ThreadedWsgiToAsgiInstance(self.wsgi_application, self.duplicate_header_limit)
+        await instance(scope, receive, send)
+
+
+application = ThreadedWsgiToAsgi(app)
+
+
+def serve(port: int, log_level: str) -> None:
+    """Runs one single-process ASGI worker."""
+    import uvicorn
+
+    configure_logging(log_level)
+    uvicorn.run("asgi:application", host="0.0.0.0", port=port, log_level=log_level.lower())
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run the bot as ASGI workers, one per port")
+    parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count())
+    parser.add_argument("--base-port", type=int, default=5001)
+    parser.add_argument("--log-level", default="WARNING")
+    args = parser.parse_args()
+
+    workers: List[multiprocessing.Process] = [
+        multiprocessing.Process(target=serve, args=(args.base_port + i, args.log_level))
+        for i in range(args.workers)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
@@ -0,0 +1,212 @@
+"""
+Round-level assignment of engineers to deploy sites and river approach targets.
+
+Deciding engineer by engineer made several of them chase the same river tile
+or deploy site, and all but the first ended up doing nothing. Here all
+engineers are matched in one batch with a greedy auction: every
+(engineer, target) bid is ranked by distance and the cheapest bids win,
+one target per engineer and one engineer per target.
+
+1. Deploy sites: free PLAINS tiles within an engineer's reach, best suited
+   to the next plant to deploy first (see sites.py), then nearest first.
+   Whether a plant is in stock is checked when the engineer acts, so plants
+   the factory assembles earlier in the same round are deployed right away.
+   The engineer then picks the best site for the plant it actually deploys
+   among its own site and the sites in reach that nobody won.
+2. River approaches: distinct river tiles for the engineers that do not
+   deploy. Each engineer bids only on tiles it can walk to: the ones the
+   river distance field leads to from its cell and its neighbours, priced
+   by their walking distance. Engineers with no route to any river make no
+   bid and keep to the field's fallback.
+
+Bids are generated per engineer from local tables (ring offsets, the river
+distance field), so a round costs O(engineers * candidates * walking
+distance), not engineers * map.
+The result is cached per round and dropped whenever /view or /agent changes
+the game (state["revision"]).
+"""
+import logging
+from collections import Counter
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from economy import DEPLOY_ORDER
+from game_state import AgentRegistry, GameMap
+from metrics import timed
+from occupancy import OccupancyGrid
+from pathfinding import DistanceField, find_path, is_passable
+from sites import SiteHeatmap
+from terrain import Location, TerrainIndex, manhattan_rings
+
+logger = logging.getLogger(__name__)
+
+DEPLOY_REACH = 2  # Deploy offsets an engineer can reach without moving
+MOVE_REACH = 2  # Farthest an engineer walks in one MOVE
+RIVER_CANDIDATES = 4  # River tiles each engineer bids on, at most
+
+# (cost, engineer id, target) - or ((-suitability, distance), ...) for deploy sites
+Bid = Tuple[Any, int, Location]
+
+
+@timed
+def assign_engineers(state: Dict[str, Any]) -> Dict[int, Dict[str, Any]]:
+    """
+    Returns {engineer id: {"deploy": [dx, dy] or None, "target": (x, y) or None,
+    "sites": free deploy sites in reach, "options": offsets of the won site and
+    the unclaimed ones, best first}} for every engineer, cached for the current round.
+    """
+    key = (state["round"], state["revision"])
+    cached = state["assignments"]
+    if cached is not None and cached["key"] == key:
+        cached_assignments: Dict[int, Dict[str, Any]] = cached["engineers"]
+        return cached_assignments
+
+    agents: AgentRegistry = state["agents"]
+    engineers = {agent.id: agent.location for agent in agents.of_type("ENGINEER_BOT")}
+    deploy_bids = _deploy_bids(
+        state["map"], state["occupancy"], state["sites"], next_plant(state), engineers
+    )
+    sites_in_reach = Counter(agent_id for _, agent_id, _ in deploy_bids)
+    deploy_sites = _auction(deploy_bids)
+    winners = {site: agent_id for agent_id, site in deploy_sites.items()}
+    options: Dict[int, List[List[int]]] = {agent_id: [] for agent_id in engineers}
+    for _, agent_id, (cell_x, cell_y) in deploy_bids:  # Sorted by the auction
+        if winners.get((cell_x, cell_y), agent_id) == agent_id:
+            x, y = engineers[agent_id]
+            options[agent_id].append([cell_x - x, cell_y - y])
+    targets = _auction(_river_bids(state["river_field"], engineers))
+
+    assignments: Dict[int, Dict[str, Any]] = {}
+    for agent_id, (x, y) in engineers.items():
+        site = deploy_sites.get(agent_id)
+        assignments[agent_id] = {
+            "deploy": [site[0] - x, site[1] - y] if site is not None else None,
+            "target": targets.get(agent_id),
+            "sites": sites_in_reach[agent_id],
+            "options": options[agent_id],
+        }
+    state["assignments"] = {"key": key, "engineers": assignments}
+    logger.debug(
+        "🧭 Assigned %s deploy sites and %s river targets to %s engineers",
+        len(deploy_sites), len(targets), len(engineers),
+    )
+    return assignments
+
+
+def _auction(bids: List[Bid]) -> Dict[int, Location]:
+    """Greedy matching: cheapest bids first, each engineer and target used once."""
+    bids.sort()
+    won: Dict[int, Location] = {}
+    taken: Set[Location] = set()
+    for _, agent_id, target in bids:
+        if agent_id in won or target in taken:
+            continue
+        won[agent_id] = target
+        taken.add(target)
+    return won
+
+
+def next_plant(state: Dict[str, Any]) -> str:
+    """
+    The plant engineers will most likely deploy next: the best stocked one,
+    or the best one overall while the warehouse is empty (the factory
+    assembles before engineers act, and prefers the best plant it can afford).
+    """
+    agents: AgentRegistry = state["agents"]
+    factory = agents.first("FACTORY")
+    warehouse = (factory.warehouse if factory is not None else None) or {}
+    for plant in DEPLOY_ORDER:
+        if warehouse.get(plant, 0) > 0:
+            return plant
+    return DEPLOY_ORDER[0]
+
+
+def _deploy_bids(
+    game_map: GameMap, occupancy: OccupancyGrid, sites: SiteHeatmap, plant: str,
+    engineers: Dict[int, Location],
+) -> List[Bid]:
+    bids: List[Bid] = []
+    for agent_id, (x, y) in engineers.items():
+        for dx, dy, distance in manhattan_rings(DEPLOY_REACH):
+            cell_x, cell_y = x + dx, y + dy
+            if not occupancy.is_free(cell_x, cell_y) or not game_map.in_bounds(cell_x, cell_y):
+                continue
+            if game_map.terrain_at(cell_x, cell_y) == "PLAINS":
+                cost = (-sites.score(plant, cell_x, cell_y), distance)
+                bids.append((cost, agent_id, (cell_x, cell_y)))
+    return bids
+
+
+def _river_bids(river_field: DistanceField, engineers: Dict[int, Location]) -> List[Bid]:
+    """Bids on the river tiles the field leads to from each engineer and its neighbours."""
+    bids: List[Bid] = []
+    for agent_id, (x, y) in engineers.items():
+        found: Dict[Location, int] = {}
+        for dx, dy, step in manhattan_rings(1):
+            start = (x + dx, y + dy)
+            distance = river_field.distance(start)
+            river = river_field.nearest_source(start)
+            if distance is None or river is None:
+                continue
+            if step + distance < found.get(river, step + distance + 1):
+                found[river] = step + distance
+        ranked = sorted((cost, river) for river, cost in found.items())
+        bids.extend((cost, agent_id, river) for cost, river in ranked[:RIVER_CANDIDATES])
+    return bids
+
+
+def step_toward(
+    state: Dict[str, Any], location: Location, target: Location, max_distance: int = 2
+) -> Optional[List[int]]:
+    """
+    Moves (as a [dx, dy] offset) toward `target`: the direct step if there is
+    one, else along an A* path around the obstacle (impassable terrain or
+    other agents in the way); None if there is no path either.
+    """
+    return (
+        direct_step(state, location, target, max_distance)
+        or _path_step(state, location, target, max_distance)
+    )
+
+
+def direct_step(
+    state: Dict[str, Any], location: Location, target: Location, max_distance: int = 2
+) -> Optional[List[int]]:
+    """
+    Picks the free, walkable move (as a [dx, dy] offset) that gets closest to
+    `target`, breaking ties by the river distance field. Reads only the cells
+    within `max_distance`; returns None if none of them gets closer.
+    """
+    x, y = location
+    occupancy: OccupancyGrid = state["occupancy"]
+    terrain_index: TerrainIndex = state["terrain_index"]
+    river_field: DistanceField = state["river_field"]
+    current = abs(target[0] - x) + abs(target[1] - y)
+
+    best: Optional[Tuple[int, int, int, int, int]] = None  # (distance, field, step, dy, dx)
+    for dx, dy, step in manhattan_rings(max_distance)[1:]:
+        cell = (x + dx, y + dy)
+        distance = abs(target[0] - cell[0]) + abs(target[1] - cell[1])
+        if distance >= current or not occupancy.is_free(*cell):
+            continue
+        terrain = terrain_index.terrain(*cell)
+        if terrain is None or not is_passable(terrain):
+            continue
+        field = river_field.distance(cell)
+        candidate = (distance, field if field is not None else current, step, dy, dx)
+        if best is None or candidate < best:
+            best = candidate
+    return [best[4], best[3]] if best is not None else None
+
+
+def _path_step(
+    state: Dict[str, Any], location: Location, target: Location, max_distance: int
+) -> Optional[List[int]]:
+    """The farthest free cell within `max_distance` steps along an A* path to `target`."""
+    occupancy: OccupancyGrid = state["occupancy"]
+    path = find_path(location, target, state["terrain_index"], blocked=occupancy)
+    if path is None:
+        return None
+    for cell in reversed(path[1:max_distance + 1]):
+        if occupancy.is_free(*cell):
+            return [cell[0] - location[0], cell[1] - location[1]]
+    return None
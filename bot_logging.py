@@ -0,0 +1,67 @@
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Optional, TextIO
+
+LOG_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+LOG_LEVEL_ENV = "BOT_LOG_LEVEL"
+TRACE_FILE_ENV = "BOT_TRACE_FILE"
+DEFAULT_LOG_LEVEL = "INFO"
+
+_trace_stream: Optional[TextIO] = None
+_trace_lock = threading.Lock()
+_request = threading.local()
+
+
+def configure_logging(level: Optional[str] = None, trace_file: Optional[str] = None) -> None:
+    """
+    Configures logging for the whole bot in one place.
+    Explicit arguments (CLI options) win over the BOT_LOG_LEVEL and
+    BOT_TRACE_FILE environment variables.
+    """
+    global _trace_stream
+
+    level_name = (level or os.environ.get(LOG_LEVEL_ENV) or DEFAULT_LOG_LEVEL).upper()
+    logging.basicConfig(level=level_name, format=LOG_FORMAT, force=True)
+
+    trace_path = trace_file or os.environ.get(TRACE_FILE_ENV)
+    with _trace_lock:
+        if _trace_stream is not None:
+            _trace_stream.close()
+            _trace_stream = None
+        if trace_path:
+            _trace_stream = open(trace_path, "a", encoding="utf-8")
+
+
+def start_trace(method: str, path: str) -> None:
+    """Opens the trace record of the current request (no-op when tracing is off)."""
+    if _trace_stream is None:
+        return
+    _request.trace = {"method": method, "path": path}
+    _request.started = time.perf_counter()
+
+
+def trace_note(key: str, value: Any) -> None:
+    """Adds a field to the decision summary of the current request."""
+    trace: Optional[Dict[str, Any]] = getattr(_request, "trace", None)
+    if trace is not None:
+        trace[key] = value
+
+
+def finish_trace(status: int) -> None:
+    """Writes the current request's trace as one JSON line."""
+    trace: Optional[Dict[str, Any]] = getattr(_request, "trace", None)
+    if trace is None:
+        return
+    _request.trace = None
+
+    trace["status"] = status
+    trace["duration_ms"] = round((time.perf_counter() - _request.started) * 1000, 3)
+    trace["ts"] = time.time()
+    line = json.dumps(trace, default=str)
+    with _trace_lock:
+        if _trace_stream is not None:
+            _trace_stream.write(line + "\n")
+            _trace_stream.flush()
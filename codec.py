@@ -0,0 +1,227 @@
+"""
+Request/response codec and the compact map wire formats.
+
+JSON goes through orjson when it is installed and the stdlib json module
+otherwise; FastJSONProvider plugs the same functions into Flask so
+`request.json` and `jsonify` use them too.
+
+Besides plain JSON (rows of cell dicts), /init and /agent/<id>/view accept
+two compact map encodings, selected by the request's Content-Type:
+
+    application/vnd.bot.map-rle+json
+        {"map": [[[terrain, count], ...], ...], "cells": [...]}
+        One list of runs per row; a null terrain run is a hidden stretch.
+
+    application/vnd.bot.map-b64+json
+        {"map": {"terrain": [null, "PLAINS", ...], "codes": "<base64>"}, "cells": [...]}
+        size*size uint8 codes indexing "terrain", row-major; code 0 is hidden.
+
+In both, "cells" lists only the cells that carry more than terrain
+(`{"location": [x, y], "agent": {...}}`). Compact maps are decoded straight
+into terrain-code segments (see EncodedMap) without a dict per cell.
+"""
+import base64
+import binascii
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from flask.json.provider import DefaultJSONProvider
+
+from game_state import TERRAIN_NAMES, terrain_code
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None  # type: ignore[assignment]
+
+JSON = "application/json"
+MAP_RLE = "application/vnd.bot.map-rle+json"
+MAP_B64 = "application/vnd.bot.map-b64+json"
+
+# (y, x, terrain codes) - a run of visible cells within one row
+Segment = Tuple[int, int, bytes]
+
+_VISIBLE_RUNS = re.compile(rb"[^\x00]+")
+
+
+def loads(data: Union[bytes, str]) -> Any:
+    """Parses a JSON document."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(obj: Any) -> str:
+    """Serializes to compact JSON with sorted keys."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS).decode()
+    return json.dumps(obj, separators=(",", ":"), sort_keys=True)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by loads/dumps above."""
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        if orjson is None or kwargs.get("indent"):
+            return super().dumps(obj, **kwargs)
+        return dumps(obj)
+
+    def loads(self, s: Union[str, bytes], **kwargs: Any) -> Any:
+        return loads(s)
+
+
+class EncodedMap:
+    """A map payload decoded into terrain-code segments plus the cells with attributes."""
+
+    def __init__(self, size: int, segments: List[Segment], cells: List[Any]) -> None:
+        self.size = size
+        self.segments = segments
+        self.cells = cells
+
+
+def media_type(content_type: Optional[str]) -> str:
+    """Strips parameters (charset, ...) from a Content-Type header."""
+    return (content_type or JSON).split(";", 1)[0].strip().lower()
+
+
+def decode_map(
+    content_type: str, data: Dict[str, Any], size: Optional[int] = None
+) -> Union[List[Any], EncodedMap]:
+    """
+    Returns the "map" of a request body: the rows as sent for plain JSON,
+    an EncodedMap for the compact formats. Raises ValueError on bad input,
+    including compact maps whose width is not the game's map `size`.
+    """
+    if "map" not in data:
+        raise ValueError("missing 'map' key")
+    payload = data["map"]
+    cells = data.get("cells") or []
+    if not isinstance(cells, list):
+        raise ValueError("'cells' must be a list")
+    if content_type == MAP_RLE:
+        return decode_rle(payload, cells, size)
+    if content_type == MAP_B64:
+        return decode_b64(payload, cells, size)
+    if not isinstance(payload, list):
+        raise ValueError("'map' must be a list of rows")
+    return payload
+
+
+def decode_rle(rows: Any, cells: List[Any], size: Optional[int] = None) -> EncodedMap:
+    """
+    Decodes run-length rows; adjacent visible runs are joined into one segment.
+    With a `size`, every row must cover exactly `size` cells; missing rows at
+    the bottom are hidden.
+    """
+    if not isinstance(rows, list):
+        raise ValueError("'map' must be a list of run-length rows")
+    if size is not None and len(rows) > size:
+        raise ValueError(f"{len(rows)} rows do not fit a {size}x{size} map")
+    segments: List[Segment] = []
+    for y, runs in enumerate(rows):
+        if not isinstance(runs, list):
+            raise ValueError(f"row {y} must be a list of [terrain, count] runs")
+        x = 0
+        pending = bytearray()
+        for run in runs:
+            code, count = _decode_run(run, y)
+            if code is None:
+                if pending:
+                    segments.append((y, x - len(pending), bytes(pending)))
+                    pending = bytearray()
+            else:
+                pending += bytes([code]) * count
+            x += count
+        if size is not None and x != size:
+            raise ValueError(f"row {y} covers {x} cells, not {size}")
+        if pending:
+            segments.append((y, x - len(pending), bytes(pending)))
+    return EncodedMap(size if size is not None else len(rows), segments, cells)
+
+
+def _decode_run(run: Any, y: int) -> Tuple[Optional[int], int]:
+    """Validates one [terrain, count] run; returns (terrain code or None if hidden, count)."""
+    if not isinstance(run, list) or len(run) != 2:
+        raise ValueError(f"invalid run {run!r} in row {y}")
+    name, count = run
+    if not isinstance(count, int) or count < 0:
+        raise ValueError(f"invalid run length {count!r} in row {y}")
+    if name is None:
+        return None, count
+    if not isinstance(name, str):
+        raise ValueError(f"invalid terrain {name!r} in row {y}")
+    return terrain_code(name), count
+
+
+def decode_b64(payload: Any, cells: List[Any], size: Optional[int] = None) -> EncodedMap:
+    """
+    Decodes a base64 uint8 code array, translating the sender's codes to ours.
+    The map must be square, and `size` x `size` when a size is given.
+    """
+    if not isinstance(payload, dict):
+        raise ValueError("'map' must be an object with 'terrain' and 'codes'")
+    names = payload.get("terrain")
+    if not isinstance(names, list) or len(names) > 256 or (names and names[0] is not None):
+        raise ValueError("'terrain' must list up to 256 names, starting with null")
+    try:
+        codes = base64.b64decode(payload.get("codes", ""), validate=True)
+    except (binascii.Error, TypeError) as error:
+        raise ValueError(f"invalid base64 codes: {error}") from None
+
+    side = int(len(codes) ** 0.5)
+    if side * side != len(codes):
+        raise ValueError(f"{len(codes)} codes do not form a square map")
+    if size is not None and side != size:
+        raise ValueError(f"{len(codes)} codes form a {side}x{side} map, not {size}x{size}")
+    table = bytearray(256)
+    for code, name in enumerate(names):
+        if isinstance(name, str):
+            table[code] = terrain_code(name)
+    codes = codes.translate(table)
+
+    segments: List[Segment] = []
+    for y in range(side):
+        row = codes[y * side:(y + 1) * side]
+        segments.extend((y, match.start(), match.group()) for match in _VISIBLE_RUNS.finditer(row))
+    return EncodedMap(side, segments, cells)
+
+
+def _row_codes(row: List[Any]) -> Tuple[bytearray, List[Dict[str, Any]]]:
+    """Terrain codes of a platform-style row and its cells with extra attributes."""
+    codes = bytearray(len(row))
+    cells = []
+    for x, cell in enumerate(row):
+        if isinstance(cell, dict) and isinstance(cell.get("type"), str):
+            codes[x] = terrain_code(cell["type"])
+            if len(cell) > 2:
+                cells.append(cell)
+    return codes, cells
+
+
+def encode_rle(rows: List[List[Any]]) -> Dict[str, Any]:
+    """Encodes platform-style rows of cell dicts as an RLE body (the client side)."""
+    encoded_rows: List[List[List[Any]]] = []
+    cells: List[Dict[str, Any]] = []
+    for row in rows:
+        codes, row_cells = _row_codes(row)
+        cells.extend(row_cells)
+        runs: List[List[Any]] = []
+        for match in re.finditer(rb"(.)\1*", bytes(codes), re.DOTALL):
+            runs.append([TERRAIN_NAMES[codes[match.start()]], match.end() - match.start()])
+        encoded_rows.append(runs)
+    return {"map": encoded_rows, "cells": cells}
+
+
+def encode_b64(rows: List[List[Any]]) -> Dict[str, Any]:
+    """Encodes platform-style rows of cell dicts as a base64 body (the client side)."""
+    codes = bytearray()
+    cells: List[Dict[str, Any]] = []
+    for row in rows:
+        row_codes, row_cells = _row_codes(row)
+        codes += row_codes
+        cells.extend(row_cells)
+    return {
+        "map": {"terrain": list(TERRAIN_NAMES), "codes": base64.b64encode(codes).decode()},
+        "cells": cells,
+    }
@@ -0,0 +1,71 @@
+"""
+Bounded LRU cache of agent decisions, keyed on fingerprints of their inputs.
+
+Late in a match most engineers stand still or shuttle between the same
+tiles, and their decision comes out the same round after round. A
+fingerprint captures everything a decision reads: the agent's position,
+the terrain, occupancy and river distances in its window, its assignment,
+the stocked plant types and whether exploring would pay off (which folds
+the balance into one bit). Because the key holds the inputs themselves,
+a /view, PATCH or /round that changes any of them yields a different key,
+so stale entries are never returned and simply age out of the LRU.
+
+Decisions are cached without their side effects (reservations, warehouse
+and knowledge updates); the caller applies those on hits and misses alike.
+"""
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+from metrics import REGISTRY, Counter, Gauge
+
+DECISION_CACHE_SIZE = int(os.environ.get("BOT_DECISION_CACHE_SIZE", "4096"))
+
+DECISION_CACHE: Counter = REGISTRY.register(Counter(
+    "bot_decision_cache_total", "Agent decision cache lookups, per result.", ("result",),
+))
+
+
+class DecisionCache:
+    """
+    A thread-safe LRU map from decision fingerprints to decisions. Hits and
+    misses are counted in bot_decision_cache_total, entries in a gauge.
+    """
+
+    def __init__(self, max_size: int = DECISION_CACHE_SIZE) -> None:
+        self.max_size = max_size
+        self.entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self.lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self.lock:
+            decision = self.entries.get(key)
+            if decision is not None:
+                self.entries.move_to_end(key)
+        DECISION_CACHE.inc("miss" if decision is None else "hit")
+        return decision
+
+    def put(self, key: Hashable, decision: Any) -> None:
+        if self.max_size <= 0:
+            return
+        with self.lock:
+            self.entries[key] = decision
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+
+
+ENGINEER_DECISIONS = DecisionCache()
+
+REGISTRY.register(Gauge(
+    "bot_decision_cache_entries", "Decisions held in the cache.", (),
+    lambda: {(): len(ENGINEER_DECISIONS)},
+))
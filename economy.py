@@ -0,0 +1,174 @@
+"""
+Economy planner for the factory.
+
+Looks several rounds ahead over factory moves (build an engineer, assemble
+a plant, wait) with a beam search. Each round of the model:
+
+1. the factory makes one move and pays for it,
+2. every engineer deploys one plant from the warehouse (best income first)
+   while the balance covers DEPLOY_COST,
+3. the deployed plants produce their income.
+
+States are deduplicated per depth on (balance, warehouse, engineers, income),
+so converging move orders are expanded once. A plan is scored by the balance
+at the horizon plus the income rate over TAIL_ROUNDS more rounds.
+
+Completed searches are cached on their exact starting state. Within a game
+that state rarely repeats (the balance moves every round), so the cache
+mostly serves states every game passes through, such as the opening rounds
+from the same initial balance, and re-plans of an unchanged round. Keying
+on a coarser balance would hand out rankings planned for a different
+deploy capacity (balance // DEPLOY_COST).
+"""
+import heapq
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from game_state import (
+    DEPLOY_COST, ENGINEER_COST, POWER_PLANT_INCOME, POWER_PLANT_OPTIONS, GameMap,
+)
+from metrics import timed
+
+logger = logging.getLogger(__name__)
+
+PLANT_NAMES = tuple(name for name, _ in POWER_PLANT_OPTIONS)
+PLANT_PRICES = tuple(price for _, price in POWER_PLANT_OPTIONS)
+PLANT_INCOME = tuple(POWER_PLANT_INCOME.get(name, 0) for name in PLANT_NAMES)
+# Engineers deploy the plant with the best income first
+DEPLOY_ORDER = tuple(sorted(PLANT_NAMES, key=lambda name: -POWER_PLANT_INCOME.get(name, 0)))
+_DEPLOY_INDEXES = tuple(PLANT_NAMES.index(name) for name in DEPLOY_ORDER)
+
+HORIZON = int(os.environ.get("BOT_ECONOMY_HORIZON", "12"))
+BEAM_WIDTH = int(os.environ.get("BOT_ECONOMY_BEAM", "64"))
+TIME_BUDGET = float(os.environ.get("BOT_ECONOMY_BUDGET_MS", "20")) / 1000
+TAIL_ROUNDS = int(os.environ.get("BOT_ECONOMY_TAIL_ROUNDS", "50"))
+CACHE_SIZE = 4096
+
+# ("BUILD_BOT", None), ("ASSEMBLE_POWER_PLANT", plant) or ("NONE", None)
+FactoryMove = Tuple[str, Optional[str]]
+WAIT: FactoryMove = ("NONE", None)
+BUILD: FactoryMove = ("BUILD_BOT", None)
+
+
+class Economy(NamedTuple):
+    balance: int
+    warehouse: Tuple[int, ...]  # Plant counts in PLANT_NAMES order
+    engineers: int
+    income: int  # Energy per round from deployed plants
+
+
+def current_economy(
+    balance: int, warehouse: Dict[str, int], engineers: int, income: int
+) -> Economy:
+    return Economy(
+        balance, tuple(warehouse.get(name, 0) for name in PLANT_NAMES), engineers, income
+    )
+
+
+def deployed_income(game_map: GameMap, team: Optional[str]) -> int:
+    """Sums the income of the power plants on the map that belong to us (or to nobody known)."""
+    income = 0
+    for extras in game_map.extras.values():
+        agent = extras.get("agent")
+        if isinstance(agent, dict) and agent.get("team") in (None, team):
+            income += POWER_PLANT_INCOME.get(agent.get("type", ""), 0)
+    return income
+
+
+def factory_moves(economy: Economy) -> List[Tuple[FactoryMove, Economy]]:
+    """The moves the factory can afford, with the state after paying for each."""
+    balance, warehouse, engineers, income = economy
+    moves = [(WAIT, economy)]
+    if balance >= ENGINEER_COST:
+        moves.append((BUILD, Economy(balance - ENGINEER_COST, warehouse, engineers + 1, income)))
+    for i, price in enumerate(PLANT_PRICES):
+        if balance >= price:
+            stocked = warehouse[:i] + (warehouse[i] + 1,) + warehouse[i + 1:]
+            moves.append((
+                ("ASSEMBLE_POWER_PLANT", PLANT_NAMES[i]),
+                Economy(balance - price, stocked, engineers, income),
+            ))
+    return moves
+
+
+def finish_round(economy: Economy) -> Economy:
+    """Engineers deploy what they can, then the plants produce."""
+    balance, warehouse, engineers, income = economy
+    deploys = min(engineers, sum(warehouse), balance // DEPLOY_COST)
+    if deploys <= 0:
+        return Economy(balance + income, warehouse, engineers, income)
+
+    stock = list(warehouse)
+    balance -= deploys * DEPLOY_COST
+    for i in _DEPLOY_INDEXES:
+        taken = min(stock[i], deploys)
+        stock[i] -= taken
+        income += taken * PLANT_INCOME[i]
+        deploys -= taken
+    return Economy(balance + income, tuple(stock), engineers, income)
+
+
+def score(economy: Economy) -> int:
+    return economy.balance + economy.income * TAIL_ROUNDS
+
+
+def _state_score(item: Tuple[Economy, FactoryMove]) -> int:
+    return item[0].balance + item[0].income * TAIL_ROUNDS
+
+
+# Shared by every game, which is where its hits come from; requests of
+# different games plan on parallel threads
+_cache: "OrderedDict[Tuple[Economy, int], List[FactoryMove]]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+@timed
+def plan_factory(
+    economy: Economy, horizon: int = HORIZON, budget: Optional[float] = None
+) -> List[FactoryMove]:
+    """
+    Returns the factory's affordable moves this round, best first.
+    The search stops early (keeping the depth reached) once `budget` seconds
+    (TIME_BUDGET by default) are spent.
+    """
+    key = (economy, horizon)
+    with _cache_lock:
+        cached = _cache.get(key)
+        if cached is not None:
+            _cache.move_to_end(key)
+            return cached
+
+    deadline = time.perf_counter() + (TIME_BUDGET if budget is None else budget)
+    # Frontier state -> the first move that led to it
+    beam: Dict[Economy, FactoryMove] = {}
+    for move, after in factory_moves(economy):
+        beam.setdefault(finish_round(after), move)
+
+    depth = 1
+    while depth < horizon and time.perf_counter() < deadline:
+        frontier: Dict[Economy, FactoryMove] = {}
+        for state, first_move in beam.items():
+            for _, after in factory_moves(state):
+                frontier.setdefault(finish_round(after), first_move)
+        beam = dict(heapq.nlargest(BEAM_WIDTH, frontier.items(), key=_state_score))
+        depth += 1
+
+    best: Dict[FactoryMove, int] = {}
+    for state, first_move in beam.items():
+        best[first_move] = max(best.get(first_move, score(state)), score(state))
+    # Moves that fell out of the beam still rank, behind every surviving one
+    ranked = sorted(best, key=lambda move: -best[move])
+    ranked += [move for move, _ in factory_moves(economy) if move not in best]
+
+    if depth < horizon:
+        logger.debug("⏱️ Economy search stopped at depth %s of %s", depth, horizon)
+    else:
+        with _cache_lock:
+            _cache[key] = ranked
+            if len(_cache) > CACHE_SIZE:
+                _cache.popitem(last=False)
+    return ranked
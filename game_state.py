@@ -1,15 +1,612 @@
-from typing import Dict, Any
-
-BOTS_DB: Dict[str, Any] = {
-    "map_size": None,
-    "init_balance": None,
-    "team": None,
-    "round": 0,
-    "balance": 0,
-    "agents": {},
-    "occupied_locations": set(),
-    "map": []
-}
+import logging
+import os
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from collections.abc import Mapping
+from typing import Callable, Dict, Any, Iterable, Iterator, List, Optional, Set, Tuple
+from terrain import (  # noqa: F401 - the terrain code table is re-exported
+    TERRAIN_CODES, TERRAIN_NAMES, Location, TerrainIndex, terrain_code,
+)
+from occupancy import OccupancyGrid
+from pathfinding import DistanceField
+from knowledge import Knowledge
+from sites import SiteHeatmap
+
+logger = logging.getLogger(__name__)
+
+NO_AGENT = -1
+
+
+class GameMap:
+    """
+    Compact square map: terrain codes in a uint8 bytearray, agent ids in an
+    int32 array and a sparse side-table for the rare per-cell attributes
+    (agent details, anything else the platform sends).
+
+    Rows and cells can still be read as dicts (`game_map[y][x]`), but every
+    read builds a new dict, so changing it does not change the map: writes go
+    through `game_map[y][x] = cell`, `set_cell` or `set_agent`. Hot paths
+    should use the typed accessors.
+    """
+
+    def __init__(self, size: int) -> None:
+        self.size = size
+        self.terrain = bytearray(size * size)
+        self.agent_ids = array("i", [NO_AGENT]) * (size * size)
+        self.extras: Dict[int, Dict[str, Any]] = {}
+
+    @classmethod
+    def from_rows(cls, rows: List[List[Any]]) -> "GameMap":
+        """Builds a map from the platform's list-of-lists of cell dicts."""
+        game_map = cls(len(rows))
+        for row_index, row in enumerate(rows):
+            for column, cell in enumerate(row[:game_map.size]):
+                # Cells are placed by their "location" (x, y); the list position is a fallback
+                x, y = _cell_location(cell) or (column, row_index)
+                if game_map.in_bounds(x, y):
+                    game_map.set_cell(x, y, cell)
+        return game_map
+
+    @classmethod
+    def from_arrays(
+        cls, terrain: bytearray, agent_ids: "array[int]", extras: Dict[int, Dict[str, Any]]
+    ) -> "GameMap":
+        """Wraps already-encoded arrays (e.g. restored from a snapshot) without copying."""
+        size = int(len(terrain) ** 0.5)
+        if size * size != len(terrain) or len(agent_ids) != len(terrain):
+            raise ValueError("Map arrays do not describe a square map")
+        game_map = cls(0)
+        game_map.size = size
+        game_map.terrain = terrain
+        game_map.agent_ids = agent_ids
+        game_map.extras = extras
+        return game_map
+
+    @classmethod
+    def from_segments(
+        cls, size: int, segments: Iterable[Tuple[int, int, bytes]], cells: List[Any]
+    ) -> "GameMap":
+        """Builds a map from a view decoded from a compact wire format."""
+        game_map = cls(size)
+        game_map.merge_segments(segments, cells)
+        return game_map
+
+    @classmethod
+    def filled(cls, size: int, terrain: str) -> "GameMap":
+        """Builds a map where every cell has the same terrain."""
+        game_map = cls(size)
+        game_map.terrain[:] = bytes([terrain_code(terrain)]) * (size * size)
+        return game_map
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __getitem__(self, y: int) -> "GameMapRow":
+        if not 0 <= y < self.size:
+            raise IndexError(y)
+        return GameMapRow(self, y)
+
+    def __iter__(self) -> Iterator["GameMapRow"]:
+        return (GameMapRow(self, y) for y in range(self.size))
+
+    def in_bounds(self, x: int, y: int) -> bool:
+        return 0 <= x < self.size and 0 <= y < self.size
+
+    def terrain_at(self, x: int, y: int) -> Optional[str]:
+        """Returns the terrain type of a cell, or None if it is unknown."""
+        return TERRAIN_NAMES[self.terrain[y * self.size + x]]
+
+    def agent_id_at(self, x: int, y: int) -> Optional[int]:
+        """Returns the id of the agent standing on a cell, if any."""
+        agent_id = self.agent_ids[y * self.size + x]
+        return None if agent_id == NO_AGENT else agent_id
+
+    def has_agent(self, x: int, y: int) -> bool:
+        """True if an agent or power plant (with or without an id) stands on a cell."""
+        index = y * self.size + x
+        if self.agent_ids[index] != NO_AGENT:
+            return True
+        extras = self.extras.get(index)
+        return extras is not None and "agent" in extras
+
+    def known_terrain(self) -> Iterator[Tuple[int, int, str]]:
+        """Yields (x, y, terrain) for every cell with known terrain."""
+        size = self.size
+        for index, code in enumerate(self.terrain):
+            if code:
+                name = TERRAIN_NAMES[code]
+                assert name is not None
+                yield index % size, index // size, name
+
+    def set_agent(self, x: int, y: int, agent: Optional[Dict[str, Any]]) -> None:
+        """Places an agent on a cell, or clears the cell when agent is None."""
+        index = y * self.size + x
+        extras = self.extras.get(index)
+        if agent is None:
+            self.agent_ids[index] = NO_AGENT
+            if extras is not None:
+                extras.pop("agent", None)
+                if not extras:
+                    del self.extras[index]
+            return
+        agent_id = agent.get("id")
+        self.agent_ids[index] = agent_id if isinstance(agent_id, int) else NO_AGENT
+        self.extras.setdefault(index, {})["agent"] = agent
+
+    def cell(self, x: int, y: int) -> Optional[Dict[str, Any]]:
+        """
+        Materializes a cell as a platform-style dict (None if nothing is known).
+        The dict is a copy: write changes back with set_cell.
+        """
+        index = y * self.size + x
+        name = TERRAIN_NAMES[self.terrain[index]]
+        extras = self.extras.get(index)
+        if name is None and extras is None:
+            return None
+        cell: Dict[str, Any] = {}
+        if name is not None:
+            cell["type"] = name
+            cell["location"] = [x, y]
+        if extras is not None:
+            cell.update(extras)
+        return cell
+
+    def set_cell(self, x: int, y: int, cell: Optional[Dict[str, Any]]) -> bool:
+        """
+        Stores a platform-style cell dict. Returns True if anything changed.
+        The "location" key is implied by the position and not stored.
+        """
+        index = y * self.size + x
+        if cell is None:
+            changed = self.terrain[index] != 0 or index in self.extras
+            self.terrain[index] = 0
+            self.agent_ids[index] = NO_AGENT
+            self.extras.pop(index, None)
+            return changed
+
+        name = cell.get("type")
+        code = terrain_code(name) if isinstance(name, str) else 0
+        extras = _cell_extras(cell)
+        if code == self.terrain[index] and extras == self.extras.get(index, {}):
+            return False
+
+        self.terrain[index] = code
+        self._store_extras(index, extras)
+        return True
+
+    def merge_view(
+        self, rows: List[Any], visible: Optional[List[Tuple[int, int, int]]] = None
+    ) -> Set[Location]:
+        """
+        Merges an agent's view (platform-style rows of cell dicts) into the map.
+
+        Only cells carrying an [x, y] "location" are merged, at that location
+        (the list position is not trusted: platforms list rows and columns in
+        either order); None cells keep what we already know. The cells are
+        grouped per map row, then each row is encoded into terrain codes and
+        compared against the stored row in one bytes comparison; unchanged rows
+        cost no further work and changed rows are written back with a single
+        slice assignment. Returns the set of (x, y) cells whose terrain or
+        attributes changed; the runs of visible cells are appended to `visible`
+        as (y, x, end x).
+        """
+        size = self.size
+        changed: Set[Location] = set()
+        spans: List[Tuple[int, int, int]] = [] if visible is None else visible
+        by_row: Dict[int, Dict[int, Dict[str, Any]]] = {}
+        skipped = 0
+        for row in rows:
+            if not isinstance(row, list):
+                logger.error("❌ Invalid row format in map data: %s", row)
+                continue
+            for cell in row:
+                location = _cell_location(cell)
+                if location is None:
+                    continue
+                x, y = location
+                if 0 <= x < size and 0 <= y < size:
+                    by_row.setdefault(y, {})[x] = cell
+                else:
+                    skipped += 1
+        if skipped:
+            logger.warning("❌ Skipping %s out-of-bounds view cells", skipped)
+
+        extras_by_row: Dict[int, List[int]] = {}
+        for index in self.extras:
+            extras_by_row.setdefault(index // size, []).append(index % size)
+        for y, cells in sorted(by_row.items()):
+            self._merge_row(y, cells, extras_by_row.get(y, []), changed, spans)
+        return changed
+
+    def _merge_row(
+        self, y: int, cells: Dict[int, Dict[str, Any]], stored_extras: List[int],
+        changed: Set[Location], spans: List[Tuple[int, int, int]],
+    ) -> None:
+        size = self.size
+        start = y * size
+        stored = self.terrain[start:start + size]
+        incoming = bytearray(stored)
+        incoming_extras: Dict[int, Dict[str, Any]] = {}
+
+        run_start = run_end = -1
+        for x in sorted(cells):
+            if x != run_end:
+                if run_start >= 0:
+                    spans.append((y, run_start, run_end))
+                run_start = x
+            run_end = x + 1
+            cell = cells[x]
+            name = cell.get("type")
+            incoming[x] = terrain_code(name) if isinstance(name, str) else 0
+            if len(cell) > 2 or "type" not in cell:
+                extras = _cell_extras(cell)
+                if extras:
+                    incoming_extras[x] = extras
+        if run_start >= 0:
+            spans.append((y, run_start, run_end))
+
+        if incoming != stored:
+            changed.update((x, y) for x in range(size) if incoming[x] != stored[x])
+            self.terrain[start:start + size] = incoming
+        self._merge_row_extras(y, cells, stored_extras, incoming_extras, changed)
+
+    def _merge_row_extras(
+        self, y: int, cells: Dict[int, Dict[str, Any]], stored_extras: List[int],
+        incoming_extras: Dict[int, Dict[str, Any]], changed: Set[Location],
+    ) -> None:
+        start = y * self.size
+        # Visible cells that lost their agent/attributes
+        for x in stored_extras:
+            if x not in incoming_extras and x in cells:
+                del self.extras[start + x]
+                self.agent_ids[start + x] = NO_AGENT
+                changed.add((x, y))
+
+        for x, extras in incoming_extras.items():
+            if self.extras.get(start + x) != extras:
+                self._store_extras(start + x, extras)
+                changed.add((x, y))
+
+    def merge_segments(
+        self, segments: Iterable[Tuple[int, int, bytes]], cells: List[Any]
+    ) -> Set[Location]:
+        """
+        Merges a view decoded from a compact wire format (see codec.py): runs
+        of visible terrain codes per row, plus the cells carrying attributes.
+        Visible cells absent from `cells` lose their stored agent/attributes.
+        Returns the set of (x, y) cells whose terrain or attributes changed.
+        """
+        size = self.size
+        changed: Set[Location] = set()
+        visible: Dict[int, List[Tuple[int, int]]] = {}
+        for y, x0, codes in segments:
+            if not (0 <= y < size and 0 <= x0 < size):
+                continue
+            codes = codes[:size - x0]
+            start = y * size + x0
+            stored = self.terrain[start:start + len(codes)]
+            if stored != codes:
+                changed.update(
+                    (x0 + i, y) for i, code in enumerate(codes) if stored[i] != code
+                )
+                self.terrain[start:start + len(codes)] = codes
+            visible.setdefault(y, []).append((x0, x0 + len(codes)))
+        self._merge_cells(cells, visible, changed)
+        return changed
+
+    def _merge_cells(
+        self, cells: List[Any], visible: Dict[int, List[Tuple[int, int]]], changed: Set[Location]
+    ) -> None:
+        size = self.size
+        incoming: Dict[int, Dict[str, Any]] = {}
+        for cell in cells:
+            location = _cell_location(cell)
+            if location is not None and self.in_bounds(*location):
+                incoming[location[1] * size + location[0]] = _cell_extras(cell)
+
+        for index in list(self.extras):
+            y, x = divmod(index, size)
+            if index not in incoming and any(a <= x < b for a, b in visible.get(y, ())):
+                del self.extras[index]
+                self.agent_ids[index] = NO_AGENT
+                changed.add((x, y))
+
+        for index, extras in incoming.items():
+            if self.extras.get(index, {}) != extras:
+                self._store_extras(index, extras)
+                changed.add((index % size, index // size))
+
+    def _store_extras(self, index: int, extras: Dict[str, Any]) -> None:
+        agent = extras.get("agent")
+        agent_id = agent.get("id") if isinstance(agent, dict) else None
+        self.agent_ids[index] = agent_id if isinstance(agent_id, int) else NO_AGENT
+        if extras:
+            self.extras[index] = extras
+        else:
+            self.extras.pop(index, None)
+
+    def nbytes(self) -> int:
+        """Approximate size of the dense arrays in bytes."""
+        return len(self.terrain) + self.agent_ids.itemsize * len(self.agent_ids)
+
+
+def _cell_location(cell: Any) -> Optional[Location]:
+    """The (x, y) a view cell is merged at: its [x, y] "location", or None if it has none."""
+    if not isinstance(cell, dict):
+        return None
+    location = cell.get("location")
+    if not isinstance(location, list) or len(location) != 2:
+        return None
+    x, y = location
+    return (x, y) if isinstance(x, int) and isinstance(y, int) else None
+
+
+def _cell_extras(cell: Dict[str, Any]) -> Dict[str, Any]:
+    """Returns the attributes of a cell that go to the sparse side-table."""
+    return {
+        k: v for k, v in cell.items()
+        if k not in ("type", "location") and not (k == "agent" and v is None)
+    }
+
+
+class GameMapRow:
+    """
+    List-like view of one map row (`game_map[y][x]`). Reading a cell returns a
+    fresh dict (treat it as read-only); assign `row[x] = cell` to change it.
+    """
+
+    def __init__(self, game_map: GameMap, y: int) -> None:
+        self.game_map = game_map
+        self.y = y
+
+    def __len__(self) -> int:
+        return self.game_map.size
+
+    def __getitem__(self, x: int) -> Optional[Dict[str, Any]]:
+        if not 0 <= x < self.game_map.size:
+            raise IndexError(x)
+        return self.game_map.cell(x, self.y)
+
+    def __setitem__(self, x: int, cell: Optional[Dict[str, Any]]) -> None:
+        if not 0 <= x < self.game_map.size:
+            raise IndexError(x)
+        self.game_map.set_cell(x, self.y, cell)
+
+    def __iter__(self) -> Iterator[Optional[Dict[str, Any]]]:
+        return (self.game_map.cell(x, self.y) for x in range(self.game_map.size))
+
+
+class Agent:
+    """
+    One of our agents. A slotted record instead of a dict: smaller, and typos
+    in field names fail loudly.
+    """
+
+    __slots__ = ("id", "type", "team", "location", "warehouse", "blocked")
+
+    def __init__(
+        self, agent_id: int, agent_type: str, team: Optional[str], location: Location,
+        warehouse: Optional[Dict[str, int]] = None, blocked: bool = False,
+    ) -> None:
+        self.id = agent_id
+        self.type = agent_type
+        self.team = team
+        self.location = location
+        self.warehouse = warehouse  # Factories only
+        self.blocked = blocked  # Engineers with plants waiting and nowhere to deploy them
+
+    def __repr__(self) -> str:
+        return f"Agent({self.to_dict()!r})"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Agent":
+        x, y = data["location"]
+        return cls(
+            data["id"], data["type"], data.get("team"), (int(x), int(y)),
+            data.get("warehouse"), data.get("blocked", False),
+        )
+
+
+class AgentRegistry(Mapping[int, Agent]):
+    """
+    Our agents by id, indexed by type and by location so that
+    finding the factory, counting engineers or checking a tile is O(1)
+    instead of a scan over every agent. Reads go through the Mapping
+    interface; every change goes through add/move/remove to keep the indexes right.
+    """
+
+    def __init__(self) -> None:
+        self.agents: Dict[int, Agent] = {}
+        self.by_type: Dict[str, Dict[int, Agent]] = {}
+        self.by_location: Dict[Location, Agent] = {}
+
+    def __getitem__(self, agent_id: int) -> Agent:
+        return self.agents[agent_id]
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self.agents)
+
+    def __len__(self) -> int:
+        return len(self.agents)
+
+    def add(self, agent: Agent) -> Optional[Agent]:
+        """Stores an agent, replacing (and returning) the previous record with its id."""
+        previous = self.remove(agent.id)
+        self.agents[agent.id] = agent
+        self.by_type.setdefault(agent.type, {})[agent.id] = agent
+        self.by_location[agent.location] = agent
+        return previous
+
+    def move(self, agent: Agent, location: Location) -> None:
+        if self.by_location.get(agent.location) is agent:
+            del self.by_location[agent.location]
+        agent.location = location
+        self.by_location[location] = agent
+
+    def remove(self, agent_id: int) -> Optional[Agent]:
+        """Drops an agent from the registry and its indexes; returns it if it existed."""
+        agent = self.agents.pop(agent_id, None)
+        if agent is None:
+            return None
+        del self.by_type[agent.type][agent_id]
+        if self.by_location.get(agent.location) is agent:
+            del self.by_location[agent.location]
+        return agent
+
+    def of_type(self, agent_type: str) -> List[Agent]:
+        """The agents of one type, in the order they were added."""
+        return list(self.by_type.get(agent_type, {}).values())
+
+    def count(self, agent_type: str) -> int:
+        return len(self.by_type.get(agent_type, ()))
+
+    def first(self, agent_type: str) -> Optional[Agent]:
+        """The first agent of a type (e.g. the only FACTORY), if any."""
+        agents = self.by_type.get(agent_type)
+        return next(iter(agents.values()), None) if agents else None
+
+    def at(self, location: Location) -> Optional[Agent]:
+        """The agent standing on a tile, if any."""
+        return self.by_location.get(location)
+
+
+def new_game_state() -> Dict[str, Any]:
+    """Creates the state of one game (one session)."""
+    terrain_index = TerrainIndex()
+    return {
+        "map_size": None,
+        "init_balance": None,
+        "team": None,
+        "round": 0,
+        "balance": 0,
+        "agents": AgentRegistry(),
+        "occupancy": OccupancyGrid(),
+        "map": GameMap(0),
+        "terrain_index": terrain_index,
+        "river_field": DistanceField(terrain_index, "RIVER"),
+        "knowledge": Knowledge(),
+        "sites": SiteHeatmap(),
+        "round_plan": None,
+        "revision": 0,  # Bumped by every /view or /agent change
+        "assignments": None,
+    }
+
+
+DEFAULT_SESSION = "default"
+SESSION_HEADER = "X-Game-Id"
+MAX_SESSIONS = int(os.environ.get("BOT_MAX_SESSIONS", "64"))
+SESSION_TTL = float(os.environ.get("BOT_SESSION_TTL", "3600"))
+
+
+class SessionStore:
+    """
+    Game states keyed by session (game) id, so one process can serve many matches.
+    Sessions idle for longer than `ttl` seconds are evicted, and once there are
+    more than `max_sessions` the least recently used one goes first.
+    The default session is never evicted.
+
+    Each session also has a lock: request handlers hold it for the whole request
+    (acquire/release), so concurrent requests of one game are applied one at a
+    time while different games proceed in parallel. A session with a request
+    holding or waiting for its lock is in use and never evicted, so its state
+    and lock are only dropped once nobody can still be holding a reference.
+    """
+
+    def __init__(self, max_sessions: int = MAX_SESSIONS, ttl: float = SESSION_TTL) -> None:
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        # Called for sessions not in memory; returns a saved state or None (see snapshot.py)
+        self.loader: Optional[Callable[[str], Optional[Dict[str, Any]]]] = None
+        self.default = new_game_state()
+        self.sessions: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.last_used: Dict[str, float] = {}
+        self.locks: Dict[str, threading.Lock] = {DEFAULT_SESSION: threading.Lock()}
+        self.users: Dict[str, int] = {}  # Requests holding or waiting for a session's lock
+        self.guard = threading.Lock()  # Protects the store's own dicts
+
+    def __len__(self) -> int:
+        return len(self.sessions) + 1
+
+    def __contains__(self, session_id: object) -> bool:
+        return session_id == DEFAULT_SESSION or session_id in self.sessions
+
+    def acquire(self, session_id: str) -> None:
+        """Waits until no other request of the session runs (pair with release)."""
+        with self.guard:
+            session_lock = self.locks.get(session_id)
+            if session_lock is None:
+                session_lock = self.locks[session_id] = threading.Lock()
+            self.users[session_id] = self.users.get(session_id, 0) + 1
+        session_lock.acquire()
+
+    def release(self, session_id: str) -> None:
+        """Lets the session's next request run; the request counts as activity until now."""
+        with self.guard:
+            self.locks[session_id].release()
+            users = self.users.pop(session_id) - 1
+            if users:
+                self.users[session_id] = users
+            if session_id in self.sessions:
+                self.sessions.move_to_end(session_id)
+                self.last_used[session_id] = time.monotonic()
+            elif not users and session_id != DEFAULT_SESSION:
+                del self.locks[session_id]  # Its state was never created (or failed to load)
+
+    def get(self, session_id: str) -> Dict[str, Any]:
+        """Returns the state of a session, creating it on first use."""
+        if session_id == DEFAULT_SESSION:
+            return self.default
+
+        with self.guard:
+            known = session_id in self.sessions
+        # Restoring can take a while on big maps; other games should not wait on it
+        restored = self.loader(session_id) if not known and self.loader is not None else None
+
+        with self.guard:
+            now = time.monotonic()
+            state = self.sessions.get(session_id)
+            if state is None:
+                state = restored if restored is not None else new_game_state()
+                self.sessions[session_id] = state
+                logger.info(
+                    "%s game session %s", "♻️ Restored" if restored else "🆕 Created", session_id
+                )
+            else:
+                self.sessions.move_to_end(session_id)
+            self.last_used[session_id] = now
+            self._evict(now)
+            return state
+
+    def _evict(self, now: float) -> None:
+        """Drops expired sessions, then the least recently used ones over the limit."""
+        for session_id in list(self.sessions):  # Least recently used first
+            idle = now - self.last_used[session_id]
+            if len(self.sessions) <= self.max_sessions and idle < self.ttl:
+                break
+            if self.users.get(session_id):
+                continue  # A request holds or waits for it: still live
+            del self.sessions[session_id]
+            del self.last_used[session_id]
+            self.locks.pop(session_id, None)
+            logger.info("🗑️ Evicted game session %s", session_id)
+
+
+SESSIONS = SessionStore()
+
+# State of the default session, for single-game deployments and tools
+BOTS_DB: Dict[str, Any] = SESSIONS.default
+
+# Energy costs of agent actions
+MOVE_COST = 1
+EXPLORE_COST = 10
+DEPLOY_COST = 10
+RECONFIGURE_COST = 10
+ENGINEER_COST = 100
 
 POWER_PLANT_OPTIONS = [
     ("WINDMILL", 100),
@@ -17,3 +614,23 @@ POWER_PLANT_OPTIONS = [
     ("GEOTHERMAL", 500),
     ("DAM", 1000)
 ]
+
+
+def parse_plant_table(value: str) -> Dict[str, int]:
+    """Parses "WINDMILL=5,DAM=50" into {plant: amount}."""
+    table = {}
+    for part in value.split(","):
+        name, _, amount = part.partition("=")
+        if name.strip():
+            table[name.strip().upper()] = int(amount)
+    return table
+
+
+# Energy a deployed plant produces per round. An ASSUMPTION, not platform data:
+# the game does not publish plant output, and these guesses decide the factory's
+# strategy (economy.py), the engineer search (search.py) and, unless told
+# otherwise, the simulator's payouts. Override with BOT_PLANT_INCOME.
+POWER_PLANT_INCOME = {
+    "WINDMILL": 5, "SOLAR_PANELS": 20, "GEOTHERMAL": 25, "DAM": 50,
+    **parse_plant_table(os.environ.get("BOT_PLANT_INCOME", "")),
+}
@@ -0,0 +1,144 @@
+"""
+Fog-of-war knowledge: which cells we have seen and where the unseen part begins.
+
+A cell counts as seen once a view showed it, or once an engineer explored
+around it (the explore's view is on its way, so exploring there again would
+only pay twice for the same tiles). We keep
+
+- `seen`: 1 per seen cell, as a bytearray so windows are counted with bytes.count,
+- the frontier: the unseen cells next to a seen one, where walking reveals new
+  tiles, in a BucketGrid so the nearest one is found
+  without scanning them all.
+
+Terrain does not change once seen, so when a cell was seen does not matter.
+Views update the frontier incrementally around the cells seen for the first
+time; the whole map is only scanned on /init and when a snapshot is restored.
+"""
+import os
+import re
+from typing import Iterable, List, Optional, Set, Tuple
+
+from metrics import MAP_SCANS
+from terrain import BucketGrid, Location
+
+# Cells an EXPLORE reveals around the engineer (a square, like the views)
+EXPLORE_RADIUS = int(os.environ.get("BOT_EXPLORE_RADIUS", "5"))
+# Unseen cells an EXPLORE must reveal to be worth its cost
+EXPLORE_MIN_CELLS = int(os.environ.get("BOT_EXPLORE_MIN_CELLS", "30"))
+
+# (y, first x, end x) - a run of visible cells within one row
+Span = Tuple[int, int, int]
+
+# Terrain code -> 1 if known (code 0 is an unknown cell)
+_KNOWN = bytes([0]) + bytes([1]) * 255
+
+
+class Knowledge:
+    """Seen cells and the exploration frontier of one game."""
+
+    def __init__(self, size: int = 0) -> None:
+        self.reset(size)
+
+    def reset(self, size: int) -> None:
+        """Forgets everything: a size x size map with no cell seen."""
+        self.size = size
+        self.seen = bytearray(size * size)
+        self.frontier_grid = BucketGrid()
+
+    @property
+    def frontier(self) -> Set[Location]:
+        """The unseen cells next to a seen one."""
+        return self.frontier_grid.cells
+
+    def rebuild(self, terrain: bytes) -> None:
+        """
+        Starts from a map's terrain codes (/init, restored snapshots): every
+        cell with known terrain counts as seen.
+        """
+        MAP_SCANS.inc("knowledge_rebuild")
+        self.reset(int(len(terrain) ** 0.5))
+        self.seen[:] = terrain[:len(self.seen)].translate(_KNOWN)
+        for x, y in self._scan_frontier():
+            self.frontier_grid.add(x, y)
+
+    def observe(self, spans: Iterable[Span]) -> int:
+        """Records the cells a view showed. Returns how many were seen for the first time."""
+        size = self.size
+        first_seen: List[int] = []
+        for y, start, end in spans:
+            start, end = max(start, 0), min(end, size)
+            if not 0 <= y < size or start >= end:
+                continue
+            begin, finish = y * size + start, y * size + end
+            if self.seen.find(0, begin, finish) != -1:
+                first_seen.extend(
+                    index for index in range(begin, finish) if not self.seen[index]
+                )
+                self.seen[begin:finish] = b"\x01" * (finish - begin)
+        self._extend_frontier(first_seen)
+        return len(first_seen)
+
+    def explore(self, x: int, y: int, radius: int = EXPLORE_RADIUS) -> int:
+        """Marks the cells an EXPLORE at (x, y) will reveal as seen."""
+        return self.observe(
+            (row, x - radius, x + radius + 1) for row in range(y - radius, y + radius + 1)
+        )
+
+    def unseen_in(self, x: int, y: int, radius: int = EXPLORE_RADIUS) -> int:
+        """Counts the cells never seen in the square window around (x, y)."""
+        size = self.size
+        start, end = max(x - radius, 0), min(x + radius + 1, size)
+        if start >= end:
+            return 0
+        return sum(
+            self.seen.count(0, row * size + start, row * size + end)
+            for row in range(max(y - radius, 0), min(y + radius + 1, size))
+        )
+
+    def nearest_frontier(self, x: int, y: int) -> Optional[Location]:
+        """
+        Finds the closest frontier cell (Manhattan distance), ties to the lowest
+        row, then column.
+        """
+        return self.frontier_grid.nearest(x, y)
+
+    def _extend_frontier(self, first_seen: List[int]) -> None:
+        """Moves the frontier past newly seen cells, touching only their neighbours."""
+        size = self.size
+        seen = self.seen
+        frontier = self.frontier_grid
+        for index in first_seen:
+            y, x = divmod(index, size)
+            frontier.discard(x, y)
+            if x > 0 and not seen[index - 1]:
+                frontier.add(x - 1, y)
+            if x + 1 < size and not seen[index + 1]:
+                frontier.add(x + 1, y)
+            if y > 0 and not seen[index - size]:
+                frontier.add(x, y - 1)
+            if y + 1 < size and not seen[index + size]:
+                frontier.add(x, y + 1)
+
+    def _scan_frontier(self) -> Set[Location]:
+        """
+        Computes the frontier from scratch. Each row of `seen` is read as one
+        integer (a 0/1 byte per cell), so a row's unseen cells next to a seen
+        one come out of a few shifts and masks instead of a loop per cell.
+        """
+        size = self.size
+        ones = int.from_bytes(b"\x01" * size, "little")
+        rows = [
+            int.from_bytes(self.seen[y * size:(y + 1) * size], "little") for y in range(size)
+        ]
+        frontier: Set[Location] = set()
+        for y, row in enumerate(rows):
+            near = (row << 8) | (row >> 8)
+            if y > 0:
+                near |= rows[y - 1]
+            if y + 1 < size:
+                near |= rows[y + 1]
+            edge = near & (row ^ ones) & ones
+            if edge:
+                cells = edge.to_bytes(size, "little")
+                frontier.update((match.start(), y) for match in re.finditer(b"\x01", cells))
+        return frontier
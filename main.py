@@ -1,20 +1,212 @@
+import argparse
 import logging
-from flask import Flask, Response, request, jsonify
-from typing import Dict, Any, Optional
-from game_state import BOTS_DB
-from agents_logic import get_agent_action
-
-logging.basicConfig(level=logging.DEBUG, format="%(asctime)s - %(levelname)s - %(message)s")
+import time
+from flask import Flask, Response, g, request, jsonify
+from typing import Callable, Dict, Any, Iterable, List, Optional, Set, Tuple, Union
+from codec import EncodedMap, FastJSONProvider, decode_map, media_type
+from game_state import (
+    DEFAULT_SESSION, SESSION_HEADER, SESSIONS, TERRAIN_CODES, Agent, AgentRegistry, GameMap,
+    new_game_state,
+)
+from terrain import TERRAIN_NAMES, Location, TerrainIndex
+from agents_logic import get_agent_action, plan_round
+from bot_logging import configure_logging, finish_trace, start_trace, trace_note
+from snapshot import SNAPSHOT_DIR, SNAPSHOT_MODE, SNAPSHOT_MODES, SnapshotStore
+from metrics import (
+    REGISTRY, REQUEST_SECONDS, REQUESTS, Gauge, Labels, start_profiler, timed,
+)
+import metrics
+from replay import ACTION_ENDPOINTS, RECORD_FILE, Recorder
+
+configure_logging()
+logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
+
+WsgiApp = Callable[[Dict[str, Any], Callable[..., Any]], Iterable[bytes]]
+
+
+class SessionPathMiddleware:
+    """
+    Accepts every route under a /game/<game_id> prefix as well, turning the
+    prefix into the X-Game-Id header so handlers only look in one place.
+    """
+
+    def __init__(self, wsgi_app: WsgiApp) -> None:
+        self.wsgi_app = wsgi_app
+
+    def __call__(
+        self, environ: Dict[str, Any], start_response: Callable[..., Any]
+    ) -> Iterable[bytes]:
+        path = environ.get("PATH_INFO", "")
+        if path.startswith("/game/"):
+            game_id, _, rest = path[len("/game/"):].partition("/")
+            environ["HTTP_X_GAME_ID"] = game_id
+            environ["PATH_INFO"] = "/" + rest
+        return self.wsgi_app(environ, start_response)
+
+
+app.wsgi_app = SessionPathMiddleware(app.wsgi_app)  # type: ignore[method-assign]
+
+SNAPSHOTS: Optional[SnapshotStore] = None
+# Endpoints after which a session is snapshotted in "round" mode
+ROUND_SNAPSHOT_ENDPOINTS = ("init", "new_round")
+SNAPSHOT_ENDPOINTS = ("health", "snapshot_info", "take_snapshot")
+# Endpoints that never touch a game, so they skip the per-game lock
+STATELESS_ENDPOINTS = ("health", "metrics_text", "profile")
+
+
+def configure_snapshots(directory: Optional[str], mode: str = SNAPSHOT_MODE) -> None:
+    """
+    Enables snapshots in `directory` (disabled when None) and restores the
+    default game from it; other games are restored on their first request.
+    """
+    global SNAPSHOTS, SNAPSHOT_MODE
+    if mode not in SNAPSHOT_MODES:
+        raise ValueError(f"Unknown snapshot mode {mode!r}, expected one of {SNAPSHOT_MODES}")
+    if SNAPSHOTS is not None:
+        SNAPSHOTS.close()
+    SNAPSHOTS = SnapshotStore(directory) if directory else None
+    SNAPSHOT_MODE = mode
+    SESSIONS.loader = SNAPSHOTS.load if SNAPSHOTS is not None else None
+    if SNAPSHOTS is None:
+        return
+
+    restored = SNAPSHOTS.load(DEFAULT_SESSION)
+    if restored is not None:
+        SESSIONS.default.clear()
+        SESSIONS.default.update(restored)
+        logger.info("♻️ Restored default game at round %s", restored["round"])
+    logger.info("💾 Snapshots (%s mode) in %s", mode, directory)
+
+
+def save_snapshot(session_id: str, state: Dict[str, Any]) -> None:
+    """Snapshots one session; a failed write is logged, not raised."""
+    assert SNAPSHOTS is not None
+    try:
+        trace_note("snapshot_bytes", SNAPSHOTS.save(session_id, state))
+    except OSError as error:
+        logger.error("❌ Could not snapshot game %s: %s", session_id, error)
+
+
+configure_snapshots(SNAPSHOT_DIR)
+
+RECORDER: Optional[Recorder] = None
+
+
+def configure_recording(path: Optional[str]) -> None:
+    """Appends every game request (and the decisions answered) to `path`, see replay.py."""
+    global RECORDER
+    if RECORDER is not None:
+        RECORDER.close()
+    RECORDER = Recorder(path) if path else None
+    if RECORDER is not None:
+        logger.info("📼 Recording requests to %s", path)
+
+
+def record_request(response: Response, duration: float) -> None:
+    assert RECORDER is not None
+    body = request.get_json(silent=True)
+    if body is None and request.content_length:
+        body = request.get_data(as_text=True)
+    RECORDER.record(
+        g.session_id, request.method, request.path, media_type(request.content_type), body,
+        response.status_code, duration,
+        response.get_json(silent=True) if request.endpoint in ACTION_ENDPOINTS else None,
+    )
+
+
+configure_recording(RECORD_FILE)
+
+
+def current_state() -> Dict[str, Any]:
+    """Returns the game state of the session the current request belongs to."""
+    state: Dict[str, Any] = g.state
+    return state
+
+
+def _session_gauge(read: Callable[[Dict[str, Any]], float]) -> Callable[[], Dict[Labels, float]]:
+    """Builds a gauge callback that reads one value from every live game."""
+    def collect() -> Dict[Labels, float]:
+        with SESSIONS.guard:
+            states = [(DEFAULT_SESSION, SESSIONS.default), *SESSIONS.sessions.items()]
+        # A dropped default session is an empty dict until its next /init
+        return {(session_id,): read(state) for session_id, state in states if state}
+    return collect
+
+
+REGISTRY.register(Gauge(
+    "bot_sessions", "Games held in memory.", (), lambda: {(): len(SESSIONS)},
+))
+REGISTRY.register(Gauge(
+    "bot_agents", "Agents known per game.", ("session",),
+    _session_gauge(lambda state: len(state["agents"])),
+))
+REGISTRY.register(Gauge(
+    "bot_occupied_cells", "Occupied or reserved cells per game.", ("session",),
+    _session_gauge(lambda state: len(state["occupancy"])),
+))
+REGISTRY.register(Gauge(
+    "bot_known_cells", "Map cells with known terrain per game.", ("session",),
+    _session_gauge(lambda state: len(state["map"].terrain) - state["map"].terrain.count(0)),
+))
+REGISTRY.register(Gauge(
+    "bot_map_bytes", "Size of the dense map arrays per game.", ("session",),
+    _session_gauge(lambda state: state["map"].nbytes()),
+))
+start_profiler()
+
+
+@app.before_request
+def before_request() -> None:
+    g.started = time.perf_counter()
+    start_trace(request.method, request.path)
+    if request.endpoint in STATELESS_ENDPOINTS:
+        return  # Health checks and metrics never wait on a game
+    g.session_id = request.headers.get(SESSION_HEADER, DEFAULT_SESSION)
+
+    # One request at a time per game; released in teardown_request
+    SESSIONS.acquire(g.session_id)
+    g.held_session = g.session_id
+    g.state = SESSIONS.get(g.session_id)
+
+
+@app.after_request
+def after_request(response: Response) -> Response:
+    endpoint = request.endpoint or "unknown"
+    duration = time.perf_counter() - g.started
+    REQUEST_SECONDS.observe(duration, endpoint)
+    REQUESTS.inc(endpoint, str(response.status_code))
+    trace_note("session", g.get("session_id"))
+    state = g.get("state")
+    if state is not None:
+        trace_note("round", state["round"])
+        trace_note("balance", state["balance"])
+        if SNAPSHOTS is not None and response.status_code < 400 and (
+            request.endpoint in ROUND_SNAPSHOT_ENDPOINTS
+            or (SNAPSHOT_MODE == "request" and request.endpoint not in SNAPSHOT_ENDPOINTS)
+        ):
+            save_snapshot(g.session_id, state)
+    if RECORDER is not None and request.endpoint not in STATELESS_ENDPOINTS:
+        record_request(response, duration)
+    finish_trace(response.status_code)
+    return response
+
+
+@app.teardown_request
+def teardown_request(error: Optional[BaseException]) -> None:
+    held_session = g.pop("held_session", None)
+    if held_session is not None:
+        SESSIONS.release(held_session)
 
 
 @app.get('/health')
 def health() -> Response:
     """Check server health."""
-    logging.info(f"Request to /health | Method: {request.method}")
+    logger.info("Request to /health | Method: %s", request.method)
     response = Response(status=200)
-    logging.info(f"Response from /health: {response.status}")
+    logger.info("Response from /health: %s", response.status)
     return response
 
 
@@ -24,29 +216,42 @@ def init() -> "Response | tuple[Response, int]":
     data: Optional[Dict[str, Any]] = request.json
 
     if not isinstance(data, dict):
-        logging.error("❌ Invalid request data. Expected a JSON object.")
+        logger.error("❌ Invalid request data. Expected a JSON object.")
         return jsonify({"error": "Invalid request data"}), 400
-    BOTS_DB["map_size"] = data.get("map_size", 25)
-    BOTS_DB["init_balance"] = data.get("init_balance", 300)
-    BOTS_DB["team"] = data.get("team", "blue")
-    BOTS_DB["balance"] = BOTS_DB["init_balance"]
+
+    # A new game starts from a clean state (no agents, round 0)
+    state = current_state()
+    state.clear()
+    state.update(new_game_state())
+    state["map_size"] = data.get("map_size", 25)
+    state["init_balance"] = data.get("init_balance", 300)
+    state["team"] = data.get("team", "blue")
+    state["balance"] = state["init_balance"]
 
     if "map" in data:
-        BOTS_DB["map"] = data["map"]
-        logging.info(
-            f"Map size: {BOTS_DB['map_size']}x{BOTS_DB['map_size']}"
-        )
+        # Without a map_size, the map's own size is the game's
+        size = data["map_size"] if isinstance(data.get("map_size"), int) else None
+        try:
+            game_map = decode_map(media_type(request.content_type), data, size)
+        except ValueError as error:
+            logger.error("❌ Invalid map data: %s", error)
+            return jsonify({"error": f"Invalid map data: {error}"}), 400
+        state["map"] = build_map(game_map)
+        state["map_size"] = len(state["map"])
+        state["knowledge"].rebuild(state["map"].terrain)
+        logger.info("Map size: %sx%s", state["map_size"], state["map_size"])
     else:
-        BOTS_DB["map"] = [
-            [{"type": "PLAINS"} for _ in range(BOTS_DB["map_size"])]
-            for _ in range(BOTS_DB["map_size"])
-        ]
-        logging.warning(
-            f"No map data received from the platform, generating default "
-            f"{BOTS_DB['map_size']}x{BOTS_DB['map_size']} PLAINS map."
+        state["map"] = GameMap.filled(state["map_size"], "PLAINS")
+        state["knowledge"].reset(state["map_size"])  # Assumed, not seen
+        logger.warning(
+            "No map data received from the platform, generating default %sx%s PLAINS map.",
+            state["map_size"], state["map_size"],
         )
+    state["occupancy"].reset(len(state["map"]))
+    state["terrain_index"].rebuild(state["map"])
+    state["sites"].rebuild(state["map"].terrain, TERRAIN_CODES)
     response = Response(status=200)
-    logging.info(f"Response from /init: {response.status}")
+    logger.info("Response from /init: %s", response.status)
 
     return response
 
@@ -57,44 +262,42 @@ def create_or_update_agent(agent_id: int) -> "Response | tuple[Response, int]":
     data = request.json
 
     if not isinstance(data, dict):
-        logging.error("❌ Invalid request data. Expected a JSON object.")
+        logger.error("❌ Invalid request data. Expected a JSON object.")
         return jsonify({"error": "Invalid request data"}), 400
-    logging.info(f"Request to /agent/{agent_id} | Method: {request.method} | Body: {data}")
+    logger.info("Request to /agent/%s | Method: %s | Body: %s", agent_id, request.method, data)
 
+    state = current_state()
     # Extract agent details
-    agent_location = tuple(data.get("location", (0, 0)))
+    x, y = data.get("location", (0, 0))
+    agent_location = (int(x), int(y))
     agent_type = data.get("type", "UNKNOWN")
 
     # Ensure the agent's warehouse exists (only for factories)
     warehouse = data.get("warehouse", {}) if agent_type == "FACTORY" else None
 
-    # Store agent in the database
-    BOTS_DB["agents"][agent_id] = {
-        "id": data.get("id"),
-        "type": agent_type,
-        "location": agent_location,
-        "team": data.get("team"),
-        "warehouse": warehouse,
-    }
+    # Store agent in the registry; an update that moves an existing agent frees its previous tile
+    previous = state["agents"].add(
+        Agent(agent_id, agent_type, data.get("team"), agent_location, warehouse)
+    )
+    if previous is not None and previous.location != agent_location:
+        vacate(state, agent_id, previous.location)
 
-    # Add agent location to occupied locations
-    BOTS_DB["occupied_locations"].add(agent_location)
+    # Mark the agent's tile as occupied
+    state["occupancy"].occupy(*agent_location)
+    state["revision"] += 1
 
     # Update the map to reflect the agent's presence
-    x, y = agent_location
-    if BOTS_DB["map"] and 0 <= y < len(BOTS_DB["map"]) and 0 <= x < len(BOTS_DB["map"][y]):
-        if BOTS_DB["map"][y][x] is None:
-            BOTS_DB["map"][y][x] = {}  # Initialize cell if empty
-        BOTS_DB["map"][y][x]["agent"] = {
+    if state["map"].in_bounds(x, y):
+        state["map"].set_agent(x, y, {
             "id": agent_id,
             "type": agent_type,
             "team": data.get("team"),
             "location": list(agent_location),
-        }
-        logging.debug(f"Map updated: Agent {agent_id} placed at {agent_location}")
+        })
+        logger.debug("Map updated: Agent %s placed at %s", agent_id, agent_location)
 
     response = Response(status=200)
-    logging.info(f"Response from /agent/{agent_id}: {response.status}")
+    logger.info("Response from /agent/%s: %s", agent_id, response.status)
     return response
 
 
@@ -104,65 +307,98 @@ def new_round() -> "Response | tuple[Response, int]":
     data = request.json
 
     if not isinstance(data, dict):
-        logging.error("Invalid request data. Expected a JSON object.")
+        logger.error("Invalid request data. Expected a JSON object.")
         return jsonify({"error": "Invalid request data"}), 400
 
-    logging.info(f"Request to /round | Method: {request.method} | Body: {data}")
+    logger.info("Request to /round | Method: %s | Body: %s", request.method, data)
+
+    state = current_state()
+    state["round"] = data.get("round")
+    state["balance"] = data.get("balance")
 
-    BOTS_DB["round"] = data.get("round")
-    BOTS_DB["balance"] = data.get("balance")
+    # Last round's planned targets are either confirmed by now or did not happen
+    state["occupancy"].clear_reservations()
 
     response = Response(status=200)
-    logging.info(f"Response from /round: {response.status}")
+    logger.info("Response from /round: %s", response.status)
     return response
 
 
 @app.get('/agent/<int:agent_id>/action')
 def agent_action(agent_id: int) -> "Response | tuple[Response, int]":
     """Determine the action for a given agent."""
-    logging.info(f"Request to /agent/{agent_id}/action | Method: {request.method}")
+    logger.info("Request to /agent/%s/action | Method: %s", agent_id, request.method)
 
-    agent = BOTS_DB["agents"].get(agent_id)
+    state = current_state()
+    agent = state["agents"].get(agent_id)
     if not agent:
-        logging.warning(f"Agent {agent_id} not found")
+        logger.warning("Agent %s not found", agent_id)
         return jsonify({"error": "Agent not found"}), 404
-    action = get_agent_action(agent)
 
-    logging.info(f"Response from /agent/{agent_id}/action: {action}")
+    # Serve from the round plan. Agents created after planning are decided on
+    # their own, once: the decision joins the plan, so repeated requests do not
+    # apply its side effects (reservations, warehouse counts) again
+    actions = plan_round(state)
+    action = actions.get(agent_id)
+    if action is None:
+        action = actions[agent_id] = get_agent_action(state, agent)
+
+    trace_note("agent_type", agent.type)
+    trace_note("action", action["type"])
+    trace_note("params", action["params"])
+    logger.info("Response from /agent/%s/action: %s", agent_id, action)
     return jsonify(action), 200
 
 
+@app.post('/round/actions')
+def round_actions() -> "Response | tuple[Response, int]":
+    """Plan and return the actions of all agents for the current round."""
+    logger.info("Request to /round/actions | Method: %s", request.method)
+
+    state = current_state()
+    actions = plan_round(state)
+
+    trace_note("actions", {agent_id: action["type"] for agent_id, action in actions.items()})
+    logger.info("Response from /round/actions: %s actions", len(actions))
+    return jsonify({
+        "round": state["round"],
+        "actions": {str(agent_id): action for agent_id, action in actions.items()},
+    }), 200
+
+
 @app.patch('/agent/<int:agent_id>')
 def patch_agent(agent_id: int) -> "Response | tuple[Response, int]":
     """Update an agent's state (location, warehouse)."""
     data = request.json
 
     if not isinstance(data, dict):
-        logging.error("Invalid request data. Expected a JSON object.")
+        logger.error("Invalid request data. Expected a JSON object.")
         return jsonify({"error": "Invalid request data"}), 400
 
-    agent = BOTS_DB["agents"].get(agent_id)
+    state = current_state()
+    agent = state["agents"].get(agent_id)
     if not agent:
         return jsonify({"error": "Agent not found"}), 404
 
-    # Track location change (free the old one, reserve the new one)
-    old_location = tuple(agent["location"]) if "location" in agent else None
-    new_location = tuple(data["location"]) if "location" in data else None
-
-    if old_location and old_location in BOTS_DB["occupied_locations"]:
-        BOTS_DB["occupied_locations"].remove(old_location)
-
-    if new_location:
-        BOTS_DB["occupied_locations"].add(new_location)
-        agent["location"] = data["location"]
+    # Track location change (free the old tile, occupy the new one, move the map marker)
+    if "location" in data:
+        x, y = data["location"]
+        old_location = agent.location
+        state["agents"].move(agent, (int(x), int(y)))
+        if agent.location != old_location:
+            marker = vacate(state, agent_id, old_location)
+            if marker is not None and state["map"].in_bounds(*agent.location):
+                state["map"].set_agent(x, y, dict(marker, location=[x, y]))
+        state["occupancy"].occupy(*agent.location)
 
     # Update warehouse if provided
     if "warehouse" in data and isinstance(data["warehouse"], dict):
-        agent["warehouse"] = data["warehouse"]
+        agent.warehouse = data["warehouse"]
+    state["revision"] += 1
 
-    logging.info(f"Request to /agent/{agent_id} | Method: {request.method} | Body: {data}")
+    logger.info("Request to /agent/%s | Method: %s | Body: %s", agent_id, request.method, data)
     response = Response(status=200)
-    logging.info(f"Response from /agent/{agent_id}: {response.status}")
+    logger.info("Response from /agent/%s: %s", agent_id, response.status)
 
     return response
 
@@ -170,90 +406,195 @@ def patch_agent(agent_id: int) -> "Response | tuple[Response, int]":
 @app.delete('/agent/<int:agent_id>')
 def delete_agent(agent_id: int) -> "Response | tuple[Response, int]":
     """Delete an agent from the game state."""
-    logging.info(f"Request to /agent/{agent_id} | Method: {request.method}")
+    logger.info("Request to /agent/%s | Method: %s", agent_id, request.method)
 
-    if agent_id not in BOTS_DB["agents"]:
-        logging.warning(f"Attempted to delete non-existent agent {agent_id}")
+    state = current_state()
+    if agent_id not in state["agents"]:
+        logger.warning("Attempted to delete non-existent agent %s", agent_id)
         return jsonify({"error": "Agent not found"}), 404
 
-    del BOTS_DB["agents"][agent_id]
+    # Free the tile the agent was holding (and its marker on the map)
+    agent = state["agents"].remove(agent_id)
+    assert agent is not None
+    vacate(state, agent_id, agent.location)
+    state["revision"] += 1
 
     response = Response(status=200)
-    logging.info(f"Response from /agent/{agent_id}: {response.status}")
+    logger.info("Response from /agent/%s: %s", agent_id, response.status)
     return response
 
 
 @app.post('/agent/<int:agent_id>/view')
-def agent_view(agent_id: int) -> "Response | tuple[Response, int]":  # noqa: C901
-    """Processes the agent's view of the map, updating BOTS_DB and tracking occupied locations."""
+def agent_view(agent_id: int) -> "Response | tuple[Response, int]":
+    """Processes the agent's view of the map, updating the game state and occupied locations."""
     data = request.json
 
     if not isinstance(data, dict):
-        logging.error("Invalid request data. Expected a JSON object.")
+        logger.error("Invalid request data. Expected a JSON object.")
         return jsonify({"error": "Invalid request data"}), 400
 
-    logging.info(f"Request to /agent/{agent_id}/view | Method: {request.method}")
-
-    # Validate incoming map data
-    if "map" not in data or not isinstance(data["map"], list):
-        logging.error("Invalid or missing 'map' key in request body.")
-        return jsonify({"error": "Missing or invalid 'map' key in request body"}), 400
+    logger.info("Request to /agent/%s/view | Method: %s", agent_id, request.method)
 
+    state = current_state()
     # Get the expected map size
-    map_size = BOTS_DB.get("map_size", 24)  # Default size if missing
-
-    # Ensure `BOTS_DB["map"]` is initialized with the correct size
-    if not isinstance(BOTS_DB.get("map"), list) or len(BOTS_DB["map"]) != map_size:
-        BOTS_DB["map"] = [[None for _ in range(map_size)] for _ in range(map_size)]
-        logging.info(f"🔄 Initialized empty {map_size}x{map_size} map in BOTS_DB.")
-
-    # Ensure `occupied_locations` is always a set
-    if "occupied_locations" not in BOTS_DB or not isinstance(BOTS_DB["occupied_locations"], set):
-        BOTS_DB["occupied_locations"] = set()
-
-    # Do not clear `occupied_locations` entirely—track only updated cells
-    updated_locations = set()
-
-    for y, row in enumerate(data["map"]):
-        if not isinstance(row, list):
-            logging.error(f"❌ Invalid row format in map data at index {y}: {row}")
-            continue  # Skip invalid rows
-
-        for x, cell in enumerate(row):
-            if y >= map_size or x >= map_size:
-                logging.warning(f"❌ Skipping out-of-bounds update at ({x}, {y})")
-                continue
-
-            # Skip updating if cell is None (preserve existing data)
-            if cell is None:
-                continue
-
-            if "location" in cell and isinstance(cell["location"], list):
-                location = cell["location"]
-                if not isinstance(location, list) or len(location) != 2:
-                    logging.warning(f"❌ Skipping invalid location format: {location}")
-                    continue
-
-                # Convert None values inside the cell to `None`
-                cleaned_cell = {k: v if v is not None else None for k, v in cell.items()}
-
-                # ✅ Update only if there is a change (avoid unnecessary overwrites)
-                if BOTS_DB["map"][y][x] is None or BOTS_DB["map"][y][x] != cleaned_cell:
-                    BOTS_DB["map"][y][x] = cleaned_cell  # Store updated cell
-
-                    # Track occupied locations where 'agent' is present
-                    if "agent" in cleaned_cell and cleaned_cell["agent"] is not None:
-                        updated_locations.add(tuple(location))
-                        logging.debug(f"🚧 Marked ({x}, {y}) as occupied by {cleaned_cell['agent']}")
+    map_size = state.get("map_size", 24)  # Default size if missing
+
+    # Validate incoming map data (plain rows or one of the compact encodings, sized like the game)
+    try:
+        view = decode_map(media_type(request.content_type), data, map_size)
+    except ValueError as error:
+        logger.error("Invalid or missing 'map' key in request body: %s", error)
+        return jsonify({"error": f"Missing or invalid 'map' key in request body: {error}"}), 400
+
+    # Ensure `state["map"]` is initialized with the correct size
+    if not isinstance(state.get("map"), GameMap) or len(state["map"]) != map_size:
+        state["map"] = GameMap(map_size)
+        state["terrain_index"].rebuild(state["map"])
+        state["river_field"].reset()
+        state["knowledge"].reset(map_size)
+        state["sites"].rebuild(state["map"].terrain, TERRAIN_CODES)
+        logger.info("🔄 Initialized empty %sx%s map.", map_size, map_size)
+
+    # Keep the occupancy grid the same size as the map
+    if state["occupancy"].size != map_size:
+        state["occupancy"].reset(map_size)
+
+    # Diff the view against the stored map in bulk, then touch only the changed cells
+    visible: List[Tuple[int, int, int]] = []
+    previous_terrain = bytes(state["map"].terrain)
+    if isinstance(view, EncodedMap):
+        changed_cells = state["map"].merge_segments(view.segments, view.cells)
+        visible.extend((y, x, x + len(codes)) for y, x, codes in view.segments)
+    else:
+        changed_cells = state["map"].merge_view(view, visible)
+    apply_map_changes(state, changed_cells, previous_terrain)
+    first_seen = state["knowledge"].observe(visible)
+    if changed_cells or first_seen:
+        state["revision"] += 1
+    trace_note("changed_cells", len(changed_cells))
+
+    logger.info("✅ Successfully updated map from agent %s", agent_id)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(
+            "📍 %s cells changed, %s occupied locations",
+            len(changed_cells), len(state["occupancy"]),
+        )
 
-    # ✅ Remove only locations that changed from `occupied_locations`
-    BOTS_DB["occupied_locations"].update(updated_locations)
+    return jsonify({"message": "Map updated successfully"})
 
-    logging.info(f"✅ Successfully updated map from agent {agent_id}")
-    logging.info(f"📍 Occupied locations: {BOTS_DB['occupied_locations']}")
 
-    return jsonify({"message": "Map updated successfully"})
+def vacate(state: Dict[str, Any], agent_id: int, location: Location) -> Optional[Dict[str, Any]]:
+    """
+    Frees a tile one of our agents left, clearing the map cell if it still
+    shows that agent. Returns the agent's map entry if one was cleared.
+    """
+    state["occupancy"].release(*location)
+    game_map: GameMap = state["map"]
+    if not game_map.in_bounds(*location) or game_map.agent_id_at(*location) != agent_id:
+        return None
+    marker: Dict[str, Any] = game_map.extras[location[1] * game_map.size + location[0]]["agent"]
+    game_map.set_agent(location[0], location[1], None)
+    return marker
+
+
+def build_map(game_map: Union[List[Any], EncodedMap]) -> GameMap:
+    """Builds the stored map from the decoded /init map."""
+    if isinstance(game_map, EncodedMap):
+        return GameMap.from_segments(game_map.size, game_map.segments, game_map.cells)
+    return GameMap.from_rows(game_map)
+
+
+@app.get('/metrics')
+def metrics_text() -> Response:
+    """Expose request latency histograms, action counters and state sizes for Prometheus."""
+    return Response(REGISTRY.render(), mimetype="text/plain; version=0.0.4")
+
+
+@app.get('/metrics/profile')
+def profile() -> "Response | tuple[Response, int]":
+    """Return the sampling profiler's stacks in collapsed format (?reset=1 clears them)."""
+    if metrics.PROFILER is None:
+        return jsonify({"error": "Profiler is off (set BOT_PROFILE_INTERVAL_MS)"}), 409
+    reset = request.args.get("reset") in ("1", "true")
+    return Response(metrics.PROFILER.collapsed(reset), mimetype="text/plain")
+
+
+@app.get('/snapshot')
+def snapshot_info() -> Response:
+    """Describe the snapshot settings and the games saved on disk."""
+    return jsonify({
+        "enabled": SNAPSHOTS is not None,
+        "mode": SNAPSHOT_MODE,
+        "directory": SNAPSHOTS.directory if SNAPSHOTS is not None else None,
+        "sessions": SNAPSHOTS.session_ids() if SNAPSHOTS is not None else [],
+    })
+
+
+@app.post('/snapshot')
+def take_snapshot() -> "Response | tuple[Response, int]":
+    """Snapshot the current game now."""
+    if SNAPSHOTS is None:
+        return jsonify({"error": "Snapshots are disabled (set BOT_SNAPSHOT_DIR)"}), 409
+
+    state = current_state()
+    try:
+        size = SNAPSHOTS.save(g.session_id, state)
+    except OSError as error:
+        logger.error("❌ Could not snapshot game %s: %s", g.session_id, error)
+        return jsonify({"error": f"Snapshot failed: {error}"}), 500
+    logger.info("💾 Snapshot of game %s: %s bytes", g.session_id, size)
+    return jsonify({"session": g.session_id, "round": state["round"], "bytes": size}), 200
+
+
+@timed
+def apply_map_changes(
+    state: Dict[str, Any], changed_cells: Set[Location], previous_terrain: bytes
+) -> None:
+    """
+    Propagates the cells changed by a view merge to the terrain index,
+    the river distance field, the deploy-site heatmaps and the occupancy grid.
+    `previous_terrain` is the map's terrain code array from before the merge.
+    """
+    game_map: GameMap = state["map"]
+    terrain_index: TerrainIndex = state["terrain_index"]
+    agents: AgentRegistry = state["agents"]
+    size = game_map.size
+    for x, y in changed_cells:
+        index = y * size + x
+        if previous_terrain[index] != game_map.terrain[index]:
+            previous = TERRAIN_NAMES[previous_terrain[index]]
+            terrain = TERRAIN_NAMES[game_map.terrain[index]]
+            terrain_index.update(x, y, previous, terrain)
+            state["river_field"].update((x, y), previous, terrain)
+            state["sites"].update((x, y), previous, terrain)
+
+        # Track occupied locations where 'agent' is present, free the ones it left
+        # (our own agents keep their tiles until PATCH/DELETE moves them)
+        if game_map.has_agent(x, y):
+            state["occupancy"].occupy(x, y)
+            continue
+        if agents.at((x, y)) is None:
+            state["occupancy"].release_confirmed(x, y)
 
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Strategy game bot server")
+    parser.add_argument("--log-level", help="Logging level (default: $BOT_LOG_LEVEL or INFO)")
+    parser.add_argument("--trace", help="Write one JSON line per request to this file")
+    parser.add_argument("--snapshot-dir", default=SNAPSHOT_DIR,
+                        help="Save games here and restore them on startup ($BOT_SNAPSHOT_DIR)")
+    parser.add_argument("--profile-interval", type=float,
+                        help="Sample stacks every N ms for /metrics/profile "
+                             "($BOT_PROFILE_INTERVAL_MS)")
+    parser.add_argument("--record", default=RECORD_FILE,
+                        help="Record requests and decisions for replay.py ($BOT_RECORD_FILE)")
+    parser.add_argument("--snapshot-mode", choices=SNAPSHOT_MODES, default=SNAPSHOT_MODE,
+                        help="Save when a round starts or after every request")
+    args = parser.parse_args()
+    configure_logging(args.log_level, args.trace)
+    configure_snapshots(args.snapshot_dir, args.snapshot_mode)
+    configure_recording(args.record)
+    if args.profile_interval is not None:
+        start_profiler(args.profile_interval)
+
     app.run(host='0.0.0.0', port=5000)
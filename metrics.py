@@ -0,0 +1,242 @@
+"""
+In-process metrics in the Prometheus text format, plus an opt-in sampling profiler.
+
+    REQUEST_SECONDS.observe(0.004, "agent_action")
+    ACTIONS.inc("MOVE")
+
+    @timed
+    def plan_round(...): ...
+
+Histograms use fixed cumulative buckets, so p99 can be computed by the
+scraper (histogram_quantile). Gauges are read through callbacks at scrape
+time and cost nothing in between. Everything here is stdlib only, so the
+low-level modules (terrain, pathfinding) can count their scans too.
+"""
+import functools
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter as TallyCounter
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, TypeVar, cast
+
+# Seconds; fine-grained below 10 ms, where the platform's deadlines start to matter
+LATENCY_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5,
+)
+PROFILE_INTERVAL_ENV = "BOT_PROFILE_INTERVAL_MS"
+
+Labels = Tuple[str, ...]
+F = TypeVar("F", bound=Callable[..., Any])
+
+
+def _format_labels(names: Labels, values: Labels, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Counter:
+    """A monotonically increasing count per label set."""
+
+    def __init__(self, name: str, help_text: str, labels: Labels = ()) -> None:
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.values: Dict[Labels, float] = {}
+        self.lock = threading.Lock()
+
+    def inc(self, *label_values: str, amount: float = 1) -> None:
+        with self.lock:
+            self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help_text}"
+        yield f"# TYPE {self.name} counter"
+        with self.lock:
+            values = sorted(self.values.items())
+        for label_values, value in values:
+            yield f"{self.name}{_format_labels(self.labels, label_values)} {value:g}"
+
+
+class Histogram:
+    """Observation counts in cumulative buckets, with their sum, per label set."""
+
+    def __init__(
+        self, name: str, help_text: str, labels: Labels = (),
+        buckets: Tuple[float, ...] = LATENCY_BUCKETS,
+    ) -> None:
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = buckets
+        # label values -> [count per bucket..., +Inf count, sum]
+        self.values: Dict[Labels, List[float]] = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str) -> None:
+        with self.lock:
+            series = self.values.get(label_values)
+            if series is None:
+                series = self.values[label_values] = [0.0] * (len(self.buckets) + 2)
+            series[bisect_left(self.buckets, value)] += 1  # Past the last bound: +Inf
+            series[-1] += value
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help_text}"
+        yield f"# TYPE {self.name} histogram"
+        with self.lock:
+            values = sorted((labels, list(series)) for labels, series in self.values.items())
+        for label_values, series in values:
+            cumulative = 0.0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound:g}"'
+                yield (
+                    f"{self.name}_bucket{_format_labels(self.labels, label_values, le)} "
+                    f"{cumulative:g}"
+                )
+            labels = _format_labels(self.labels, label_values)
+            yield f"{self.name}_sum{labels} {series[-1]:.6f}"
+            yield f"{self.name}_count{labels} {cumulative:g}"
+
+
+class Gauge:
+    """A value read at scrape time: the callback returns {label values: value}."""
+
+    def __init__(
+        self, name: str, help_text: str, labels: Labels,
+        collect: Callable[[], Dict[Labels, float]],
+    ) -> None:
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.collect = collect
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help_text}"
+        yield f"# TYPE {self.name} gauge"
+        for label_values, value in sorted(self.collect().items()):
+            yield f"{self.name}{_format_labels(self.labels, label_values)} {value:g}"
+
+
+class Registry:
+    def __init__(self) -> None:
+        self.metrics: Dict[str, Any] = {}
+
+    def register(self, metric: Any) -> Any:
+        self.metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self.metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+REQUEST_SECONDS: Histogram = REGISTRY.register(Histogram(
+    "bot_request_seconds", "Time spent handling a request, per endpoint.", ("endpoint",),
+))
+REQUESTS: Counter = REGISTRY.register(Counter(
+    "bot_requests_total", "Requests handled, per endpoint and status code.",
+    ("endpoint", "status"),
+))
+FUNCTION_SECONDS: Histogram = REGISTRY.register(Histogram(
+    "bot_function_seconds", "Time spent in instrumented functions.", ("function",),
+))
+ACTIONS: Counter = REGISTRY.register(Counter(
+    "bot_actions_total", "Agent actions decided, per action type.", ("type",),
+))
+MAP_SCANS: Counter = REGISTRY.register(Counter(
+    "bot_map_scans_total", "Map searches and index rebuilds, per kind.", ("kind",),
+))
+
+
+def timed(function: F) -> F:
+    """Records the duration of every call in bot_function_seconds."""
+    name = function.__qualname__
+
+    @functools.wraps(function)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        started = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            FUNCTION_SECONDS.observe(time.perf_counter() - started, name)
+
+    return cast(F, wrapper)
+
+
+class SamplingProfiler:
+    """
+    Samples the stacks of all other threads every `interval` seconds and
+    counts them, for flame graphs of where request time goes. Output is in
+    the "collapsed stacks" format (`frame;frame;frame count` per line).
+    """
+
+    def __init__(self, interval: float, max_depth: int = 40) -> None:
+        self.interval = interval
+        self.max_depth = max_depth
+        self.samples: TallyCounter[str] = TallyCounter()
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self.thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+
+    def collapsed(self, reset: bool = False) -> str:
+        with self.lock:
+            lines = [f"{stack} {count}" for stack, count in self.samples.most_common()]
+            if reset:
+                self.samples.clear()
+        return "\n".join(lines) + "\n"
+
+    def _run(self) -> None:
+        own_id = threading.get_ident()
+        while not self.stopped.wait(self.interval):
+            stacks = []
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                names: List[str] = []
+                current: Any = frame
+                while current is not None and len(names) < self.max_depth:
+                    code = current.f_code
+                    names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    current = current.f_back
+                stacks.append(";".join(reversed(names)))
+            with self.lock:
+                self.samples.update(stacks)
+
+
+PROFILER: Optional[SamplingProfiler] = None
+
+
+def start_profiler(interval_ms: Optional[float] = None) -> Optional[SamplingProfiler]:
+    """Starts the sampling profiler if an interval is given (or set in BOT_PROFILE_INTERVAL_MS)."""
+    global PROFILER
+    if interval_ms is None:
+        interval_ms = float(os.environ.get(PROFILE_INTERVAL_ENV, "0") or 0)
+    if PROFILER is not None:
+        PROFILER.stop()
+        PROFILER = None
+    if interval_ms > 0:
+        PROFILER = SamplingProfiler(interval_ms / 1000)
+        PROFILER.start()
+    return PROFILER
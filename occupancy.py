@@ -0,0 +1,86 @@
+from typing import Iterator, List
+
+from terrain import Location
+
+FREE = 0
+OCCUPIED = 1
+RESERVED = 2
+
+
+class OccupancyGrid:
+    """
+    One byte per map cell: FREE, OCCUPIED (an agent or power plant stands there)
+    or RESERVED (tentatively claimed by an action planned this round).
+
+    Tentative reservations are dropped when the next round starts; by then the
+    platform has confirmed the outcome through /agent, PATCH or /view updates.
+    Cells outside the grid count as occupied.
+    """
+
+    def __init__(self, size: int = 0) -> None:
+        self.size = size
+        self.cells = bytearray(size * size)
+        self.reservations: List[int] = []
+
+    def reset(self, size: int) -> None:
+        """Resizes the grid and frees every cell."""
+        self.size = size
+        self.cells = bytearray(size * size)
+        self.reservations.clear()
+
+    def __contains__(self, location: object) -> bool:
+        if not isinstance(location, tuple) or len(location) != 2:
+            return False
+        return not self.is_free(location[0], location[1])
+
+    def __len__(self) -> int:
+        return len(self.cells) - self.cells.count(FREE)
+
+    def __iter__(self) -> Iterator[Location]:
+        size = self.size
+        return (
+            (index % size, index // size)
+            for index, state in enumerate(self.cells) if state != FREE
+        )
+
+    def is_free(self, x: int, y: int) -> bool:
+        if not (0 <= x < self.size and 0 <= y < self.size):
+            return False
+        return self.cells[y * self.size + x] == FREE
+
+    def occupy(self, x: int, y: int) -> None:
+        """Marks a cell as held by an agent (confirmed by the platform)."""
+        if 0 <= x < self.size and 0 <= y < self.size:
+            self.cells[y * self.size + x] = OCCUPIED
+
+    def release(self, x: int, y: int) -> None:
+        """Frees a cell whose agent left or was destroyed."""
+        if 0 <= x < self.size and 0 <= y < self.size:
+            self.cells[y * self.size + x] = FREE
+
+    def release_confirmed(self, x: int, y: int) -> None:
+        """Frees a confirmed cell but keeps this round's tentative reservation on it."""
+        if 0 <= x < self.size and 0 <= y < self.size:
+            index = y * self.size + x
+            if self.cells[index] == OCCUPIED:
+                self.cells[index] = FREE
+
+    def reserve(self, x: int, y: int) -> bool:
+        """
+        Tentatively claims a free cell for a planned BUILD_BOT/DEPLOY/MOVE.
+        Returns False if the cell is already taken.
+        """
+        if not self.is_free(x, y):
+            return False
+        index = y * self.size + x
+        self.cells[index] = RESERVED
+        self.reservations.append(index)
+        return True
+
+    def clear_reservations(self) -> None:
+        """Drops every tentative reservation that was not confirmed."""
+        cells = self.cells
+        for index in self.reservations:
+            if cells[index] == RESERVED:
+                cells[index] = FREE
+        self.reservations.clear()
@@ -0,0 +1,334 @@
+import heapq
+import logging
+import os
+from array import array
+from collections import deque
+from typing import Container, Deque, Dict, List, Optional, Set, Tuple
+
+from metrics import MAP_SCANS
+from terrain import (
+    IMPASSABLE_TERRAIN, TERRAIN_CODES, TERRAIN_NAMES, Location, TerrainIndex, manhattan_rings,
+)
+
+NEIGHBOURS = ((1, 0), (-1, 0), (0, 1), (0, -1))
+UNREACHED = 2 ** 31 - 1  # Distance of cells with no walkable route to a target tile
+PATH_MAX_EXPANSIONS = int(os.environ.get("BOT_PATH_MAX_EXPANSIONS", "20000"))
+
+logger = logging.getLogger(__name__)
+
+
+def is_passable(terrain: Optional[str]) -> bool:
+    """Unknown cells and impassable terrain cannot be walked through."""
+    return terrain is not None and terrain not in IMPASSABLE_TERRAIN
+
+
+class DistanceField:
+    """
+    Multi-source BFS distance field from every known tile of one terrain type.
+
+    Distances live in a dense int32 array indexed like the map (UNREACHED
+    where no walkable route leads), and the BFS runs over flat cell indexes
+    and the map's terrain codes, so no per-cell Python objects are kept.
+    The field depends on terrain only, so it is built once and then patched:
+    newly discovered sources or walkable cells are relaxed outwards, and a
+    cell becoming blocked (or losing its source status) only invalidates the
+    cells whose shortest route ran through it, which are then re-seeded from
+    their intact neighbours. Occupancy is checked when choosing a step, not
+    baked into the field.
+    """
+
+    def __init__(self, terrain_index: TerrainIndex, target_terrain: str = "RIVER") -> None:
+        self.terrain_index = terrain_index
+        self.target_terrain = target_terrain
+        self.size = 0
+        self.distances: "array[int]" = array("i")
+        self.pending: Set[int] = set()  # Indexes of cells that became walkable or a source
+        self.removed: Set[int] = set()  # Indexes of cells that became blocked or lost a source
+        self.needs_rebuild = True
+
+    def reset(self) -> None:
+        """Drop the field; it is rebuilt on the next query."""
+        self.distances = array("i")
+        self.pending.clear()
+        self.removed.clear()
+        self.needs_rebuild = True
+
+    def update(self, location: Location, previous: Optional[str], current: Optional[str]) -> None:
+        """Records a terrain change reported by /view."""
+        if self.needs_rebuild or previous == current:
+            return
+        index = location[1] * self.size + location[0]
+        if (previous == self.target_terrain) or (
+            is_passable(previous) and not is_passable(current)
+        ):
+            self.removed.add(index)
+        if is_passable(current):
+            self.pending.add(index)
+
+    def distance(self, location: Location) -> Optional[int]:
+        """Returns the walking distance from a cell to the nearest target tile."""
+        self.ensure()
+        return self._at(*location)
+
+    def nearest_source(self, location: Location) -> Optional[Location]:
+        """
+        The target tile reached by walking the field downhill from `location`,
+        or None when no walkable route leads to one.
+        """
+        self.ensure()
+        x, y = location
+        distance = self._at(x, y)
+        if distance is None:
+            return None
+        while distance > 0:
+            for dx, dy in NEIGHBOURS:
+                if self._at(x + dx, y + dy) == distance - 1:
+                    x, y, distance = x + dx, y + dy, distance - 1
+                    break
+        return x, y
+
+    def ensure(self) -> None:
+        """Brings the field up to date with the terrain index."""
+        if self.needs_rebuild or self.size != self.terrain_index.size:
+            self._rebuild()
+        elif self.pending or self.removed:
+            self._patch()
+
+    def window(self, location: Location, max_distance: int = 2) -> Tuple[Optional[int], ...]:
+        """The field's distances at every cell within `max_distance`, in ring order."""
+        self.ensure()
+        x, y = location
+        return tuple(self._at(x + dx, y + dy) for dx, dy, _ in manhattan_rings(max_distance))
+
+    def next_step(
+        self,
+        location: Location,
+        occupied: Container[Location],
+        max_distance: int = 2,
+    ) -> Optional[List[int]]:
+        """
+        Picks the move (as a [dx, dy] offset) that gets closest to a target tile.
+        Returns None if no free cell in reach improves on the current distance.
+        """
+        self.ensure()
+        x, y = location
+        best: Optional[Tuple[int, int, int, int]] = None  # (field distance, step length, dy, dx)
+        current = self._at(x, y)
+
+        for dx, dy, step in manhattan_rings(max_distance)[1:]:
+            cell = (x + dx, y + dy)
+            field_distance = self._at(*cell)
+            if field_distance is None or cell in occupied:
+                continue
+            candidate = (field_distance, step, dy, dx)
+            if best is None or candidate < best:
+                best = candidate
+
+        if best is None or (current is not None and best[0] >= current):
+            return None
+        return [best[3], best[2]]
+
+    def _at(self, x: int, y: int) -> Optional[int]:
+        size = self.size
+        if not (0 <= x < size and 0 <= y < size):
+            return None
+        distance = self.distances[y * size + x]
+        return distance if distance != UNREACHED else None
+
+    def _rebuild(self) -> None:
+        MAP_SCANS.inc("river_field_rebuild")
+        self.size = size = self.terrain_index.size
+        self.distances = array("i", [UNREACHED]) * (size * size)
+        self.pending.clear()
+        self.removed.clear()
+        self.needs_rebuild = False
+
+        queue: Deque[int] = deque()
+        for x, y in self.terrain_index.locations(self.target_terrain):
+            index = y * size + x
+            self.distances[index] = 0
+            queue.append(index)
+        self._propagate(queue)
+        logger.debug(
+            "🗺️ Rebuilt %s distance field (%s sources)", self.target_terrain, len(queue)
+        )
+
+    def _patch(self) -> None:
+        """Applies the recorded terrain changes without a full rebuild."""
+        game_map = self.terrain_index.game_map
+        assert game_map is not None
+        terrain = game_map.terrain
+        passable = passable_codes()
+        target = TERRAIN_CODES.get(self.target_terrain)
+        distances, size = self.distances, self.size
+        stale = self._invalidate()
+        for index in stale:
+            distances[index] = UNREACHED
+
+        seeds: List[int] = []
+        for index in stale | self.pending:
+            code = terrain[index]
+            if code == target:
+                best = 0
+            elif passable[code]:
+                best = min(
+                    (distances[neighbour] for neighbour in _neighbour_indexes(index, size)),
+                    default=UNREACHED,
+                )
+                best = best + 1 if best != UNREACHED else UNREACHED
+            else:
+                continue
+            if best < distances[index]:
+                distances[index] = best
+                seeds.append(index)
+        logger.debug(
+            "🗺️ Patched %s distance field (%s cells invalidated, %s re-seeded)",
+            self.target_terrain, len(stale), len(seeds),
+        )
+        self.pending.clear()
+        self.removed.clear()
+        seeds.sort(key=distances.__getitem__)
+        self._propagate(deque(seeds))
+
+    def _invalidate(self) -> Set[int]:
+        """
+        The removed cells plus every cell left without a neighbour one step
+        closer to a source, found in increasing order of their old distance.
+        """
+        distances, size = self.distances, self.size
+        heap = [(distances[index], index) for index in self.removed]
+        heapq.heapify(heap)
+        stale: Set[int] = set()
+        while heap:
+            distance, index = heapq.heappop(heap)
+            if distance == UNREACHED or index in stale:
+                continue
+            neighbours = _neighbour_indexes(index, size)
+            if index not in self.removed and any(
+                distances[neighbour] == distance - 1 and neighbour not in stale
+                for neighbour in neighbours
+            ):
+                continue  # Still supported by an intact route
+            stale.add(index)
+            for neighbour in neighbours:
+                if distances[neighbour] == distance + 1:
+                    heapq.heappush(heap, (distance + 1, neighbour))
+        return stale
+
+    def _propagate(self, queue: Deque[int]) -> None:
+        """Breadth-first relaxation from the queued cells over passable terrain."""
+        game_map = self.terrain_index.game_map
+        if game_map is None:
+            return
+        terrain = game_map.terrain
+        passable = passable_codes()
+        distances, size = self.distances, self.size
+        last_row = size * size - size
+        while queue:
+            index = queue.popleft()
+            next_distance = distances[index] + 1
+            x = index % size
+            if x > 0 and distances[index - 1] > next_distance and passable[terrain[index - 1]]:
+                distances[index - 1] = next_distance
+                queue.append(index - 1)
+            if (
+                x + 1 < size and distances[index + 1] > next_distance
+                and passable[terrain[index + 1]]
+            ):
+                distances[index + 1] = next_distance
+                queue.append(index + 1)
+            if (
+                index >= size and distances[index - size] > next_distance
+                and passable[terrain[index - size]]
+            ):
+                distances[index - size] = next_distance
+                queue.append(index - size)
+            if (
+                index < last_row and distances[index + size] > next_distance
+                and passable[terrain[index + size]]
+            ):
+                distances[index + size] = next_distance
+                queue.append(index + size)
+
+
+def passable_codes() -> bytes:
+    """A 256-entry table: 1 for the terrain codes engineers can walk on."""
+    return bytes(is_passable(name) for name in TERRAIN_NAMES).ljust(256, b"\0")
+
+
+def _neighbour_indexes(index: int, size: int) -> List[int]:
+    y, x = divmod(index, size)
+    neighbours = []
+    if x > 0:
+        neighbours.append(index - 1)
+    if x + 1 < size:
+        neighbours.append(index + 1)
+    if y > 0:
+        neighbours.append(index - size)
+    if y + 1 < size:
+        neighbours.append(index + size)
+    return neighbours
+
+
+def find_path(
+    start: Location,
+    goal: Location,
+    terrain_index: TerrainIndex,
+    blocked: Container[Location] = (),
+    max_expansions: int = PATH_MAX_EXPANSIONS,
+) -> Optional[List[Location]]:
+    """
+    A* search over known, passable, unblocked cells (4-neighbour moves).
+    Returns the cells from start to goal inclusive, or None if the goal is unreachable
+    or not found within `max_expansions` expanded cells.
+    The start and goal cells themselves are never treated as blocked.
+    """
+    if not is_passable(terrain_index.terrain(*goal)):
+        return None
+
+    def heuristic(cell: Location) -> int:
+        return abs(cell[0] - goal[0]) + abs(cell[1] - goal[1])
+
+    open_heap: List[Tuple[int, int, Location]] = [(heuristic(start), 0, start)]
+    came_from: Dict[Location, Location] = {}
+    cost_so_far: Dict[Location, int] = {start: 0}
+    expansions = 0
+
+    while open_heap:
+        _, cost, cell = heapq.heappop(open_heap)
+        if cell == goal:
+            return _reconstruct(came_from, start, goal)
+        if cost > cost_so_far[cell]:
+            continue  # Stale heap entry
+        expansions += 1
+        if expansions > max_expansions:
+            logger.debug(
+                "🧭 No path from %s to %s within %s expansions", start, goal, max_expansions
+            )
+            return None
+        for neighbour in _neighbours(cell):
+            if neighbour != goal and (
+                neighbour in blocked or not is_passable(terrain_index.terrain(*neighbour))
+            ):
+                continue
+            new_cost = cost + 1
+            if new_cost < cost_so_far.get(neighbour, new_cost + 1):
+                cost_so_far[neighbour] = new_cost
+                came_from[neighbour] = cell
+                heapq.heappush(open_heap, (new_cost + heuristic(neighbour), new_cost, neighbour))
+    return None
+
+
+def _reconstruct(
+    came_from: Dict[Location, Location], start: Location, goal: Location
+) -> List[Location]:
+    path = [goal]
+    while path[-1] != start:
+        path.append(came_from[path[-1]])
+    path.reverse()
+    return path
+
+
+def _neighbours(cell: Location) -> List[Location]:
+    x, y = cell
+    return [(x + dx, y + dy) for dx, dy in NEIGHBOURS]
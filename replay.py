@@ -0,0 +1,220 @@
+"""
+Request recorder and replay runner for regression checks and offline benchmarks.
+
+Recording: with BOT_RECORD_FILE (or `main.py --record`, `simulator.py --record`)
+set, every game request is appended to a JSON-lines log:
+
+    {"body": {...}, "method": "POST", "ms": 0.41, "path": "/round", "session": "default",
+     "status": 200}
+
+Action endpoints also keep the decisions the bot answered with ("response").
+Bodies in the compact map formats keep their Content-Type ("type").
+
+Replaying feeds a log back through the handlers in a fresh process, checks
+that every decision comes out identical and times each round:
+
+    python replay.py run match.jsonl                  # exit code 1 on any mismatch
+    python replay.py run match.jsonl --output b.jsonl # also save the replayed log
+
+Diff mode compares the decisions of two logs of the same match, e.g. the
+replays of one recording by two versions of the strategy:
+
+    python replay.py diff a.jsonl b.jsonl
+
+Replayed timings are taken around the test client, so they include its
+request overhead on top of the handler time the recorder measures; compare
+replayed runs with each other rather than with the recording.
+
+Decisions are only reproducible if the economy search is not cut short by
+its time budget, so the runner lifts BOT_ECONOMY_BUDGET_MS unless it is set.
+"""
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Optional, TextIO, Tuple
+
+from codec import JSON, dumps, loads
+
+RECORD_FILE = os.environ.get("BOT_RECORD_FILE")
+# Endpoints whose responses are decisions
+ACTION_ENDPOINTS = ("agent_action", "round_actions")
+
+Record = Dict[str, Any]
+
+
+class Recorder:
+    """Appends one JSON line per request to a log file (thread-safe)."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.stream: TextIO = open(path, "a", encoding="utf-8")
+        self.lock = threading.Lock()
+
+    def record(
+        self, session: str, method: str, path: str, content_type: Optional[str], body: Any,
+        status: int, duration: float, response: Any = None,
+    ) -> None:
+        record: Record = {
+            "session": session, "method": method, "path": path, "status": status,
+            "ms": round(duration * 1000, 3),
+        }
+        if body is not None:
+            record["body"] = body
+        if content_type and content_type != JSON:
+            record["type"] = content_type
+        if response is not None:
+            record["response"] = response
+        line = dumps(record)
+        with self.lock:
+            self.stream.write(line + "\n")
+            self.stream.flush()
+
+    def close(self) -> None:
+        with self.lock:
+            self.stream.close()
+
+
+def load(path: str) -> List[Record]:
+    """Reads a recorded log."""
+    with open(path, encoding="utf-8") as file:
+        return [loads(line) for line in file if line.strip()]
+
+
+def write(path: str, records: Iterable[Record]) -> None:
+    with open(path, "w", encoding="utf-8") as file:
+        for record in records:
+            file.write(dumps(record) + "\n")
+
+
+def rounds(records: Iterable[Record]) -> Iterator[Tuple[Tuple[str, Any], Record]]:
+    """Pairs every record with its (session, round), following each session's POST /round."""
+    current: Dict[str, Any] = {}
+    for record in records:
+        session = record.get("session", "")
+        body = record.get("body")
+        if record["method"] == "POST" and record["path"] == "/init":
+            current[session] = 0
+        elif record["method"] == "POST" and record["path"] == "/round" and isinstance(body, dict):
+            current[session] = body.get("round")
+        yield (session, current.get(session)), record
+
+
+def replay(records: List[Record], client: Any) -> Tuple[List[Record], List[int]]:
+    """
+    Sends recorded requests through a Flask test client, in order.
+    Returns the replayed records (new status, duration and decisions) and
+    the indexes of the records whose status or decisions differ.
+    """
+    from game_state import SESSION_HEADER
+
+    replayed: List[Record] = []
+    mismatches: List[int] = []
+    for index, record in enumerate(records):
+        body = record.get("body")
+        started = time.perf_counter()
+        response = client.open(
+            record["path"], method=record["method"],
+            data=dumps(body) if body is not None else None,
+            content_type=record.get("type", JSON) if body is not None else None,
+            headers={SESSION_HEADER: record.get("session", "")},
+        )
+        duration = time.perf_counter() - started
+        result = dict(record, status=response.status_code, ms=round(duration * 1000, 3))
+        if "response" in record:
+            result["response"] = response.get_json(silent=True)
+        replayed.append(result)
+        if result["status"] != record["status"] or result.get("response") != record.get("response"):
+            mismatches.append(index)
+    return replayed, mismatches
+
+
+def round_times(records: Iterable[Record]) -> Dict[Tuple[str, Any], float]:
+    """Milliseconds spent in the requests of every (session, round)."""
+    times: Dict[Tuple[str, Any], float] = {}
+    for key, record in rounds(records):
+        times[key] = times.get(key, 0.0) + record.get("ms", 0.0)
+    return times
+
+
+def diff(first: List[Record], second: List[Record]) -> List[Tuple[Tuple[str, Any], Record, Record]]:
+    """The requests of the same match where two logs answered differently."""
+    if len(first) != len(second):
+        raise ValueError(f"Logs of different matches ({len(first)} vs {len(second)} requests)")
+    differences = []
+    for (key, a), b in zip(rounds(first), second):
+        if (a["method"], a["path"]) != (b["method"], b["path"]):
+            raise ValueError(f"Logs diverge at {a['method']} {a['path']} (round {key[1]})")
+        if a["status"] != b["status"] or a.get("response") != b.get("response"):
+            differences.append((key, a, b))
+    return differences
+
+
+def print_timing(label: str, records: List[Record]) -> None:
+    times = sorted(round_times(records).values())
+    if not times:
+        return
+    print(
+        f"   {label:<10}{len(times):>7} rounds  p50 {statistics.median(times):8.3f} ms  "
+        f"p90 {times[min(len(times) - 1, int(0.9 * len(times)))]:8.3f} ms  "
+        f"max {times[-1]:8.3f} ms  total {sum(times):9.1f} ms"
+    )
+
+
+def print_difference(key: Tuple[str, Any], a: Record, b: Record) -> None:
+    session, round_number = key
+    print(f"   session {session} round {round_number}: {a['method']} {a['path']}")
+    print(f"     - {a['status']} {dumps(a.get('response'))}")
+    print(f"     + {b['status']} {dumps(b.get('response'))}")
+
+
+def run_command(args: argparse.Namespace) -> int:
+    from main import app
+
+    records = load(args.log)
+    replayed, mismatches = replay(records, app.test_client())
+    if args.output:
+        write(args.output, replayed)
+
+    decisions = sum("response" in record for record in records)
+    print(f"\n== {args.log}: {len(records)} requests, {decisions} decisions replayed")
+    print_timing("recorded", records)
+    print_timing("replayed", replayed)
+    keys = [key for key, _ in rounds(records)]
+    for index in mismatches[:args.show]:
+        print_difference(keys[index], records[index], replayed[index])
+    print(f"   {len(mismatches)} mismatches")
+    return 1 if mismatches else 0
+
+
+def diff_command(args: argparse.Namespace) -> int:
+    first, second = load(args.first), load(args.second)
+    differences = diff(first, second)
+    print(f"\n== {args.first} vs {args.second}: {len(first)} requests")
+    print_timing("first", first)
+    print_timing("second", second)
+    for key, a, b in differences[:args.show]:
+        print_difference(key, a, b)
+    print(f"   {len(differences)} differing responses")
+    return 1 if differences else 0
+
+
+if __name__ == '__main__':
+    os.environ.setdefault("BOT_ECONOMY_BUDGET_MS", "60000")
+    os.environ.setdefault("BOT_LOG_LEVEL", "ERROR")
+
+    parser = argparse.ArgumentParser(description="Replay recorded matches through the bot")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run_parser = commands.add_parser("run", help="Replay a log and check the decisions")
+    run_parser.add_argument("log")
+    run_parser.add_argument("--output", help="Write the replayed log here (for diff)")
+    run_parser.add_argument("--show", type=int, default=10, help="Mismatches to print")
+    diff_parser = commands.add_parser("diff", help="Compare the decisions of two logs")
+    diff_parser.add_argument("first")
+    diff_parser.add_argument("second")
+    diff_parser.add_argument("--show", type=int, default=10, help="Differences to print")
+    args = parser.parse_args()
+
+    sys.exit(run_command(args) if args.command == "run" else diff_command(args))
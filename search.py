@@ -0,0 +1,250 @@
+"""
+Anytime look-ahead search for engineer decisions (optional, BOT_ENGINEER_SEARCH=1).
+
+The rule-based engineer (deploy, else explore, else move toward a river)
+only looks at the current round. This search plans a few rounds of one
+engineer's own actions instead: every round the engineer deploys a stocked
+plant at a site in reach, explores, moves, or waits, and then the plants it
+deployed produce. Other agents and the map are held fixed, so there is no
+chance node and depth-limited expectimax reduces to a plain max search.
+
+A plan is scored like the economy planner scores its own (economy.py): the
+balance at the horizon plus the income rate over TAIL_ROUNDS more rounds, with
+small terms for how well deploy sites suit their plant (sites.py), for the
+unseen cells an EXPLORE reveals and for the walking distance to a river.
+
+The search state is a small tuple of ints (position, balance, stock, income,
+score terms, tiles taken), so children are built without copying the game
+state; map facts are read once per cell and memoized for the decision.
+Iterative deepening makes it anytime: depth 1, 2, ... are searched until the
+deadline or SEARCH_MAX_DEPTH, and the best first action of the deepest
+completed depth is played (depth 1 always completes, so there is always an
+answer). The request's time budget (SEARCH_BUDGET) is shared out among the
+engineers still to decide, so the depth scales with the time available.
+"""
+import os
+import time
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from assignment import DEPLOY_REACH, MOVE_REACH
+from economy import DEPLOY_ORDER, TAIL_ROUNDS
+from game_state import DEPLOY_COST, EXPLORE_COST, MOVE_COST, POWER_PLANT_INCOME
+from knowledge import EXPLORE_MIN_CELLS, EXPLORE_RADIUS, Knowledge
+from metrics import REGISTRY, Counter
+from occupancy import OccupancyGrid
+from pathfinding import DistanceField, is_passable
+from sites import SiteHeatmap
+from terrain import Location, TerrainIndex, manhattan_rings
+
+ENGINEER_SEARCH = os.environ.get("BOT_ENGINEER_SEARCH", "0") not in ("", "0")
+# Time for all engineer searches of one request
+SEARCH_BUDGET = float(os.environ.get("BOT_SEARCH_BUDGET_MS", "40")) / 1000
+SEARCH_MAX_DEPTH = int(os.environ.get("BOT_SEARCH_MAX_DEPTH", "4"))
+
+SITE_WEIGHT = 5  # Per point of site suitability (sites.py)
+CELL_VALUE = 1  # Per unseen cell an EXPLORE reveals
+RIVER_WEIGHT = 2  # Per step of walking distance to the nearest river
+
+SEARCH_DEPTH: Counter = REGISTRY.register(Counter(
+    "bot_search_depth_total", "Engineer searches, per deepest completed depth.", ("depth",),
+))
+
+_PLANT_INCOME = tuple(POWER_PLANT_INCOME.get(plant, 0) for plant in DEPLOY_ORDER)
+
+# (type, DEPLOY_ORDER index or -1, dx, dy)
+Move = Tuple[str, int, int, int]
+WAIT: Move = ("NONE", -1, 0, 0)
+EXPLORE: Move = ("EXPLORE", -1, 0, 0)
+
+
+class Node(NamedTuple):
+    x: int
+    y: int
+    balance: int
+    stock: Tuple[int, ...]  # Plants in the warehouse, in DEPLOY_ORDER
+    income: int  # Energy per round from the plants deployed in this plan
+    bonus: int  # Site suitability and exploration terms collected so far
+    explored: bool  # One EXPLORE per plan; a second one nearby would reveal little
+    taken: Tuple[Location, ...]  # Tiles this plan deployed to
+
+
+class SearchBudget:
+    """A request's search time, shared out among the decisions still to make."""
+
+    def __init__(self, budget: float, decisions: int) -> None:
+        self.end = time.perf_counter() + budget
+        self.left = decisions
+
+    def next_deadline(self) -> float:
+        now = time.perf_counter()
+        share = max(self.end - now, 0.0) / max(self.left, 1)
+        self.left = max(self.left - 1, 0)
+        return now + share
+
+
+class _Timeout(Exception):
+    pass
+
+
+class EngineerSearch:
+    """Depth-limited search over one engineer's actions, against a frozen view of the game."""
+
+    def __init__(self, state: Dict[str, Any]) -> None:
+        self.size: int = state["map_size"]
+        self.terrain_index: TerrainIndex = state["terrain_index"]
+        self.occupancy: OccupancyGrid = state["occupancy"]
+        self.river_field: DistanceField = state["river_field"]
+        self.knowledge: Knowledge = state["knowledge"]
+        self.sites: SiteHeatmap = state["sites"]
+        self.deadline = 0.0
+        self.nodes = 0
+        self.root_sites: List[List[int]] = []
+        self.cells: Dict[Location, Tuple[bool, bool, int]] = {}
+        self.unseen: Dict[Location, int] = {}
+        self.table: Dict[Tuple[Node, int], int] = {}
+
+    def best_action(
+        self, location: Location, balance: int, warehouse: Dict[str, int],
+        sites: List[List[int]], deadline: float,
+    ) -> Dict[str, Any]:
+        """
+        The first action of the best plan found before `deadline`. `sites` are
+        the deploy offsets this engineer may use now (its assignment).
+        """
+        self.deadline = deadline
+        self.root_sites = sites
+        root = Node(
+            location[0], location[1], balance,
+            tuple(warehouse.get(plant, 0) for plant in DEPLOY_ORDER), 0, 0, False, (),
+        )
+        best, depth = WAIT, 0
+        for limit in range(1, SEARCH_MAX_DEPTH + 1):
+            try:
+                best = self._root(root, limit, best)
+            except _Timeout:
+                break
+            depth = limit
+        SEARCH_DEPTH.inc(str(depth))
+        return _to_action(best)
+
+    def _root(self, root: Node, depth: int, previous: Move) -> Move:
+        """Searches every first move to `depth`, the previous depth's best first."""
+        moves = self._moves(root, True)
+        if previous in moves:
+            moves.remove(previous)
+            moves.insert(0, previous)
+        best = WAIT
+        best_value: Optional[int] = None
+        for move in moves:
+            value = self._value(self._play(root, move), depth - 1)
+            if best_value is None or value > best_value:
+                best, best_value = move, value
+        return best
+
+    def _value(self, node: Node, depth: int) -> int:
+        if depth == 0:
+            return self._evaluate(node)
+        self.nodes += 1
+        if time.perf_counter() > self.deadline:
+            raise _Timeout
+        key = (node, depth)
+        value = self.table.get(key)
+        if value is None:
+            value = max(self._value(self._play(node, move), depth - 1)
+                        for move in self._moves(node, False))
+            self.table[key] = value
+        return value
+
+    def _evaluate(self, node: Node) -> int:
+        """Balance plus future income and the plan's score terms."""
+        _, _, distance = self._cell(node.x, node.y)
+        return (
+            node.balance + node.income * TAIL_ROUNDS + node.bonus - RIVER_WEIGHT * distance
+        )
+
+    def _play(self, node: Node, move: Move) -> Node:
+        """The node after the engineer's move and the round's income."""
+        kind, plant, dx, dy = move
+        x, y, balance, stock, income, bonus, explored, taken = node
+        if kind == "DEPLOY":
+            balance -= DEPLOY_COST
+            stock = stock[:plant] + (stock[plant] - 1,) + stock[plant + 1:]
+            income += _PLANT_INCOME[plant]
+            bonus += SITE_WEIGHT * self.sites.score(DEPLOY_ORDER[plant], x + dx, y + dy)
+            taken = taken + ((x + dx, y + dy),)
+        elif kind == "EXPLORE":
+            balance -= EXPLORE_COST
+            bonus += CELL_VALUE * self._unseen(x, y)
+            explored = True
+        elif kind == "MOVE":
+            balance -= MOVE_COST
+            x, y = x + dx, y + dy
+        return Node(x, y, balance + income, stock, income, bonus, explored, taken)
+
+    def _moves(self, node: Node, root: bool) -> List[Move]:
+        """Affordable moves: a deploy per stocked plant (at its best site), explore, walks, wait."""
+        moves: List[Move] = []
+        if node.balance >= DEPLOY_COST and any(node.stock):
+            sites = self._deploy_sites(node, root)
+            for plant, count in enumerate(node.stock):
+                if count > 0 and sites:
+                    name = DEPLOY_ORDER[plant]
+                    dx, dy = max(sites, key=lambda site: self._site_score(node, name, site))
+                    moves.append(("DEPLOY", plant, dx, dy))
+        if (
+            node.balance >= EXPLORE_COST and not node.explored
+            and self._unseen(node.x, node.y) >= EXPLORE_MIN_CELLS
+        ):
+            moves.append(EXPLORE)
+        if node.balance >= MOVE_COST:
+            for dx, dy, _ in manhattan_rings(MOVE_REACH)[1:]:
+                cell = (node.x + dx, node.y + dy)
+                if self._cell(*cell)[1] and cell not in node.taken:
+                    moves.append(("MOVE", -1, dx, dy))
+        moves.append(WAIT)
+        return moves
+
+    def _deploy_sites(self, node: Node, root: bool) -> List[Tuple[int, int]]:
+        """Free PLAINS offsets in reach: the engineer's assigned ones at the root."""
+        x, y = node.x, node.y
+        if root:
+            return [(dx, dy) for dx, dy in self.root_sites if self._cell(x + dx, y + dy)[0]]
+        return [
+            (dx, dy) for dx, dy, _ in manhattan_rings(DEPLOY_REACH)
+            if self._cell(x + dx, y + dy)[0] and (x + dx, y + dy) not in node.taken
+        ]
+
+    def _site_score(self, node: Node, plant: str, site: Sequence[int]) -> Tuple[int, int]:
+        """Best suited first, then nearest (like the round's assignment)."""
+        return (self.sites.score(plant, node.x + site[0], node.y + site[1]),
+                -abs(site[0]) - abs(site[1]))
+
+    def _cell(self, x: int, y: int) -> Tuple[bool, bool, int]:
+        """(free PLAINS tile, free walkable tile, walking distance to a river) of a cell."""
+        cell = self.cells.get((x, y))
+        if cell is None:
+            terrain = self.terrain_index.terrain(x, y)
+            free = self.occupancy.is_free(x, y)
+            distance = self.river_field.distance((x, y))
+            cell = (
+                free and terrain == "PLAINS",
+                free and is_passable(terrain) and distance is not None,
+                distance if distance is not None else 2 * self.size,
+            )
+            self.cells[(x, y)] = cell
+        return cell
+
+    def _unseen(self, x: int, y: int) -> int:
+        unseen = self.unseen.get((x, y))
+        if unseen is None:
+            unseen = self.unseen[(x, y)] = self.knowledge.unseen_in(x, y, EXPLORE_RADIUS)
+        return unseen
+
+
+def _to_action(move: Move) -> Dict[str, Any]:
+    kind, plant, dx, dy = move
+    if kind == "DEPLOY":
+        return {"type": "DEPLOY", "params": {"power_type": DEPLOY_ORDER[plant], "d_loc": [dx, dy]}}
+    if kind == "MOVE":
+        return {"type": "MOVE", "params": {"d_loc": [dx, dy]}}
+    return {"type": kind, "params": {}}
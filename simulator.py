@@ -0,0 +1,360 @@
+"""
+Headless match simulator and benchmark harness.
+
+Generates a map, then plays the platform's side of the protocol
+(/init, /agent, /round, /agent/<id>/view, /agent/<id>/action) directly
+against the Flask handlers in this process, applies the returned actions
+with the real costs and reports latency, throughput and memory.
+
+    python simulator.py --sizes 25 100 500 --rounds 50
+"""
+import argparse
+import random
+import resource
+import statistics
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from agents_logic import DEPLOY_COST, ENGINEER_COST, EXPLORE_COST, MOVE_COST
+from codec import JSON, MAP_B64, MAP_RLE, dumps, encode_b64, encode_rle
+from game_state import BOTS_DB, POWER_PLANT_INCOME, POWER_PLANT_OPTIONS, parse_plant_table
+from main import app, configure_recording
+from terrain import IMPASSABLE_TERRAIN, Location
+
+# The platform's terrain types (tests/simple.http)
+DEFAULT_TERRAIN_MIX = {"PLAINS": 0.75, "RIVER": 0.1, "OCEAN": 0.1, "DESERT": 0.05}
+# Energy a deployed plant produces per round in the simulation. By default the
+# bot's own assumed table, so results only measure the bot against its model;
+# pass --plant-income to pay out something else.
+PLANT_INCOME = POWER_PLANT_INCOME
+PLANT_PRICES = dict(POWER_PLANT_OPTIONS)
+VIEW_RADIUS = 2
+EXPLORE_RADIUS = 5
+TEAM = "RED"
+# --wire name -> (Content-Type, body encoder) for the map in /agent/<id>/view
+WIRE_FORMATS: Dict[str, Tuple[str, Callable[[List[List[Any]]], Dict[str, Any]]]] = {
+    "json": (JSON, lambda rows: {"map": rows}),
+    "rle": (MAP_RLE, encode_rle),
+    "b64": (MAP_B64, encode_b64),
+}
+
+
+def generate_map(
+    size: int, terrain_mix: Dict[str, float], rng: random.Random
+) -> List[List[Dict[str, Any]]]:
+    """Generates a platform-style map with the given terrain proportions."""
+    names = list(terrain_mix)
+    weights = [terrain_mix[name] for name in names]
+    return [
+        [{"type": terrain, "location": [x, y]} for x, terrain in enumerate(
+            rng.choices(names, weights, k=size)
+        )]
+        for y in range(size)
+    ]
+
+
+class Match:
+    """The platform's view of one single-team match."""
+
+    def __init__(
+        self, size: int, terrain_mix: Dict[str, float], balance: int, seed: int,
+        wire: str = "json", plant_income: Optional[Dict[str, int]] = None,
+    ) -> None:
+        self.rng = random.Random(seed)
+        self.plant_income = plant_income if plant_income is not None else PLANT_INCOME
+        self.size = size
+        self.map = generate_map(size, terrain_mix, self.rng)
+        self.balance = balance
+        self.round = 0
+        self.agents: Dict[int, Dict[str, Any]] = {}
+        self.plants: Dict[Location, str] = {}
+        self.explored: Dict[int, bool] = {}
+        self.next_agent_id = 0
+        self.client = app.test_client()
+        self.latencies: Dict[str, List[float]] = {}
+        self.action_counts: Dict[str, int] = {}
+        self.wire = wire
+
+    # -- protocol -----------------------------------------------------------
+
+    def call(
+        self, endpoint: str, method: str, path: str, body: Any = None, content_type: str = JSON,
+    ) -> Any:
+        """Sends one request to the bot and records its latency under `endpoint`."""
+        request: Callable[..., Any] = getattr(self.client, method)
+        started = time.perf_counter()
+        if body is not None:
+            response = request(path, data=dumps(body), content_type=content_type)
+        else:
+            response = request(path)
+        self.latencies.setdefault(endpoint, []).append(time.perf_counter() - started)
+        if response.status_code != 200:
+            raise RuntimeError(f"{method.upper()} {path} returned {response.status_code}")
+        return response.get_json(silent=True)
+
+    def start(self) -> None:
+        self.call("/init", "post", "/init", {
+            "map_size": self.size, "init_balance": self.balance, "team": TEAM,
+        })
+        center = self.size // 2
+        factory_location = self.free_plains_near((center, center))
+        if factory_location is None:
+            raise RuntimeError("Generated map has no free PLAINS tile for the factory")
+        self.add_agent("FACTORY", factory_location)
+
+    def play_round(self, batched: bool) -> None:
+        self.round += 1
+        self.balance += sum(self.plant_income.get(plant, 0) for plant in self.plants.values())
+        self.call("/round", "post", "/round", {"round": self.round, "balance": self.balance})
+
+        for agent_id in list(self.agents):
+            radius = EXPLORE_RADIUS if self.explored.pop(agent_id, False) else VIEW_RADIUS
+            content_type, encode = WIRE_FORMATS[self.wire]
+            view = encode(self.view(agent_id, radius))
+            self.call("/view", "post", f"/agent/{agent_id}/view", view, content_type)
+
+        if batched:
+            plan = self.call("/round/actions", "post", "/round/actions")
+            actions = {int(agent_id): action for agent_id, action in plan["actions"].items()}
+        else:
+            actions = {
+                agent_id: self.call("/action", "get", f"/agent/{agent_id}/action")
+                for agent_id in list(self.agents)
+            }
+        for agent_id, action in actions.items():
+            if agent_id in self.agents:
+                self.apply(agent_id, action)
+
+    # -- world --------------------------------------------------------------
+
+    def view(self, agent_id: int, radius: int) -> List[List[Optional[Dict[str, Any]]]]:
+        """Full-size rows of None with the cells around the agent filled in."""
+        x, y = self.agents[agent_id]["location"]
+        hidden_row: List[Optional[Dict[str, Any]]] = [None] * self.size
+        rows = []
+        for row_y in range(self.size):
+            if abs(row_y - y) > radius:
+                rows.append(hidden_row)
+                continue
+            row = list(hidden_row)
+            for col_x in range(max(0, x - radius), min(self.size, x + radius + 1)):
+                row[col_x] = self.visible_cell(col_x, row_y)
+            rows.append(row)
+        return rows
+
+    def visible_cell(self, x: int, y: int) -> Dict[str, Any]:
+        cell = dict(self.map[y][x])
+        occupant = self.occupant(x, y)
+        if occupant is not None:
+            cell["agent"] = occupant
+        return cell
+
+    def occupant(self, x: int, y: int) -> Optional[Dict[str, Any]]:
+        for agent_id, agent in self.agents.items():
+            if agent["location"] == [x, y]:
+                return {"id": agent_id, "type": agent["type"], "team": TEAM}
+        plant = self.plants.get((x, y))
+        if plant is not None:
+            return {"type": plant, "team": TEAM}
+        return None
+
+    def is_free(self, x: int, y: int) -> bool:
+        if not (0 <= x < self.size and 0 <= y < self.size):
+            return False
+        if self.map[y][x]["type"] in IMPASSABLE_TERRAIN:
+            return False
+        return self.occupant(x, y) is None
+
+    def free_plains_near(self, location: Location) -> Optional[Location]:
+        for radius in range(self.size):
+            for dx in range(-radius, radius + 1):
+                for dy in (radius - abs(dx), abs(dx) - radius):
+                    x, y = location[0] + dx, location[1] + dy
+                    if self.is_free(x, y) and self.map[y][x]["type"] == "PLAINS":
+                        return x, y
+        return None
+
+    def factory(self) -> Optional[Tuple[int, Dict[str, Any]]]:
+        for agent_id, agent in self.agents.items():
+            if agent["type"] == "FACTORY":
+                return agent_id, agent
+        return None
+
+    def add_agent(self, agent_type: str, location: Location) -> None:
+        agent_id = self.next_agent_id
+        self.next_agent_id += 1
+        agent = {
+            "id": agent_id, "type": agent_type, "team": TEAM,
+            "location": [location[0], location[1]], "warehouse": {},
+        }
+        self.agents[agent_id] = agent
+        self.call("/agent", "post", f"/agent/{agent_id}", agent)
+
+    # -- actions ------------------------------------------------------------
+
+    def spend(self, cost: int) -> bool:
+        if self.balance < cost:
+            return False
+        self.balance -= cost
+        return True
+
+    def target(self, agent_id: int, action: Dict[str, Any]) -> Optional[Location]:
+        d_loc = action["params"].get("d_loc")
+        if not d_loc:
+            return None
+        x, y = self.agents[agent_id]["location"]
+        target = (x + d_loc[0], y + d_loc[1])
+        return target if self.is_free(*target) else None
+
+    def apply(self, agent_id: int, action: Dict[str, Any]) -> None:
+        """Applies an action the way the platform would, ignoring invalid ones."""
+        action_type = action.get("type", "NONE")
+        self.action_counts[action_type] = self.action_counts.get(action_type, 0) + 1
+        handler = getattr(self, f"apply_{action_type.lower()}", None)
+        if handler is not None:
+            handler(agent_id, action)
+
+    def apply_move(self, agent_id: int, action: Dict[str, Any]) -> None:
+        target = self.target(agent_id, action)
+        if target is not None and self.spend(MOVE_COST):
+            self.agents[agent_id]["location"] = [target[0], target[1]]
+            self.call("/patch", "patch", f"/agent/{agent_id}", {"location": list(target)})
+
+    def apply_explore(self, agent_id: int, action: Dict[str, Any]) -> None:
+        if self.spend(EXPLORE_COST):
+            self.explored[agent_id] = True
+
+    def apply_build_bot(self, agent_id: int, action: Dict[str, Any]) -> None:
+        target = self.target(agent_id, action)
+        if target is not None and self.spend(ENGINEER_COST):
+            self.add_agent("ENGINEER_BOT", target)
+
+    def apply_assemble_power_plant(self, agent_id: int, action: Dict[str, Any]) -> None:
+        plant = action["params"].get("power_type")
+        if plant in PLANT_PRICES and self.spend(PLANT_PRICES[plant]):
+            warehouse = self.agents[agent_id]["warehouse"]
+            warehouse[plant] = warehouse.get(plant, 0) + 1
+            self.call("/patch", "patch", f"/agent/{agent_id}", {"warehouse": warehouse})
+
+    def apply_deploy(self, agent_id: int, action: Dict[str, Any]) -> None:
+        plant = action["params"].get("power_type")
+        found = self.factory()
+        target = self.target(agent_id, action)
+        if found is None or target is None:
+            return
+        factory_id, factory = found
+        if factory["warehouse"].get(plant, 0) > 0 and self.spend(DEPLOY_COST):
+            factory["warehouse"][plant] -= 1
+            self.plants[target] = plant
+            self.call(
+                "/patch", "patch", f"/agent/{factory_id}", {"warehouse": factory["warehouse"]}
+            )
+
+
+def percentile(samples: List[float], fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def run_match(
+    size: int, rounds: int, terrain_mix: Dict[str, float], balance: int, seed: int,
+    batched: bool = False, trace_memory: bool = False, wire: str = "json",
+    plant_income: Optional[Dict[str, int]] = None,
+) -> Dict[str, Any]:
+    """Plays one match and returns its benchmark report."""
+    if trace_memory:
+        tracemalloc.start()
+    match = Match(size, terrain_mix, balance, seed, wire, plant_income)
+    match.start()
+    started = time.perf_counter()
+    for _ in range(rounds):
+        match.play_round(batched)
+    elapsed = time.perf_counter() - started
+
+    report: Dict[str, Any] = {
+        "size": size,
+        "rounds": rounds,
+        "rounds_per_second": rounds / elapsed if elapsed else float("inf"),
+        "final_balance": match.balance,
+        "agents": len(match.agents),
+        "plants": len(match.plants),
+        "actions": dict(match.action_counts),
+        "bot_agents": len(BOTS_DB["agents"]),
+        "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "latency_ms": {
+            endpoint: {
+                "count": len(samples),
+                "p50": percentile(samples, 0.5) * 1000,
+                "p90": percentile(samples, 0.9) * 1000,
+                "p99": percentile(samples, 0.99) * 1000,
+                "mean": statistics.fmean(samples) * 1000,
+            }
+            for endpoint, samples in match.latencies.items()
+        },
+    }
+    if trace_memory:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        report["traced_peak_mb"] = peak / 1e6
+    return report
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    print(
+        f"\n== map {report['size']}x{report['size']}, {report['rounds']} rounds: "
+        f"{report['rounds_per_second']:.1f} rounds/s, balance {report['final_balance']}, "
+        f"{report['agents']} agents, {report['plants']} plants, "
+        f"max RSS {report['max_rss_mb']:.1f} MB"
+    )
+    if "traced_peak_mb" in report:
+        print(f"   traced peak memory {report['traced_peak_mb']:.1f} MB")
+    print(f"   actions {report['actions']}")
+    print(
+        f"   {'endpoint':<16}{'count':>8}{'p50 ms':>10}{'p90 ms':>10}"
+        f"{'p99 ms':>10}{'mean ms':>10}"
+    )
+    for endpoint, stats in sorted(report["latency_ms"].items()):
+        print(
+            f"   {endpoint:<16}{stats['count']:>8}{stats['p50']:>10.3f}{stats['p90']:>10.3f}"
+            f"{stats['p99']:>10.3f}{stats['mean']:>10.3f}"
+        )
+
+
+def parse_terrain_mix(value: str) -> Dict[str, float]:
+    """Parses "PLAINS=0.8,RIVER=0.1,OCEAN=0.1"."""
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        mix[name.strip().upper()] = float(weight)
+    return mix
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Headless match simulator and benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[25, 100, 500])
+    parser.add_argument("--rounds", type=int, default=50)
+    parser.add_argument("--balance", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--mix", type=parse_terrain_mix, default=DEFAULT_TERRAIN_MIX,
+                        help="Terrain proportions, e.g. PLAINS=0.8,RIVER=0.1,OCEAN=0.1")
+    parser.add_argument("--batched", action="store_true",
+                        help="Ask for all actions with POST /round/actions")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="Measure peak Python allocations with tracemalloc (slower)")
+    parser.add_argument("--wire", choices=sorted(WIRE_FORMATS), default="json",
+                        help="Map encoding of /agent/<id>/view bodies")
+    parser.add_argument("--plant-income", type=parse_plant_table,
+                        help="Income the simulated platform pays per plant, e.g. DAM=40,WINDMILL=8 "
+                             "(default: the bot's assumed table)")
+    parser.add_argument("--record", help="Record the bot's requests and decisions for replay.py")
+    args = parser.parse_args()
+    configure_recording(args.record)
+
+    plant_income = None if args.plant_income is None else {**PLANT_INCOME, **args.plant_income}
+    for map_size in args.sizes:
+        print_report(run_match(
+            map_size, args.rounds, args.mix, args.balance, args.seed,
+            batched=args.batched, trace_memory=args.trace_memory, wire=args.wire,
+            plant_income=plant_income,
+        ))
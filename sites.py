@@ -0,0 +1,139 @@
+"""
+Deploy-site suitability per power plant type.
+
+Some plants belong next to a terrain type (AFFINITY): by default a DAM next
+to RIVER tiles. The platform does not say where plants produce more, so the
+table is a guess and can be set with BOT_SITE_AFFINITY (e.g.
+"DAM=RIVER,GEOTHERMAL=DESERT"); other plants work anywhere, so they should
+leave those spots free. For each affinity terrain we keep a heatmap: how many
+of its tiles lie in the square window (SITE_RADIUS) around every cell. A
+site's score for a plant is then
+
+- a plant with an affinity: the count of its terrain around it,
+- anything else: minus the counts of every affinity terrain (keep the banks
+  for the plants that need them),
+
+read in O(1) from the heatmaps.
+
+/init builds the heatmaps with a separable box filter (sliding row sums,
+then sliding column sums over bytes masks), snapshot restores defer that to
+the first query; a /view only adjusts the window around each cell whose
+terrain changed.
+"""
+import os
+from array import array
+from itertools import accumulate
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple
+
+from metrics import MAP_SCANS
+from terrain import Location
+
+SITE_RADIUS = int(os.environ.get("BOT_SITE_RADIUS", "1"))
+
+
+def parse_affinity(value: str) -> Dict[str, str]:
+    """Parses "DAM=RIVER,GEOTHERMAL=DESERT" into {plant: terrain}."""
+    table = {}
+    for part in value.split(","):
+        plant, _, terrain = part.partition("=")
+        if plant.strip() and terrain.strip():
+            table[plant.strip().upper()] = terrain.strip().upper()
+    return table
+
+
+# Plant -> terrain it wants around its site (an assumption, see above)
+AFFINITY = parse_affinity(os.environ.get("BOT_SITE_AFFINITY", "DAM=RIVER"))
+
+
+class SiteHeatmap:
+    """Affinity terrain counts around every cell, one uint16 array per terrain."""
+
+    def __init__(self, radius: int = SITE_RADIUS) -> None:
+        self.radius = radius
+        self.size = 0
+        self.counts: Dict[str, "array[int]"] = {}
+        self.pending: Optional[Tuple[bytes, Mapping[str, int]]] = None
+
+    def rebuild(self, terrain: bytes, terrain_codes: Mapping[str, int]) -> None:
+        """Recomputes every heatmap from a map's terrain codes (row-major, size * size)."""
+        MAP_SCANS.inc("site_heatmap_rebuild")
+        self.pending = None
+        self.size = int(len(terrain) ** 0.5)
+        self.counts = {}
+        for name in set(AFFINITY.values()):
+            mask = bytearray(256)
+            code = terrain_codes.get(name)
+            if code is not None:
+                mask[code] = 1
+            self.counts[name] = self._box_counts(terrain.translate(mask))
+
+    def rebuild_later(self, terrain: bytes, terrain_codes: Mapping[str, int]) -> None:
+        """Defers a rebuild from the (live) terrain array until the heatmaps are first used."""
+        self.pending = (terrain, terrain_codes)
+
+    def ensure(self) -> None:
+        """Runs a deferred rebuild, if any."""
+        if self.pending is not None:
+            self.rebuild(*self.pending)
+
+    def update(self, location: Location, previous: Optional[str], current: Optional[str]) -> None:
+        """Records a terrain change reported by /view."""
+        if self.pending is not None:
+            self.ensure()  # Rebuilt from the map, which already has the change
+            return
+        if previous == current:
+            return
+        if previous in self.counts:
+            self._add(self.counts[previous], location, -1)
+        if current in self.counts:
+            self._add(self.counts[current], location, 1)
+
+    def score(self, plant: str, x: int, y: int) -> int:
+        """How well a site suits a plant (higher is better)."""
+        self.ensure()
+        if not (0 <= x < self.size and 0 <= y < self.size):
+            return 0
+        index = y * self.size + x
+        terrain = AFFINITY.get(plant)
+        if terrain is not None:
+            return self.counts[terrain][index] if terrain in self.counts else 0
+        return -sum(counts[index] for counts in self.counts.values())
+
+    def rank(
+        self, plant: str, location: Sequence[int], offsets: List[List[int]]
+    ) -> List[List[int]]:
+        """Orders deploy offsets around `location` best site first (stable for ties)."""
+        x, y = location[0], location[1]
+        return sorted(offsets, key=lambda offset: -self.score(plant, x + offset[0], y + offset[1]))
+
+    def _box_counts(self, mask: bytes) -> "array[int]":
+        """Sums a 0/1 mask over the square window around every cell."""
+        size, radius = self.size, self.radius
+        if not mask.count(1):
+            return array("H", bytes(2 * size * size))
+        row_sums: List[List[int]] = []
+        for y in range(size):
+            prefix = [0, *accumulate(mask[y * size:(y + 1) * size])]
+            row_sums.append([
+                prefix[min(x + radius + 1, size)] - prefix[max(x - radius, 0)] for x in range(size)
+            ])
+
+        counts = array("H")
+        window = [0] * size
+        for y in range(min(radius, size)):
+            window = [a + b for a, b in zip(window, row_sums[y])]
+        for y in range(size):
+            if y + radius < size:
+                window = [a + b for a, b in zip(window, row_sums[y + radius])]
+            if y - radius - 1 >= 0:
+                window = [a - b for a, b in zip(window, row_sums[y - radius - 1])]
+            counts.extend(window)
+        return counts
+
+    def _add(self, counts: "array[int]", location: Location, amount: int) -> None:
+        size, radius = self.size, self.radius
+        x, y = location
+        for cell_y in range(max(y - radius, 0), min(y + radius + 1, size)):
+            row = cell_y * size
+            for cell_x in range(max(x - radius, 0), min(x + radius + 1, size)):
+                counts[row + cell_x] += amount
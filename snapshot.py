@@ -0,0 +1,198 @@
+"""
+Memory-mapped snapshots of game states, so a restarted bot resumes its matches.
+
+One file per session in the snapshot directory, laid out as
+
+    header | terrain codes | agent ids (int32, native order) | occupancy | metadata JSON
+
+The dense arrays are copied in and out with single slice operations; the
+metadata holds everything else (round, balance, agents with their
+assumed warehouses, sparse map attributes, reservations) and the terrain
+code table: codes past the built-in ones are handed out in the order a
+process first meets each terrain, so a restore translates them (like
+codec.decode_b64 does for compact maps).
+The header is written last and carries a CRC of the body, so a snapshot torn
+by a crash mid-write is rejected instead of restored. Derived structures
+(terrain index, river distance field, site heatmaps, round plan) are rebuilt
+when first used, so a restore costs little more than copying the arrays.
+Fog-of-war knowledge is not saved: every cell with known terrain counts as
+seen.
+
+Writes go to the page cache through the mapping: they survive the process
+dying, only an OS crash can lose the latest snapshot.
+"""
+import logging
+import mmap
+import os
+import struct
+import threading
+import zlib
+from array import array
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+from urllib.parse import quote, unquote
+
+from codec import dumps, loads
+from game_state import TERRAIN_CODES, TERRAIN_NAMES, Agent, GameMap, new_game_state, terrain_code
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_DIR = os.environ.get("BOT_SNAPSHOT_DIR")
+# "round": save when a round starts; "request": save after every game request
+SNAPSHOT_MODE = os.environ.get("BOT_SNAPSHOT_MODE", "round")
+SNAPSHOT_MODES = ("round", "request")
+
+MAGIC = b"BOTSNAP2"
+# magic, map size, occupancy size, body crc32, metadata length
+HEADER = struct.Struct("<8sIIIQ")
+SUFFIX = ".snap"
+MAX_OPEN_FILES = 64
+
+
+class SnapshotError(Exception):
+    """A snapshot file is missing, truncated or corrupt."""
+
+
+class SnapshotStore:
+    """
+    Saves and restores game states as memory-mapped files in one directory.
+    Mappings are kept open between saves of the same size, so saving again is
+    a handful of memory copies; at most MAX_OPEN_FILES stay open.
+    """
+
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.files: "OrderedDict[str, mmap.mmap]" = OrderedDict()
+        self.guard = threading.Lock()  # Protects self.files
+
+    def path(self, session_id: str) -> str:
+        return os.path.join(self.directory, quote(session_id, safe="") + SUFFIX)
+
+    def session_ids(self) -> List[str]:
+        """Returns the sessions that have a snapshot on disk."""
+        return sorted(
+            unquote(name[:-len(SUFFIX)])
+            for name in os.listdir(self.directory) if name.endswith(SUFFIX)
+        )
+
+    def save(self, session_id: str, state: Dict[str, Any]) -> int:
+        """Writes the snapshot of one session. Returns its size in bytes."""
+        game_map: GameMap = state["map"]
+        occupancy = state["occupancy"]
+        metadata = dumps({
+            "map_size": state["map_size"],
+            "init_balance": state["init_balance"],
+            "team": state["team"],
+            "round": state["round"],
+            "balance": state["balance"],
+            "agents": [agent.to_dict() for agent in state["agents"].values()],
+            "extras": list(game_map.extras.items()),
+            "reservations": occupancy.reservations,
+            "terrain_names": TERRAIN_NAMES,
+        }).encode()
+        parts = [game_map.terrain, game_map.agent_ids.tobytes(), occupancy.cells, metadata]
+        length = HEADER.size + sum(len(part) for part in parts)
+
+        crc = 0
+        with self.guard:
+            mapping = self._mapping(session_id, length)
+            offset = HEADER.size
+            for part in parts:
+                mapping[offset:offset + len(part)] = part
+                offset += len(part)
+                crc = zlib.crc32(part, crc)
+            mapping[:HEADER.size] = HEADER.pack(
+                MAGIC, game_map.size, occupancy.size, crc, len(metadata)
+            )
+        return length
+
+    def load(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Restores the state of one session, or returns None if it has no usable snapshot."""
+        try:
+            with open(self.path(session_id), "rb") as file:
+                with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapping:
+                    return _decode(mapping)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, SnapshotError) as error:
+            logger.warning("⚠️ Ignoring snapshot of session %s: %s", session_id, error)
+            return None
+
+    def close(self) -> None:
+        with self.guard:
+            for mapping in self.files.values():
+                mapping.close()
+            self.files.clear()
+
+    def _mapping(self, session_id: str, length: int) -> mmap.mmap:
+        mapping = self.files.get(session_id)
+        if mapping is not None and len(mapping) == length:
+            self.files.move_to_end(session_id)
+            return mapping
+        if mapping is not None:
+            mapping.close()
+
+        with open(self.path(session_id), "a+b") as file:
+            file.truncate(length)
+            mapping = mmap.mmap(file.fileno(), length)
+        self.files[session_id] = mapping
+        self.files.move_to_end(session_id)
+        while len(self.files) > MAX_OPEN_FILES:
+            _, oldest = self.files.popitem(last=False)
+            oldest.close()
+        return mapping
+
+
+def _decode(mapping: mmap.mmap) -> Dict[str, Any]:
+    """Rebuilds a game state from a snapshot's bytes."""
+    if len(mapping) < HEADER.size:
+        raise SnapshotError("file is shorter than its header")
+    magic, map_size, occupancy_size, crc, metadata_length = HEADER.unpack_from(mapping)
+    if magic != MAGIC:
+        raise SnapshotError("not a snapshot file")
+
+    cells = map_size * map_size
+    agent_ids = array("i")
+    sizes = [cells, cells * agent_ids.itemsize, occupancy_size * occupancy_size, metadata_length]
+    if HEADER.size + sum(sizes) != len(mapping):
+        raise SnapshotError("file size does not match its header")
+    body = memoryview(mapping)[HEADER.size:]
+    try:
+        if zlib.crc32(body) != crc:
+            raise SnapshotError("checksum mismatch (interrupted write?)")
+        terrain = bytearray(body[:sizes[0]])
+        agent_ids.frombytes(body[sizes[0]:sizes[0] + sizes[1]])
+        occupancy_start = sizes[0] + sizes[1]
+        occupancy_cells = bytearray(body[occupancy_start:occupancy_start + sizes[2]])
+        metadata = loads(bytes(body[occupancy_start + sizes[2]:]))
+    finally:
+        body.release()
+
+    terrain = _translate_terrain(terrain, metadata["terrain_names"])
+    state = new_game_state()
+    for key in ("map_size", "init_balance", "team", "round", "balance"):
+        state[key] = metadata[key]
+    for agent in metadata["agents"]:
+        state["agents"].add(Agent.from_dict(agent))
+    state["map"] = GameMap.from_arrays(
+        terrain, agent_ids, {int(index): extras for index, extras in metadata["extras"]}
+    )
+    state["occupancy"].reset(occupancy_size)
+    state["occupancy"].cells = occupancy_cells
+    state["occupancy"].reservations.extend(metadata["reservations"])
+    state["terrain_index"].rebuild_later(state["map"])
+    state["knowledge"].rebuild(terrain)
+    state["sites"].rebuild_later(terrain, TERRAIN_CODES)
+    return state
+
+
+def _translate_terrain(terrain: bytearray, names: List[Optional[str]]) -> bytearray:
+    """Maps the terrain codes of the process that saved a snapshot to this process's codes."""
+    if max(terrain, default=0) >= len(names):
+        raise SnapshotError("terrain code missing from the saved code table")
+    table = bytearray(256)
+    for code, name in enumerate(names):
+        if isinstance(name, str):
+            table[code] = terrain_code(name)
+    return terrain.translate(table)
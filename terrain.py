@@ -0,0 +1,271 @@
+import os
+import re
+import threading
+from functools import lru_cache
+from typing import Dict, Iterable, Iterator, List, Optional, Protocol, Set, Tuple, Union
+
+from metrics import MAP_SCANS
+
+Location = Tuple[int, int]
+
+# Terrain type <-> uint8 code used by GameMap (0 means the cell is unknown).
+# Starts with the types the platform sends; others get a code when first seen.
+TERRAIN_NAMES: List[Optional[str]] = [None, "PLAINS", "RIVER", "OCEAN", "DESERT"]
+TERRAIN_CODES: Dict[str, int] = {name: code for code, name in enumerate(TERRAIN_NAMES) if name}
+_terrain_lock = threading.Lock()  # Requests of different games register types in parallel
+
+# Terrain that engineers cannot walk through. The platform sends PLAINS, RIVER,
+# OCEAN and DESERT tiles; treating OCEAN as impassable is our reading of the rules,
+# so it can be changed with e.g. BOT_IMPASSABLE_TERRAIN=OCEAN,DESERT (empty: none).
+IMPASSABLE_TERRAIN = frozenset(
+    name.strip().upper()
+    for name in os.environ.get("BOT_IMPASSABLE_TERRAIN", "OCEAN").split(",") if name.strip()
+)
+
+# Terrain types with a location index for nearest-of-type lookups (all other
+# types are only read cell by cell, straight from the map)
+INDEXED_TERRAIN = frozenset({"RIVER"})
+
+
+def terrain_code(name: str) -> int:
+    """Returns the code of a terrain type, registering types seen for the first time."""
+    code = TERRAIN_CODES.get(name)
+    if code is not None:
+        return code
+    with _terrain_lock:
+        code = TERRAIN_CODES.get(name)  # Another thread may have registered it meanwhile
+        if code is None:
+            if len(TERRAIN_NAMES) > 255:
+                raise ValueError(f"Too many terrain types to encode {name!r}")
+            code = len(TERRAIN_NAMES)
+            TERRAIN_NAMES.append(name)
+            TERRAIN_CODES[name] = code
+    return code
+
+
+@lru_cache(maxsize=None)
+def manhattan_rings(max_distance: int) -> Tuple[Tuple[int, int, int], ...]:
+    """
+    Returns every (dx, dy, distance) offset within a Manhattan radius,
+    nearest ring first (ties ordered by dx, then dy). Cached per radius.
+    """
+    offsets = [
+        (abs(dx) + abs(dy), dx, dy)
+        for dx in range(-max_distance, max_distance + 1)
+        for dy in range(-max_distance, max_distance + 1)
+        if abs(dx) + abs(dy) <= max_distance
+    ]
+    offsets.sort()
+    return tuple((dx, dy, distance) for distance, dx, dy in offsets)
+
+
+def square_window(cells: Union[bytes, bytearray], size: int, x: int, y: int, radius: int) -> bytes:
+    """
+    Returns the bytes of a row-major size x size grid in the square around
+    (x, y), clipped to the grid (one slice per row).
+    """
+    start, end = max(x - radius, 0), min(x + radius + 1, size)
+    if start >= end:
+        return b""
+    return b"".join(
+        cells[row * size + start:row * size + end]
+        for row in range(max(y - radius, 0), min(y + radius + 1, size))
+    )
+
+
+class TerrainCodes(Protocol):
+    """A square map of terrain codes, row-major (GameMap)."""
+
+    size: int
+    terrain: bytearray
+
+
+class BucketGrid:
+    """
+    A sparse set of cells plus a bucket grid over them, so nearest-cell
+    lookups visit the buckets around the query point instead of every cell.
+    """
+
+    def __init__(self, bucket_size: int = 8) -> None:
+        self.bucket_size = bucket_size
+        self.cells: Set[Location] = set()
+        self.buckets: Dict[Location, Set[Location]] = {}
+        self.bounds: Optional[List[int]] = None  # [min_bx, min_by, max_bx, max_by]
+
+    def __len__(self) -> int:
+        return len(self.cells)
+
+    def __contains__(self, location: object) -> bool:
+        return location in self.cells
+
+    def __iter__(self) -> Iterator[Location]:
+        return iter(self.cells)
+
+    def clear(self) -> None:
+        self.cells.clear()
+        self.buckets.clear()
+        self.bounds = None
+
+    def add(self, x: int, y: int) -> None:
+        location = (x, y)
+        if location in self.cells:
+            return
+        self.cells.add(location)
+        bucket = (x // self.bucket_size, y // self.bucket_size)
+        self.buckets.setdefault(bucket, set()).add(location)
+        bounds = self.bounds
+        if bounds is None:
+            self.bounds = [bucket[0], bucket[1], bucket[0], bucket[1]]
+        else:
+            bounds[0] = min(bounds[0], bucket[0])
+            bounds[1] = min(bounds[1], bucket[1])
+            bounds[2] = max(bounds[2], bucket[0])
+            bounds[3] = max(bounds[3], bucket[1])
+
+    def discard(self, x: int, y: int) -> None:
+        location = (x, y)
+        if location in self.cells:
+            self.cells.discard(location)
+            self.buckets[(x // self.bucket_size, y // self.bucket_size)].discard(location)
+
+    def nearest_many(self, x: int, y: int, count: int) -> List[Location]:
+        """
+        Finds up to `count` closest cells (Manhattan distance), nearest first;
+        ties go to the lowest row, then column. Buckets are visited in rings
+        around the query point, stopping as soon as no further ring can hold a
+        closer cell than the ones found.
+        """
+        if not self.cells or self.bounds is None or count <= 0:
+            return []
+        MAP_SCANS.inc("nearest")
+
+        size = self.bucket_size
+        buckets = self.buckets
+        bx, by = x // size, y // size
+        min_bx, min_by, max_bx, max_by = self.bounds
+        max_ring = max(bx - min_bx, max_bx - bx, by - min_by, max_by - by)
+
+        found: List[Tuple[int, int, int]] = []  # (distance, row, col)
+        for ring in range(max_ring + 1):
+            for bucket in _bucket_ring(bx, by, ring):
+                for col, row in buckets.get(bucket, ()):
+                    found.append((abs(x - col) + abs(y - row), row, col))
+            if len(found) >= count:
+                found.sort()
+                del found[count:]
+                # Any cell in ring + 1 is at least ring * size + 1 tiles away
+                if found[-1][0] <= ring * size:
+                    break
+
+        found.sort()
+        return [(col, row) for _, row, col in found[:count]]
+
+    def nearest(self, x: int, y: int) -> Optional[Location]:
+        found = self.nearest_many(x, y, 1)
+        return found[0] if found else None
+
+
+class TerrainIndex:
+    """
+    Terrain lookups over a GameMap. Single cells are read from the map's code
+    array; only the INDEXED_TERRAIN types (few cells each) get a BucketGrid of
+    their locations for nearest-of-type lookups. The map stays the one copy of
+    the terrain: after it changes, `update` moves the cell between the grids.
+    """
+
+    def __init__(self, bucket_size: int = 8, indexed: Iterable[str] = INDEXED_TERRAIN) -> None:
+        self.bucket_size = bucket_size
+        self.indexed = frozenset(indexed)
+        self.game_map: Optional[TerrainCodes] = None
+        self.grids: Dict[str, BucketGrid] = {name: BucketGrid(bucket_size) for name in self.indexed}
+        self.pending = False
+
+    def clear(self) -> None:
+        """Forget the map and every indexed cell."""
+        self.game_map = None
+        self.pending = False
+        for grid in self.grids.values():
+            grid.clear()
+
+    def rebuild(self, game_map: TerrainCodes) -> None:
+        """Re-indexes a full map (used on /init and restore)."""
+        MAP_SCANS.inc("terrain_index_rebuild")
+        self.clear()
+        self.game_map = game_map
+        size = game_map.size
+        for name, grid in self.grids.items():
+            code = TERRAIN_CODES.get(name)
+            if code is None:
+                continue
+            for match in re.finditer(re.escape(bytes([code])), game_map.terrain):
+                y, x = divmod(match.start(), size)
+                grid.add(x, y)
+
+    def rebuild_later(self, game_map: TerrainCodes) -> None:
+        """Defers a rebuild until the index is first used (restoring a snapshot)."""
+        self.clear()
+        self.game_map = game_map
+        self.pending = True
+
+    def ensure(self) -> None:
+        """Runs a deferred rebuild, if any."""
+        if self.pending and self.game_map is not None:
+            self.rebuild(self.game_map)
+
+    @property
+    def size(self) -> int:
+        return self.game_map.size if self.game_map is not None else 0
+
+    def terrain(self, x: int, y: int) -> Optional[str]:
+        """Returns the terrain type of a cell, or None if unknown (or off the map)."""
+        game_map = self.game_map
+        if game_map is None or not (0 <= x < game_map.size and 0 <= y < game_map.size):
+            return None
+        return TERRAIN_NAMES[game_map.terrain[y * game_map.size + x]]
+
+    def locations(self, terrain: str) -> Set[Location]:
+        """Returns every known cell of an indexed terrain type."""
+        self.ensure()
+        return self._grid(terrain).cells
+
+    def update(self, x: int, y: int, previous: Optional[str], current: Optional[str]) -> None:
+        """Records a cell whose terrain the map changed from `previous` to `current`."""
+        if self.pending or previous == current:
+            return  # A pending rebuild reads the map, which already has the change
+        if previous in self.grids:
+            self.grids[previous].discard(x, y)
+        if current in self.grids:
+            self.grids[current].add(x, y)
+
+    def nearest(self, x: int, y: int, terrain: str) -> Optional[Location]:
+        """
+        Finds the closest cell (Manhattan distance) of an indexed terrain type.
+        Ties go to the lowest row, then column.
+        """
+        self.ensure()
+        return self._grid(terrain).nearest(x, y)
+
+    def nearest_many(self, x: int, y: int, terrain: str, count: int) -> List[Location]:
+        """Finds up to `count` closest cells of an indexed terrain type, nearest first."""
+        self.ensure()
+        return self._grid(terrain).nearest_many(x, y, count)
+
+    def _grid(self, terrain: str) -> BucketGrid:
+        grid = self.grids.get(terrain)
+        if grid is None:
+            raise KeyError(f"{terrain} is not an indexed terrain type")
+        return grid
+
+
+def _bucket_ring(bx: int, by: int, ring: int) -> List[Location]:
+    """Returns the bucket coordinates at Chebyshev distance `ring` from (bx, by)."""
+    if ring == 0:
+        return [(bx, by)]
+    ring_buckets = []
+    for dx in range(-ring, ring + 1):
+        ring_buckets.append((bx + dx, by - ring))
+        ring_buckets.append((bx + dx, by + ring))
+    for dy in range(-ring + 1, ring):
+        ring_buckets.append((bx - ring, by + dy))
+        ring_buckets.append((bx + ring, by + dy))
+    return ring_buckets
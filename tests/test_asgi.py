@@ -0,0 +1,57 @@
+import asyncio
+import threading
+import time
+from typing import Any, Dict, List, Tuple
+
+import pytest
+
+pytest.importorskip("asgiref")
+
+from asgi import application  # noqa: E402
+from main import app  # noqa: E402
+
+SLOW_SECONDS = 0.2
+
+
+def slow_round() -> Tuple[str, int]:
+    time.sleep(SLOW_SECONDS)
+    return str(threading.get_ident()), 200
+
+
+async def post_round(game_id: str) -> Tuple[int, bytes]:
+    scope = {
+        "type": "http", "http_version": "1.1", "method": "POST", "scheme": "http",
+        "path": "/round", "root_path": "", "query_string": b"",
+        "headers": [(b"x-game-id", game_id.encode())],
+    }
+    messages: List[Dict[str, Any]] = []
+
+    async def receive() -> Dict[str, Any]:
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message: Dict[str, Any]) -> None:
+        messages.append(message)
+
+    await application(scope, receive, send)
+    return messages[0]["status"], b"".join(m.get("body", b"") for m in messages[1:])
+
+
+async def post_rounds(game_ids: List[str]) -> Tuple[float, List[Tuple[int, bytes]]]:
+    started = time.perf_counter()
+    responses = await asyncio.gather(*(post_round(game_id) for game_id in game_ids))
+    return time.perf_counter() - started, list(responses)
+
+
+def test_different_games_run_in_parallel(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setitem(app.view_functions, "new_round", slow_round)
+    elapsed, responses = asyncio.run(post_rounds(["a", "b", "c", "d"]))
+    assert [status for status, _ in responses] == [200] * 4
+    assert len({body for _, body in responses}) == 4  # One thread per request
+    assert elapsed < 2.5 * SLOW_SECONDS
+
+
+def test_requests_of_one_game_run_one_at_a_time(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setitem(app.view_functions, "new_round", slow_round)
+    elapsed, responses = asyncio.run(post_rounds(["same"] * 3))
+    assert [status for status, _ in responses] == [200] * 3
+    assert elapsed >= 3 * SLOW_SECONDS
@@ -0,0 +1,78 @@
+from typing import Any, Dict, List, Optional
+
+from assignment import _auction, assign_engineers, next_plant
+from game_state import TERRAIN_CODES, Agent, GameMap, new_game_state
+
+# Row-major: ROWS[y][x]. "." PLAINS, "~" RIVER, "#" OCEAN
+ROWS = [
+    "...~...",
+    ".......",
+    ".......",
+    ".......",
+    ".......",
+    ".......",
+    "#######",
+]
+TERRAIN = {".": "PLAINS", "~": "RIVER", "#": "OCEAN"}
+
+
+def game(engineers: Dict[int, List[int]], warehouse: Optional[Dict[str, int]] = None) -> Any:
+    """A round-1 game on ROWS: a factory in the bottom-left corner and the given engineers."""
+    state: Dict[str, Any] = new_game_state()
+    state.update(map_size=len(ROWS), round=1, team="RED")
+    state["map"] = GameMap.from_rows([
+        [{"type": TERRAIN[char], "location": [x, y]} for x, char in enumerate(row)]
+        for y, row in enumerate(ROWS)
+    ])
+    state["occupancy"].reset(len(ROWS))
+    state["terrain_index"].rebuild(state["map"])
+    state["knowledge"].rebuild(state["map"].terrain)
+    state["sites"].rebuild(state["map"].terrain, TERRAIN_CODES)
+    state["agents"].add(Agent(0, "FACTORY", "RED", (0, 5), warehouse or {}))
+    state["occupancy"].occupy(0, 5)
+    for agent_id, (x, y) in engineers.items():
+        state["agents"].add(Agent(agent_id, "ENGINEER_BOT", "RED", (x, y)))
+        state["occupancy"].occupy(x, y)
+    return state
+
+
+def test_auction_gives_each_target_to_one_engineer() -> None:
+    bids = [(3, 2, (1, 1)), (1, 1, (0, 0)), (2, 2, (0, 0)), (4, 1, (1, 1))]
+    assert _auction(bids) == {1: (0, 0), 2: (1, 1)}
+
+
+def test_next_plant_is_the_best_stocked_one() -> None:
+    assert next_plant(game({})) == "DAM"  # Nothing stocked: what the factory will buy first
+    assert next_plant(game({}, {"WINDMILL": 1})) == "WINDMILL"
+    assert next_plant(game({}, {"WINDMILL": 1, "DAM": 0, "SOLAR_PANELS": 2})) == "SOLAR_PANELS"
+
+
+def test_engineers_get_distinct_free_sites_and_rivers() -> None:
+    state = game({1: [2, 3], 2: [4, 3]}, {"WINDMILL": 2})
+    assignments = assign_engineers(state)
+    sites = {
+        agent_id: (state["agents"][agent_id].location[0] + assignment["deploy"][0],
+                   state["agents"][agent_id].location[1] + assignment["deploy"][1])
+        for agent_id, assignment in assignments.items()
+    }
+    assert len(set(sites.values())) == 2
+    assert all(state["occupancy"].is_free(*site) for site in sites.values())
+    assert {assignments[1]["target"], assignments[2]["target"]} <= {(3, 0), None}
+    assert [assignments[1]["target"], assignments[2]["target"]].count((3, 0)) == 1
+    for assignment in assignments.values():
+        assert assignment["options"][0] == assignment["deploy"]  # The won site ranks first
+
+
+def test_sites_suit_the_plant_to_deploy() -> None:
+    dam = assign_engineers(game({1: [3, 2]}, {"DAM": 1}))[1]
+    assert dam["deploy"] == [0, -1]  # Next to the river
+    windmill = assign_engineers(game({1: [3, 2]}, {"WINDMILL": 1}))[1]
+    assert windmill["deploy"] == [-1, 0]  # Nearest site off the river bank
+
+
+def test_assignments_are_cached_per_round_and_revision() -> None:
+    state = game({1: [3, 3]})
+    first = assign_engineers(state)
+    assert assign_engineers(state) is first
+    state["revision"] += 1
+    assert assign_engineers(state) is not first
@@ -0,0 +1,104 @@
+import base64
+import random
+from typing import Any, Dict, List, Optional
+
+import pytest
+
+from codec import MAP_B64, MAP_RLE, EncodedMap, decode_map, encode_b64, encode_rle
+from game_state import SESSION_HEADER, GameMap
+from main import app
+
+Rows = List[List[Optional[Dict[str, Any]]]]
+
+
+def random_rows(size: int, seed: int) -> Rows:
+    """Row-major platform-style rows with hidden cells and a few agents."""
+    rng = random.Random(seed)
+    rows: Rows = [[None] * size for _ in range(size)]
+    for y in range(size):
+        for x in range(size):
+            if rng.random() < 0.7:
+                terrain = rng.choice(["PLAINS", "PLAINS", "RIVER", "OCEAN", "DESERT"])
+                rows[y][x] = {"type": terrain, "location": [x, y]}
+    for agent_id in range(3):
+        x, y = rng.randrange(size), rng.randrange(size)
+        rows[y][x] = {
+            "type": "PLAINS", "location": [x, y],
+            "agent": {"id": agent_id, "type": "ENGINEER_BOT", "team": "RED"},
+        }
+    return rows
+
+
+def decoded(content_type: str, body: Dict[str, Any]) -> GameMap:
+    encoded = decode_map(content_type, body)
+    assert isinstance(encoded, EncodedMap)
+    return GameMap.from_segments(encoded.size, encoded.segments, encoded.cells)
+
+
+@pytest.mark.parametrize("content_type, encode", [(MAP_RLE, encode_rle), (MAP_B64, encode_b64)])
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_compact_maps_round_trip(content_type: str, encode: Any, seed: int) -> None:
+    rows = random_rows(9, seed)
+    expected = GameMap.from_rows(rows)
+    game_map = decoded(content_type, encode(rows))
+    assert game_map.terrain == expected.terrain
+    assert game_map.agent_ids == expected.agent_ids
+    assert [game_map.cell(x, y) for y in range(9) for x in range(9)] == [
+        expected.cell(x, y) for y in range(9) for x in range(9)
+    ]
+
+
+def test_b64_codes_are_translated_from_the_senders_table() -> None:
+    # The sender numbers terrain its own way: 1 = RIVER, 2 = PLAINS
+    body = {"map": {
+        "terrain": [None, "RIVER", "PLAINS"],
+        "codes": base64.b64encode(bytes([1, 2, 0, 2])).decode(),
+    }}
+    game_map = decoded(MAP_B64, body)
+    assert game_map.terrain_at(0, 0) == "RIVER"
+    assert game_map.terrain_at(1, 0) == "PLAINS"
+    assert game_map.terrain_at(0, 1) is None
+    assert game_map.terrain_at(1, 1) == "PLAINS"
+
+
+@pytest.mark.parametrize("content_type, body", [
+    (MAP_RLE, {"map": [[["PLAINS", -1]]]}),
+    (MAP_RLE, {"map": [[["PLAINS"]]]}),
+    (MAP_B64, {"map": {"terrain": [None], "codes": "AAA"}}),
+    (MAP_B64, {"map": {"terrain": [None], "codes": base64.b64encode(bytes(3)).decode()}}),
+    (MAP_B64, {"map": {"terrain": ["PLAINS"], "codes": ""}}),
+])
+def test_malformed_maps_are_rejected(content_type: str, body: Dict[str, Any]) -> None:
+    with pytest.raises(ValueError):
+        decode_map(content_type, body)
+
+
+@pytest.mark.parametrize("content_type, encode", [(MAP_RLE, encode_rle), (MAP_B64, encode_b64)])
+def test_compact_maps_must_match_the_map_size(content_type: str, encode: Any) -> None:
+    body = encode(random_rows(9, 1))
+    encoded = decode_map(content_type, body, 9)
+    assert isinstance(encoded, EncodedMap) and encoded.size == 9
+    with pytest.raises(ValueError):
+        decode_map(content_type, body, 10)
+
+
+def test_rle_views_may_leave_out_the_bottom_rows() -> None:
+    encoded = decode_map(MAP_RLE, {"map": [[["PLAINS", 3]]]}, 3)
+    assert isinstance(encoded, EncodedMap)
+    assert encoded.size == 3 and encoded.segments == [(0, 0, bytes([1, 1, 1]))]
+    with pytest.raises(ValueError):
+        decode_map(MAP_RLE, {"map": [[["PLAINS", 2]]]}, 3)  # A short row
+
+
+@pytest.mark.parametrize("content_type, encode", [(MAP_RLE, encode_rle), (MAP_B64, encode_b64)])
+def test_wrongly_sized_maps_get_a_400(content_type: str, encode: Any) -> None:
+    client = app.test_client()
+    headers = {SESSION_HEADER: "codec", "Content-Type": content_type}
+    small = encode(random_rows(8, 1))
+    init = {"map_size": 9, "init_balance": 100, "team": "RED"}
+    assert client.post("/init", json=dict(init, **small), headers=headers).status_code == 400
+    assert client.post("/init", json=dict(init, **encode(random_rows(9, 1))),
+                       headers=headers).status_code == 200
+    assert client.post("/agent/0/view", json=small, headers=headers).status_code == 400
+    assert client.post("/agent/0/view", json=encode(random_rows(9, 2)),
+                       headers=headers).status_code == 200
@@ -0,0 +1,107 @@
+from typing import Any, Dict, List, Optional
+
+import pytest
+
+import agents_logic
+import decisions
+import main
+from decisions import DecisionCache
+from game_state import SESSION_HEADER
+from main import app
+
+# 9x9, row-major: an OCEAN band with gaps at x = 0 and x = 8, the river beyond it
+ROWS = [
+    "...~.....",
+    ".........",
+    ".#######.",
+    ".#######.",
+    ".#######.",
+    ".........",
+    ".........",
+    ".........",
+    ".........",
+]
+TERRAIN = {".": "PLAINS", "~": "RIVER", "#": "OCEAN"}
+HEADERS = {SESSION_HEADER: "decisions"}
+
+
+def map_rows(agents: Optional[Dict[Any, Dict[str, Any]]] = None) -> List[List[Dict[str, Any]]]:
+    agents = agents or {}
+    return [
+        [
+            dict({"type": TERRAIN[char], "location": [x, y]}, agent=agents.get((x, y)))
+            for x, char in enumerate(row)
+        ]
+        for y, row in enumerate(ROWS)
+    ]
+
+
+def engineer_moves(cache_size: int, monkeypatch: pytest.MonkeyPatch) -> List[Any]:
+    """The engineer's moves in two rounds, with an enemy showing up in the near gap between."""
+    monkeypatch.setattr(decisions.ENGINEER_DECISIONS, "max_size", cache_size)
+    decisions.ENGINEER_DECISIONS.clear()
+    client = app.test_client()
+
+    def post(path: str, body: Dict[str, Any]) -> None:
+        assert client.post(path, json=body, headers=HEADERS).status_code == 200
+
+    post("/init", {"map_size": 9, "init_balance": 100, "team": "RED", "map": map_rows()})
+    post("/agent/0", {"id": 0, "type": "FACTORY", "team": "RED", "location": [7, 7]})
+    post("/agent/1", {"id": 1, "type": "ENGINEER_BOT", "team": "RED", "location": [3, 5]})
+    moves = []
+    for round_number in (1, 2):
+        if round_number == 2:
+            enemy = {"id": 99, "type": "ENGINEER_BOT", "team": "BLUE", "location": [0, 2]}
+            post("/agent/1/view", {"map": map_rows({(0, 2): enemy})})
+        post("/round", {"round": round_number, "balance": 100})
+        response = client.get("/agent/1/action", headers=HEADERS)
+        moves.append(response.get_json()["params"].get("d_loc"))
+    return moves
+
+
+def test_cached_decisions_follow_changes_far_away(monkeypatch: pytest.MonkeyPatch) -> None:
+    uncached = engineer_moves(0, monkeypatch)
+    assert uncached == [[-2, 0], [2, 0]]  # Around the band on the left, then on the right
+    assert engineer_moves(decisions.DECISION_CACHE_SIZE, monkeypatch) == uncached
+
+
+def test_lru_evicts_the_least_recently_used() -> None:
+    cache = DecisionCache(max_size=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1  # "b" is now the oldest
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c"), len(cache)) == (1, 3, 2)
+
+
+def test_disabled_cache_stores_nothing() -> None:
+    cache = DecisionCache(max_size=0)
+    cache.put("a", 1)
+    assert cache.get("a") is None and len(cache) == 0
+
+
+def test_agents_added_after_planning_are_decided_once(monkeypatch: pytest.MonkeyPatch) -> None:
+    client = app.test_client()
+    headers = {SESSION_HEADER: "late-agent"}
+
+    def post(path: str, body: Dict[str, Any]) -> None:
+        assert client.post(path, json=body, headers=headers).status_code == 200
+
+    post("/init", {"map_size": 9, "init_balance": 100, "team": "RED", "map": map_rows()})
+    post("/agent/0", {"id": 0, "type": "FACTORY", "team": "RED", "location": [7, 7]})
+    post("/round", {"round": 1, "balance": 100})
+    assert client.get("/agent/0/action", headers=headers).status_code == 200  # Plans the round
+    post("/agent/1", {"id": 1, "type": "ENGINEER_BOT", "team": "RED", "location": [3, 5]})
+
+    decided = []
+
+    def get_agent_action(state: Dict[str, Any], agent: Any) -> Dict[str, Any]:
+        decided.append(agent.id)
+        action: Dict[str, Any] = agents_logic.get_agent_action(state, agent)
+        return action
+
+    monkeypatch.setattr(main, "get_agent_action", get_agent_action)
+    first = client.get("/agent/1/action", headers=headers).get_json()
+    assert client.get("/agent/1/action", headers=headers).get_json() == first
+    assert decided == [1]
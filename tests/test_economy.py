@@ -0,0 +1,50 @@
+from typing import Iterator
+
+import pytest
+
+import economy
+from economy import BUILD, WAIT, Economy, factory_moves, finish_round, plan_factory
+
+WINDMILL = ("ASSEMBLE_POWER_PLANT", "WINDMILL")
+NO_PLANTS = (0, 0, 0, 0)
+
+
+@pytest.fixture(autouse=True)
+def empty_cache(monkeypatch: pytest.MonkeyPatch) -> Iterator[None]:
+    monkeypatch.setattr(economy, "_cache", type(economy._cache)())
+    yield
+
+
+def test_factory_moves_are_the_affordable_ones() -> None:
+    assert [move for move, _ in factory_moves(Economy(99, NO_PLANTS, 0, 0))] == [WAIT]
+    moves = dict(factory_moves(Economy(150, NO_PLANTS, 0, 0)))
+    assert list(moves) == [WAIT, BUILD, WINDMILL]
+    assert moves[BUILD] == Economy(50, NO_PLANTS, 1, 0)
+    assert moves[WINDMILL] == Economy(50, (1, 0, 0, 0), 0, 0)
+
+
+def test_finish_round_deploys_the_best_plants_it_can_pay_for() -> None:
+    # Two engineers, a WINDMILL and a DAM in stock, money for one deploy
+    after = finish_round(Economy(15, (1, 0, 0, 1), 2, 5))
+    assert after.warehouse == (1, 0, 0, 0)
+    assert after.income == 5 + economy.PLANT_INCOME[3]
+    assert after.balance == 15 - 10 + after.income
+    # Nothing to deploy: only income
+    assert finish_round(Economy(15, NO_PLANTS, 2, 5)) == Economy(20, NO_PLANTS, 2, 5)
+
+
+def test_plan_ranks_every_affordable_move() -> None:
+    start = Economy(300, NO_PLANTS, 0, 0)
+    ranked = plan_factory(start, horizon=6)
+    assert sorted(ranked) == sorted(move for move, _ in factory_moves(start))
+    assert ranked[0] != WAIT  # Idle money earns nothing
+
+
+def test_completed_searches_are_cached_and_cut_ones_are_not() -> None:
+    start = Economy(300, (1, 0, 0, 0), 1, 5)
+    cut = plan_factory(start, horizon=6, budget=0)
+    assert sorted(cut) == sorted(move for move, _ in factory_moves(start))
+    assert not economy._cache
+    ranked = plan_factory(start, horizon=6, budget=60.0)
+    assert plan_factory(start, horizon=6) is ranked
+    assert plan_factory(start._replace(balance=305), horizon=6, budget=60.0) is not ranked
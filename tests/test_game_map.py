@@ -0,0 +1,97 @@
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from game_state import TERRAIN_CODES, TERRAIN_NAMES, GameMap, terrain_code
+
+
+def cell(terrain: str, x: int, y: int, **extras: Any) -> Dict[str, Any]:
+    return {"type": terrain, "location": [x, y], **extras}
+
+
+def test_view_cells_are_merged_at_their_location() -> None:
+    # Like tests/simple.http: the outer list index is location[0]
+    engineer = {"id": 3, "type": "ENGINEER_BOT", "team": "BLUE", "location": [4, 1]}
+    rows: List[List[Optional[Dict[str, Any]]]] = [[None] * 6 for _ in range(6)]
+    rows[3][1] = cell("OCEAN", 3, 1)
+    rows[4][1] = cell("PLAINS", 4, 1, agent=engineer)
+    rows[4][2] = cell("RIVER", 4, 2)
+    game_map = GameMap(6)
+    visible: List[Tuple[int, int, int]] = []
+
+    changed = game_map.merge_view(rows, visible)
+    assert changed == {(3, 1), (4, 1), (4, 2)}
+    assert game_map.terrain_at(3, 1) == "OCEAN"
+    assert game_map.terrain_at(1, 3) is None
+    assert game_map.agent_id_at(4, 1) == 3
+    assert sorted(visible) == [(1, 3, 5), (2, 4, 5)]
+
+
+def test_row_major_views_merge_the_same() -> None:
+    rows: List[List[Optional[Dict[str, Any]]]] = [[None] * 4 for _ in range(4)]
+    rows[1][2] = cell("RIVER", 2, 1)
+    rows[1][3] = cell("PLAINS", 3, 1)
+    game_map = GameMap(4)
+    assert game_map.merge_view(rows) == {(2, 1), (3, 1)}
+    assert game_map.terrain_at(2, 1) == "RIVER"
+    assert game_map.merge_view(rows) == set()  # Nothing new the second time
+
+
+def test_visible_cell_without_agent_clears_it() -> None:
+    game_map = GameMap(3)
+    game_map.merge_view([[cell("PLAINS", 1, 1, agent={"id": 9})]])
+    assert game_map.has_agent(1, 1)
+    assert game_map.merge_view([[cell("PLAINS", 1, 1, agent=None)]]) == {(1, 1)}
+    assert not game_map.has_agent(1, 1)
+
+
+def test_cells_without_valid_location_are_ignored() -> None:
+    game_map = GameMap(3)
+    rows = [[{"type": "PLAINS"}, {"type": "RIVER", "location": [9, 9]}, None]]
+    assert game_map.merge_view(rows) == set()
+    assert list(game_map.known_terrain()) == []
+
+
+def test_init_rows_use_locations() -> None:
+    game_map = GameMap.from_rows([
+        [cell("PLAINS", 0, 0), cell("RIVER", 0, 1)],
+        [cell("DESERT", 1, 0), {"type": "PLAINS"}],
+    ])
+    assert game_map.terrain_at(0, 1) == "RIVER"
+    assert game_map.terrain_at(1, 0) == "DESERT"
+    assert game_map.terrain_at(1, 1) == "PLAINS"  # No location: placed by position
+
+
+def test_cells_are_copies_and_writes_go_through_the_row() -> None:
+    game_map = GameMap(3)
+    game_map[1][2] = cell("PLAINS", 2, 1)
+    read = game_map[1][2]
+    assert read is not None
+    read["type"] = "RIVER"  # A copy: the map does not change
+    assert game_map.terrain_at(2, 1) == "PLAINS"
+    game_map[1][2] = read
+    assert game_map.terrain_at(2, 1) == "RIVER"
+
+
+def test_terrain_types_registered_in_parallel_get_distinct_codes() -> None:
+    saved_names, saved_codes = list(TERRAIN_NAMES), dict(TERRAIN_CODES)
+    names = [f"TEST_TERRAIN_{index}" for index in range(40)]
+    codes: Dict[str, int] = {}
+    start = threading.Barrier(8)
+
+    def register(offset: int) -> None:
+        start.wait()
+        for name in names[offset:] + names[:offset]:
+            codes[name] = terrain_code(name)
+
+    threads = [threading.Thread(target=register, args=(5 * i,)) for i in range(8)]
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(set(codes.values())) == len(names)
+        assert all(TERRAIN_NAMES[code] == name for name, code in codes.items())
+    finally:
+        TERRAIN_NAMES[:] = saved_names
+        TERRAIN_CODES.clear()
+        TERRAIN_CODES.update(saved_codes)
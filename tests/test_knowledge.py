@@ -0,0 +1,44 @@
+import random
+from typing import Optional
+
+from knowledge import Knowledge
+from terrain import Location
+
+
+def brute_force_nearest(knowledge: Knowledge, x: int, y: int) -> Optional[Location]:
+    size = knowledge.size
+    unseen_edge = [
+        (cx, cy) for cy in range(size) for cx in range(size)
+        if not knowledge.seen[cy * size + cx] and any(
+            0 <= nx < size and 0 <= ny < size and knowledge.seen[ny * size + nx]
+            for nx, ny in ((cx - 1, cy), (cx + 1, cy), (cx, cy - 1), (cx, cy + 1))
+        )
+    ]
+    if not unseen_edge:
+        return None
+    return min(
+        unseen_edge, key=lambda cell: (abs(cell[0] - x) + abs(cell[1] - y), cell[1], cell[0])
+    )
+
+
+def test_nearest_frontier_follows_the_views() -> None:
+    rng = random.Random(3)
+    knowledge = Knowledge(40)
+    assert knowledge.nearest_frontier(0, 0) is None
+    for _ in range(30):
+        x, y = rng.randrange(40), rng.randrange(40)
+        knowledge.observe((row, x - 2, x + 3) for row in range(y - 2, y + 3))
+        for _ in range(5):
+            qx, qy = rng.randrange(40), rng.randrange(40)
+            assert knowledge.nearest_frontier(qx, qy) == brute_force_nearest(knowledge, qx, qy)
+
+
+def test_rebuild_finds_the_same_frontier() -> None:
+    knowledge = Knowledge(10)
+    assert knowledge.explore(4, 4, radius=2) == 25
+    assert knowledge.explore(4, 4, radius=2) == 0  # Already seen
+    rebuilt = Knowledge()
+    rebuilt.rebuild(bytes(knowledge.seen))
+    assert rebuilt.frontier == knowledge.frontier
+    assert len(knowledge.frontier) == 20
+    assert rebuilt.nearest_frontier(0, 0) == (2, 1)  # Tied with (1, 2)
@@ -0,0 +1,44 @@
+from occupancy import OccupancyGrid
+
+
+def test_reservations_last_one_round() -> None:
+    grid = OccupancyGrid(4)
+    assert grid.reserve(1, 1)
+    assert not grid.reserve(1, 1)  # Already claimed this round
+    assert not grid.is_free(1, 1)
+    grid.clear_reservations()
+    assert grid.is_free(1, 1)
+
+
+def test_confirmed_cells_outlive_the_round() -> None:
+    grid = OccupancyGrid(4)
+    assert grid.reserve(2, 0)
+    grid.occupy(2, 0)  # The platform confirmed the move
+    grid.clear_reservations()
+    assert not grid.is_free(2, 0)
+    grid.release(2, 0)  # The agent left
+    assert grid.is_free(2, 0)
+
+
+def test_release_confirmed_keeps_this_rounds_reservation() -> None:
+    grid = OccupancyGrid(4)
+    grid.occupy(0, 3)
+    grid.release_confirmed(0, 3)
+    assert grid.is_free(0, 3)
+    assert grid.reserve(0, 3)
+    grid.release_confirmed(0, 3)  # Another agent leaving does not free a planned move
+    assert not grid.is_free(0, 3)
+
+
+def test_container_view_and_bounds() -> None:
+    grid = OccupancyGrid(3)
+    grid.occupy(0, 0)
+    grid.reserve(2, 1)
+    assert len(grid) == 2
+    assert sorted(grid) == [(0, 0), (2, 1)]
+    assert (0, 0) in grid and (1, 1) not in grid
+    assert (3, 0) in grid and (-1, 2) in grid  # Outside the grid counts as occupied
+    grid.occupy(5, 5)  # Ignored
+    assert len(grid) == 2
+    grid.reset(5)
+    assert len(grid) == 0 and grid.is_free(4, 4)
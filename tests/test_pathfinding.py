@@ -0,0 +1,127 @@
+import random
+from typing import Any, Dict, List
+
+import pytest
+
+from assignment import assign_engineers, step_toward
+from game_state import Agent, GameMap, new_game_state
+from pathfinding import DistanceField, find_path
+from terrain import TerrainIndex
+
+# Row-major: ROWS[y][x]. "." PLAINS, "~" RIVER, "#" OCEAN
+ROWS = [
+    "...~...",
+    ".......",
+    "######.",
+    "######.",
+    "######.",
+    ".......",
+    ".......",
+]
+TERRAIN = {".": "PLAINS", "~": "RIVER", "#": "OCEAN"}
+
+
+def terrain_index(rows: List[str], size: int = 0) -> TerrainIndex:
+    """An index over a map of `rows` (cells past them, up to `size`, are unknown)."""
+    game_map = GameMap(max(size, len(rows)))
+    for y, row in enumerate(rows):
+        for x, char in enumerate(row):
+            game_map.set_cell(x, y, {"type": TERRAIN[char]})
+    index = TerrainIndex()
+    index.rebuild(game_map)
+    return index
+
+
+def game(rows: List[str]) -> Dict[str, Any]:
+    state = new_game_state()
+    state["map_size"] = len(rows)
+    state["terrain_index"] = state["river_field"].terrain_index = terrain_index(rows)
+    state["map"] = state["terrain_index"].game_map
+    state["occupancy"].reset(len(rows))
+    return state
+
+
+def test_find_path_goes_around_ocean() -> None:
+    path = find_path((3, 5), (3, 0), terrain_index(ROWS))
+    assert path is not None
+    assert path[0] == (3, 5) and path[-1] == (3, 0)
+    assert len(path) == 12  # Right to x = 6, up past the OCEAN, back left
+    assert all(abs(a[0] - b[0]) + abs(a[1] - b[1]) == 1 for a, b in zip(path, path[1:]))
+    assert all(ROWS[y][x] != "#" for x, y in path)
+
+
+def test_find_path_respects_blocked_cells() -> None:
+    index = terrain_index(ROWS)
+    assert find_path((3, 5), (3, 0), index, blocked={(6, 3)}) is None
+    assert find_path((3, 5), (3, 0), index, blocked={(3, 5), (3, 0)}) is not None
+    assert find_path((3, 5), (3, 3), index) is None  # OCEAN goal
+    assert find_path((3, 5), (9, 9), index) is None  # Unknown goal
+
+
+def test_find_path_gives_up_after_max_expansions() -> None:
+    index = terrain_index(ROWS)
+    assert find_path((3, 5), (3, 0), index, max_expansions=10) is None
+    assert find_path((3, 5), (3, 0), index, max_expansions=40) is not None
+
+
+def test_river_targets_are_reachable() -> None:
+    # The nearest RIVER by straight-line distance, (0, 0), lies behind the OCEAN
+    state = game(["~......", "#######", ".......", ".......", "....~..", ".......", "......."])
+    state["agents"].add(Agent(1, "ENGINEER_BOT", "RED", (0, 2)))
+    assert state["river_field"].nearest_source((0, 2)) == (4, 4)
+    assert state["river_field"].nearest_source((0, 0)) == (0, 0)
+    assert assign_engineers(state)[1]["target"] == (4, 4)
+
+
+def test_step_toward_detours_when_the_direct_step_is_blocked() -> None:
+    state = game(ROWS)
+    # Every cell in reach that is closer to (3, 0) is OCEAN: follow the A* path
+    assert step_toward(state, (3, 5), (3, 0)) == [2, 0]
+    state["occupancy"].occupy(5, 5)
+    assert step_toward(state, (3, 5), (3, 0)) == [1, 1]  # Around the agent
+    state["occupancy"].occupy(4, 5)
+    state["occupancy"].occupy(4, 6)
+    assert step_toward(state, (3, 5), (3, 0)) is None
+
+
+def reveal(index: TerrainIndex, field: DistanceField, x: int, y: int, terrain: str) -> None:
+    """Applies a /view terrain change the way main.apply_map_changes does."""
+    game_map = index.game_map
+    assert isinstance(game_map, GameMap)
+    previous = game_map.terrain_at(x, y)
+    if game_map.set_cell(x, y, {"type": terrain}) and previous != terrain:
+        index.update(x, y, previous, terrain)
+        field.update((x, y), previous, terrain)
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_distance_field_updates_match_a_rebuild(seed: int) -> None:
+    rng = random.Random(seed)
+    index = terrain_index([], 15)
+    field = DistanceField(index)
+    assert field.distance((0, 0)) is None  # Nothing known yet
+    for _ in range(600):
+        x, y = rng.randrange(15), rng.randrange(15)
+        reveal(index, field, x, y, rng.choice(["PLAINS", "PLAINS", "PLAINS", "RIVER", "OCEAN"]))
+        if rng.random() < 0.3:  # Sometimes several changes arrive before the next query
+            continue
+        field.ensure()
+        assert not field.needs_rebuild
+        fresh = DistanceField(index)
+        fresh.ensure()
+        assert field.distances == fresh.distances
+
+
+def test_distance_field_patches_changes_without_a_rebuild() -> None:
+    index = terrain_index(ROWS, 9)
+    field = DistanceField(index)
+    assert field.distance((3, 5)) == 11
+    reveal(index, field, 3, 7, "PLAINS")  # Off the known map: one more step
+    reveal(index, field, 4, 7, "RIVER")  # A new source
+    assert not field.needs_rebuild
+    assert field.distance((3, 7)) == 1
+    assert field.distance((3, 5)) == 3
+    reveal(index, field, 4, 7, "OCEAN")  # A source lost: only its dependants are redone
+    assert not field.needs_rebuild
+    assert field.distance((3, 7)) == 13
+    assert field.distance((3, 5)) == 11
@@ -0,0 +1,30 @@
+from collections import OrderedDict
+from pathlib import Path
+
+import pytest
+
+import economy
+from main import app
+from replay import load, replay
+
+# Recorded with:
+#   BOT_ECONOMY_BUDGET_MS=60000 python simulator.py --sizes 12 --rounds 30 --wire rle \
+#       --record tests/match.jsonl
+# Re-record it when a strategy change is meant to change the decisions.
+MATCH = Path(__file__).with_name("match.jsonl")
+
+
+@pytest.fixture
+def full_economy_search(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Decisions are only reproducible if the economy search is not cut short."""
+    monkeypatch.setattr(economy, "TIME_BUDGET", 60.0)
+    monkeypatch.setattr(economy, "_cache", OrderedDict())
+
+
+@pytest.mark.usefixtures("full_economy_search")
+def test_recorded_match_replays_without_mismatches() -> None:
+    records = load(str(MATCH))
+    replayed, mismatches = replay(records, app.test_client())
+    assert len(replayed) == len(records)
+    assert sum("response" in record for record in records) > 30
+    assert mismatches == []
@@ -0,0 +1,71 @@
+import time
+from typing import Any, Dict, List
+
+from game_state import TERRAIN_CODES, GameMap, new_game_state
+from search import SEARCH_DEPTH, SEARCH_MAX_DEPTH, EngineerSearch, SearchBudget
+
+# Row-major: ROWS[y][x]. "." PLAINS, "~" RIVER
+ROWS = [
+    "...~...",
+    ".......",
+    ".......",
+    ".......",
+    ".......",
+    ".......",
+    ".......",
+]
+TERRAIN = {".": "PLAINS", "~": "RIVER"}
+
+
+def game(rows: List[str]) -> Dict[str, Any]:
+    """A fully seen game on `rows`, with nothing on the map."""
+    state = new_game_state()
+    state["map_size"] = len(rows)
+    state["map"] = GameMap.from_rows([
+        [{"type": TERRAIN[char], "location": [x, y]} for x, char in enumerate(row)]
+        for y, row in enumerate(rows)
+    ])
+    state["occupancy"].reset(len(rows))
+    state["terrain_index"].rebuild(state["map"])
+    state["knowledge"].rebuild(state["map"].terrain)
+    state["sites"].rebuild(state["map"].terrain, TERRAIN_CODES)
+    return state
+
+
+def decide(state: Dict[str, Any], location: List[int], balance: int, warehouse: Dict[str, int],
+           sites: List[List[int]], budget: float = 10.0) -> Dict[str, Any]:
+    search = EngineerSearch(state)
+    return search.best_action(
+        (location[0], location[1]), balance, warehouse, sites, time.perf_counter() + budget
+    )
+
+
+def test_deploys_a_stocked_plant_at_its_best_site() -> None:
+    action = decide(game(ROWS), [3, 2], 100, {"DAM": 1}, [[1, 0], [0, -1], [0, 1]])
+    assert action == {"type": "DEPLOY", "params": {"power_type": "DAM", "d_loc": [0, -1]}}
+
+
+def test_walks_toward_the_river_with_nothing_to_deploy() -> None:
+    state = game(ROWS)
+    action = decide(state, [3, 5], 100, {}, [])
+    assert action["type"] == "MOVE"
+    dx, dy = action["params"]["d_loc"]
+    assert state["river_field"].distance((3 + dx, 5 + dy)) < state["river_field"].distance((3, 5))
+
+
+def test_a_spent_budget_still_answers_from_depth_one() -> None:
+    state = game(ROWS)
+    before = dict(SEARCH_DEPTH.values)
+    assert decide(state, [3, 2], 100, {"DAM": 1}, [[0, -1]], budget=-1)["type"] == "DEPLOY"
+    assert SEARCH_DEPTH.values[("1",)] == before.get(("1",), 0) + 1
+    decide(state, [3, 2], 100, {"DAM": 1}, [[0, -1]])
+    depth = (str(SEARCH_MAX_DEPTH),)
+    assert SEARCH_DEPTH.values[depth] == before.get(depth, 0) + 1
+
+
+def test_budget_is_shared_among_the_decisions_left() -> None:
+    budget = SearchBudget(1.0, 4)
+    first = budget.next_deadline() - time.perf_counter()
+    assert 0.2 < first <= 0.25
+    budget.left = 0
+    assert budget.next_deadline() <= budget.end
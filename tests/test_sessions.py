@@ -0,0 +1,71 @@
+import threading
+import time
+
+from game_state import DEFAULT_SESSION, SessionStore
+
+
+def test_idle_sessions_are_evicted() -> None:
+    store = SessionStore(max_sessions=8, ttl=0)
+    for session_id in ("a", "b"):
+        store.acquire(session_id)
+        store.get(session_id)
+        store.release(session_id)
+    store.acquire("c")
+    store.get("c")
+    assert list(store.sessions) == ["c"]
+    assert set(store.locks) == {DEFAULT_SESSION, "c"}
+    store.release("c")
+
+
+def test_least_recently_used_session_goes_over_the_limit() -> None:
+    store = SessionStore(max_sessions=2, ttl=3600)
+    for session_id in ("a", "b", "a", "c"):
+        store.acquire(session_id)
+        store.get(session_id)
+        store.release(session_id)
+    assert list(store.sessions) == ["a", "c"]
+
+
+def test_session_in_use_is_not_evicted() -> None:
+    store = SessionStore(max_sessions=1, ttl=0)
+    store.acquire("slow")
+    state = store.get("slow")
+    state["round"] = 7
+    store.acquire("other")
+    store.get("other")  # Would evict "slow", but its request is still running
+    store.release("other")
+    assert store.get("slow") is state
+    store.release("slow")
+
+
+def test_waiting_request_keeps_the_lock_through_eviction() -> None:
+    store = SessionStore(max_sessions=1, ttl=0)
+    store.acquire("game")
+    store.get("game")
+    running = []
+
+    def request(name: str) -> None:
+        store.acquire("game")
+        running.append(name)
+        time.sleep(0.05)
+        running.remove(name)
+        store.release("game")
+
+    waiting = threading.Thread(target=request, args=("waiting",))
+    waiting.start()
+    time.sleep(0.05)  # Now blocked on the session lock
+    store.acquire("other")
+    store.get("other")  # Eviction pass while "game" has a waiter
+    store.release("other")
+    store.release("game")
+
+    late = threading.Thread(target=request, args=("late",))
+    late.start()
+    overlaps = 0
+    for _ in range(20):
+        overlaps += len(running) > 1
+        time.sleep(0.005)
+    waiting.join()
+    late.join()
+    assert overlaps == 0
+    assert "game" in store.sessions
@@ -0,0 +1,69 @@
+import random
+from typing import List
+
+import pytest
+
+from game_state import TERRAIN_CODES
+from sites import SiteHeatmap, parse_affinity
+
+CODES = [TERRAIN_CODES[name] for name in ("PLAINS", "PLAINS", "RIVER", "OCEAN")]
+
+
+def random_terrain(size: int, seed: int) -> bytearray:
+    rng = random.Random(seed)
+    return bytearray(rng.choice(CODES + [0]) for _ in range(size * size))
+
+
+def river_counts(terrain: bytearray, size: int, radius: int) -> List[int]:
+    """The heatmap the slow way: RIVER tiles in the window around every cell."""
+    river = TERRAIN_CODES["RIVER"]
+    return [
+        sum(
+            terrain[cell_y * size + cell_x] == river
+            for cell_y in range(max(y - radius, 0), min(y + radius + 1, size))
+            for cell_x in range(max(x - radius, 0), min(x + radius + 1, size))
+        )
+        for y in range(size) for x in range(size)
+    ]
+
+
+def test_parse_affinity() -> None:
+    assert parse_affinity("dam=river, GEOTHERMAL = DESERT,,SOLAR=") == {
+        "DAM": "RIVER", "GEOTHERMAL": "DESERT",
+    }
+
+
+@pytest.mark.parametrize("radius", [1, 2])
+def test_rebuild_counts_every_window(radius: int) -> None:
+    terrain = random_terrain(11, radius)
+    heatmap = SiteHeatmap(radius)
+    heatmap.rebuild(bytes(terrain), TERRAIN_CODES)
+    assert list(heatmap.counts["RIVER"]) == river_counts(terrain, 11, radius)
+
+
+def test_updates_match_a_rebuild() -> None:
+    rng = random.Random(3)
+    terrain = random_terrain(9, 3)
+    heatmap = SiteHeatmap(1)
+    heatmap.rebuild(bytes(terrain), TERRAIN_CODES)
+    names = {code: name for name, code in TERRAIN_CODES.items()}
+    for _ in range(200):
+        index, code = rng.randrange(81), rng.choice(CODES)
+        previous, terrain[index] = names.get(terrain[index]), code
+        heatmap.update((index % 9, index // 9), previous, names[code])
+    assert list(heatmap.counts["RIVER"]) == river_counts(terrain, 9, 1)
+
+
+def test_scores_keep_river_banks_for_dams() -> None:
+    terrain = bytearray([TERRAIN_CODES["PLAINS"]]) * 25
+    terrain[0] = TERRAIN_CODES["RIVER"]
+    heatmap = SiteHeatmap(1)
+    heatmap.rebuild_later(bytes(terrain), TERRAIN_CODES)
+    assert heatmap.score("DAM", 1, 1) == 1  # Builds on first use
+    assert heatmap.score("DAM", 3, 3) == 0
+    assert heatmap.score("WINDMILL", 1, 1) == -1
+    assert heatmap.score("WINDMILL", 3, 3) == 0
+    assert heatmap.score("DAM", 5, 0) == 0  # Off the map
+    offsets = [[1, 1], [0, 1], [-1, -1]]
+    assert heatmap.rank("DAM", [1, 1], offsets) == [[-1, -1], [1, 1], [0, 1]]
+    assert heatmap.rank("WINDMILL", [1, 1], offsets) == [[1, 1], [0, 1], [-1, -1]]
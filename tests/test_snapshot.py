@@ -0,0 +1,85 @@
+import os
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator
+
+import pytest
+
+import game_state
+from game_state import TERRAIN_CODES, TERRAIN_NAMES, Agent, GameMap, new_game_state
+from snapshot import SnapshotStore
+
+BUILT_IN_TERRAIN = [None, "PLAINS", "RIVER", "OCEAN", "DESERT"]
+
+
+@pytest.fixture
+def fresh_terrain_table() -> Iterator[Callable[[], None]]:
+    """Gives the test the code table of a process that has only met the built-in terrain."""
+    saved_names, saved_codes = list(TERRAIN_NAMES), dict(TERRAIN_CODES)
+
+    def reset() -> None:
+        TERRAIN_NAMES[:] = BUILT_IN_TERRAIN
+        TERRAIN_CODES.clear()
+        TERRAIN_CODES.update({name: code for code, name in enumerate(BUILT_IN_TERRAIN) if name})
+
+    yield reset
+    TERRAIN_NAMES[:] = saved_names
+    TERRAIN_CODES.clear()
+    TERRAIN_CODES.update(saved_codes)
+
+
+def saved_state() -> Dict[str, Any]:
+    state = new_game_state()
+    state.update(map_size=3, init_balance=500, team="RED", round=4, balance=321)
+    state["map"] = GameMap.from_rows([
+        [{"type": "PLAINS"}, {"type": "OCEAN"}, None],
+        [{"type": "SWAMP"}, {"type": "RIVER"}, {"type": "PLAINS"}],
+        [None, {"type": "OCEAN"}, {"type": "MOUNTAIN"}],
+    ])
+    state["occupancy"].reset(3)
+    state["occupancy"].occupy(0, 0)
+    state["agents"].add(Agent(0, "FACTORY", "RED", (0, 0), {"WINDMILL": 2}))
+    return state
+
+
+def test_round_trip_keeps_state(tmp_path: Path) -> None:
+    store = SnapshotStore(str(tmp_path))
+    state = saved_state()
+    store.save("game", state)
+    store.close()
+
+    restored = SnapshotStore(str(tmp_path)).load("game")
+    assert restored is not None
+    assert (restored["round"], restored["balance"], restored["team"]) == (4, 321, "RED")
+    assert restored["agents"][0].warehouse == {"WINDMILL": 2}
+    assert restored["agents"].at((0, 0)).type == "FACTORY"
+    assert not restored["occupancy"].is_free(0, 0)
+    assert restored["occupancy"].is_free(1, 0)
+
+
+def test_round_trip_translates_terrain_codes(
+    tmp_path: Path, fresh_terrain_table: Callable[[], None]
+) -> None:
+    fresh_terrain_table()
+    game_state.terrain_code("LAVA")  # The saving process met LAVA first
+    state = saved_state()
+    SnapshotStore(str(tmp_path)).save("game", state)
+    cells = sorted(state["map"].known_terrain())
+
+    fresh_terrain_table()  # A restarted process, meeting the types in another order
+    game_state.terrain_code("MOUNTAIN")
+    restored = SnapshotStore(str(tmp_path)).load("game")
+    assert restored is not None
+    assert sorted(restored["map"].known_terrain()) == cells
+    assert restored["terrain_index"].terrain(0, 1) == "SWAMP"
+    assert restored["terrain_index"].terrain(1, 2) == "OCEAN"
+    assert restored["terrain_index"].locations("RIVER") == {(1, 1)}
+
+
+def test_corrupt_snapshot_is_ignored(tmp_path: Path) -> None:
+    store = SnapshotStore(str(tmp_path))
+    store.save("game", saved_state())
+    store.close()
+    with open(store.path("game"), "r+b") as file:
+        file.seek(-1, os.SEEK_END)
+        file.write(b"\xff")
+    assert SnapshotStore(str(tmp_path)).load("game") is None